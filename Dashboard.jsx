@@ -37,9 +37,17 @@ const DashboardPage = ({ navigateTo }) => {
       return gradient;
     };
 
-    // Process platform data from actual results
+    // Per-platform totals over every scored row, computed by the server
     const platformData = {};
-    data.campaigns.forEach(campaign => {
+    (data.aggregates?.Platform || []).forEach(cell => {
+      platformData[cell.Platform] = {
+        total: cell.count,
+        successful: cell.predicted_successful,
+        budget: cell.budget_total
+      };
+    });
+    // Older responses only carry the preview rows
+    if (!data.aggregates) data.campaigns.forEach(campaign => {
       const platform = campaign.Platform;
       if (!platformData[platform]) {
         platformData[platform] = {
@@ -0,0 +1,141 @@
+"""Load shedding and request deadlines for the scoring endpoints.
+
+An AdmissionGate lets a bounded number of requests work at once and a
+bounded number wait for a turn. Anything beyond that is turned away at once
+(429), and a request that waited too long is turned away too (503). A burst
+then costs the clients that arrive last a quick retry, instead of piling up
+behind one big file and timing out everywhere at once.
+
+Deadlines are cooperative: Python threads cannot be stopped from outside,
+so the scoring loops call check_deadline() between chunks and files, and a
+request over its time budget ends there with a 504.
+"""
+import contextvars
+import threading
+import time
+
+DEFAULT_MAX_IN_FLIGHT = 4
+DEFAULT_MAX_QUEUED = 16
+# Seconds a request may wait for a turn before it is turned away
+DEFAULT_QUEUE_SECONDS = 10.0
+# Seconds a request may spend scoring (0 for no limit)
+DEFAULT_REQUEST_TIMEOUT = 120.0
+
+_deadline = contextvars.ContextVar('request_deadline', default=None)
+_END = object()
+
+
+class Overloaded(Exception):
+    """Raised when the gate turns a request away. status is 429 or 503."""
+
+    def __init__(self, status, message, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class RequestTimeout(Exception):
+    """Raised by check_deadline once the current request is over its time budget."""
+
+
+class AdmissionGate:
+    """At most max_in_flight requests working and max_queued waiting, per process."""
+
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT, max_queued=DEFAULT_MAX_QUEUED,
+                 queue_seconds=DEFAULT_QUEUE_SECONDS):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_seconds = queue_seconds
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = {429: 0, 503: 0}
+        self._cond = threading.Condition()
+
+    def enter(self):
+        """Wait for a turn. Raises Overloaded when there is no room or no turn in time."""
+        with self._cond:
+            if self.in_flight < self.max_in_flight and self.queued == 0:
+                self.in_flight += 1
+                return
+            if self.queued >= self.max_queued:
+                self.rejected[429] += 1
+                raise Overloaded(429, "Too many requests in progress; retry shortly",
+                                 retry_after=1)
+            self.queued += 1
+            try:
+                admitted = self._cond.wait_for(lambda: self.in_flight < self.max_in_flight,
+                                               timeout=self.queue_seconds)
+            finally:
+                self.queued -= 1
+            if not admitted:
+                self.rejected[503] += 1
+                raise Overloaded(503, f"Server busy: no turn within {self.queue_seconds:g}s",
+                                 retry_after=max(1, round(self.queue_seconds)))
+            self.in_flight += 1
+
+    def leave(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {"in_flight": self.in_flight, "queued": self.queued,
+                    "max_in_flight": self.max_in_flight, "max_queued": self.max_queued,
+                    "rejected": dict(self.rejected)}
+
+
+def set_deadline(seconds):
+    """Give the current request seconds to finish (None or 0: no limit). Returns a token."""
+    return _deadline.set(time.monotonic() + seconds if seconds else None)
+
+
+def reset_deadline(token):
+    _deadline.reset(token)
+
+
+def current_deadline():
+    return _deadline.get()
+
+
+def check_deadline():
+    """Raise RequestTimeout if the current request is past its deadline."""
+    deadline = _deadline.get()
+    if deadline is not None and time.monotonic() > deadline:
+        raise RequestTimeout("Request took longer than its time limit")
+
+
+def with_deadline(deadline, fn):
+    """fn wrapped to run under deadline, for work handed to another thread."""
+    def run(*args, **kwargs):
+        token = _deadline.set(deadline)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _deadline.reset(token)
+    return run
+
+
+def iter_with_deadline(deadline, iterable):
+    """iterable, each item produced under deadline.
+
+    For response bodies generated after the view has returned, when the
+    request's own deadline is no longer set. Past the deadline the body
+    stops with RequestTimeout; the status line is already sent by then, so
+    the client sees a truncated body rather than a 504.
+    """
+    iterator = iter(iterable)
+    try:
+        while True:
+            token = _deadline.set(deadline)
+            try:
+                item = next(iterator, _END)
+            finally:
+                _deadline.reset(token)
+            if item is _END:
+                return
+            yield item
+    finally:
+        # A body dropped half way still closes what it was reading from
+        if hasattr(iterator, 'close'):
+            iterator.close()
@@ -0,0 +1,97 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from schema import CATEGORICAL_COLS
+
+
+class AggregateCube:
+    """Dashboard breakdowns of scored rows, folded one chunk at a time.
+
+    For each categorical column and each pair of them, keeps the row count,
+    predicted successes, probability sum and budget total per value (or
+    pair of values). Each chunk's columns are turned into integer codes
+    once, and every breakdown is a few np.bincount calls over combined
+    codes, so the cost is one pass over the rows and the size of the result
+    depends only on how many distinct values there are.
+    """
+
+    def __init__(self, dimensions=CATEGORICAL_COLS):
+        self.dimensions = list(dimensions)
+        self.groups = [(dim,) for dim in self.dimensions]
+        self.groups += list(itertools.combinations(self.dimensions, 2))
+        # group -> {value tuple: [count, predicted successes, probability sum, budget total]}
+        self._cells = {group: {} for group in self.groups}
+
+    def add(self, scored_df, predictions, probabilities):
+        if len(scored_df) == 0:
+            return
+        weights = [
+            None,
+            np.asarray(predictions, dtype=np.float64),
+            np.asarray(probabilities, dtype=np.float64),
+            np.nan_to_num(np.asarray(scored_df['Budget'], dtype=np.float64)),
+        ]
+
+        codes, labels = {}, {}
+        for dim in self.dimensions:
+            values = scored_df[dim]
+            categorical = (values.array if isinstance(values.dtype, pd.CategoricalDtype)
+                           else pd.Categorical(values))
+            # Missing values get code 0 and the label None
+            codes[dim] = categorical.codes.astype(np.intp) + 1
+            labels[dim] = [None] + categorical.categories.tolist()
+
+        for group in self.groups:
+            index = codes[group[0]]
+            size = len(labels[group[0]])
+            for dim in group[1:]:
+                index = index * len(labels[dim]) + codes[dim]
+                size *= len(labels[dim])
+
+            totals = np.column_stack([np.bincount(index, weights=w, minlength=size) for w in weights])
+            cells = self._cells[group]
+            for flat in np.flatnonzero(totals[:, 0]):
+                key = self._key(group, flat, labels)
+                if key in cells:
+                    cells[key] += totals[flat]
+                else:
+                    cells[key] = totals[flat].copy()
+
+    @staticmethod
+    def _key(group, flat, labels):
+        key = []
+        for dim in reversed(group):
+            flat, code = divmod(int(flat), len(labels[dim]))
+            key.append(labels[dim][code])
+        return tuple(reversed(key))
+
+    def merge(self, other):
+        for group, cells in other._cells.items():
+            mine = self._cells.setdefault(group, {})
+            for key, totals in cells.items():
+                if key in mine:
+                    mine[key] += totals
+                else:
+                    mine[key] = totals.copy()
+
+    def as_dict(self):
+        """{'Platform': [...], 'Platform|Region': [...]}, one record per value."""
+        result = {}
+        for group in self.groups:
+            records = []
+            for key, totals in sorted(self._cells[group].items(),
+                                      key=lambda item: -item[1][0]):
+                count, successful, probability_sum, budget = totals
+                record = dict(zip(group, key))
+                record.update({
+                    "count": int(count),
+                    "predicted_successful": int(successful),
+                    "success_rate": round(float(successful / count * 100), 2),
+                    "avg_confidence": round(float(probability_sum / count * 100), 2),
+                    "budget_total": round(float(budget), 2),
+                })
+                records.append(record)
+            result['|'.join(group)] = records
+        return result
@@ -1,167 +1,711 @@
-from flask import Flask, request, jsonify
+import time
+started_at = time.perf_counter()
+
+from flask import Flask, request, jsonify, Response, g, send_file
 from flask_cors import CORS
-import pandas as pd
-import pickle
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
+import logging
 import os
+import tempfile
+import threading
+import zipfile
+
+from admission import (DEFAULT_MAX_IN_FLIGHT, DEFAULT_MAX_QUEUED, DEFAULT_QUEUE_SECONDS,
+                       DEFAULT_REQUEST_TIMEOUT, AdmissionGate, Overloaded, RequestTimeout,
+                       current_deadline, iter_with_deadline, reset_deadline, set_deadline)
+from batch import DEFAULT_BATCH_WORKERS, ArchiveTooLarge, score_batch, zip_sources
+from ingest import (CSV_EXTENSIONS, EXCEL_EXTENSIONS, detach_stream, detect_encoding,
+                    persist_upload, read_upload, upload_chunks, upload_size)
+from log_config import (DEFAULT_LOG_SAMPLE_RATE, configure_logging, reset_sampling,
+                        sample_request)
+from metrics import BYTES_INGESTED, REGISTRY, RequestTimer, stage
+from jobs import JobStore, DEFAULT_JOB_WORKERS, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from model_registry import ModelRegistry, ModelServer, REGISTRY_PATH
+from model_store import COMPACT_PATH
+from optimizer import OptimizerError, SurfaceCache, query_args
+from runtime_stats import memory_usage
+from result_formats import (JSON, EXTENSIONS, STREAMERS, UnsupportedFormatError,
+                            negotiate)
+from predict_pool import DEFAULT_MIN_ROWS
+from record_encoder import MAX_RECORDS, score_records
+from score_cache import DEFAULT_CACHE_SIZE
+from schema import header_cache_info
+from upload_store import UploadStore
+from scoring import (HeaderError, ScoreSummary, DEFAULT_CHUNK_ROWS,
+                     normalize_columns, score, add_results, score_chunks, iter_scored_chunks)
+
+configure_logging(os.environ.get('LOG_LEVEL', 'INFO'))
+logger = logging.getLogger('app')
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
 app.config['UPLOAD_FOLDER'] = 'uploads'
+# Keep a copy of every /predict upload (scoring never re-reads it): in the upload
+# store when that is on, else in UPLOAD_FOLDER under the client's filename
+app.config['PERSIST_UPLOADS'] = os.environ.get('PERSIST_UPLOADS', '0') == '1'
+# Content-addressed uploads and /predict results for re-submitted files, evicted
+# least recently used beyond UPLOAD_STORE_BYTES. Off by default (0): it writes every
+# JSON result to disk, which only pays off when clients re-send the same files
+app.config['UPLOAD_STORE'] = os.environ.get('UPLOAD_STORE', os.path.join('uploads', 'store'))
+app.config['UPLOAD_STORE_BYTES'] = int(os.environ.get('UPLOAD_STORE_BYTES', 0))
+# CSVs bigger than this are scored in chunks; ?mode=stream forces it for any size
+app.config['STREAM_THRESHOLD_BYTES'] = int(os.environ.get('STREAM_THRESHOLD_BYTES', 50 * 1024 * 1024))
+# .xlsx is compressed, so the same row count arrives in far fewer bytes
+app.config['EXCEL_STREAM_THRESHOLD_BYTES'] = int(os.environ.get('EXCEL_STREAM_THRESHOLD_BYTES', 5 * 1024 * 1024))
+app.config['STREAM_CHUNK_ROWS'] = int(os.environ.get('STREAM_CHUNK_ROWS', DEFAULT_CHUNK_ROWS))
+# Distinct campaign configurations remembered across requests (0 disables the cache)
+app.config['SCORE_CACHE_SIZE'] = int(os.environ.get('SCORE_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+# Worker processes for scoring large frames (0 scores in the request thread)
+app.config['PREDICT_WORKERS'] = int(os.environ.get('PREDICT_WORKERS', 0))
+app.config['POOL_MIN_ROWS'] = int(os.environ.get('POOL_MIN_ROWS', DEFAULT_MIN_ROWS))
+# Background threads for POST /predict/jobs
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', DEFAULT_JOB_WORKERS))
+# Files of one POST /predict/batch scored at the same time
+app.config['BATCH_WORKERS'] = int(os.environ.get('BATCH_WORKERS', DEFAULT_BATCH_WORKERS))
+# Versioned models; dependencies/models/ACTIVE picks the one to serve
+app.config['MODEL_REGISTRY'] = os.environ.get('MODEL_REGISTRY', REGISTRY_PATH)
+# Seconds between checks of the registry's ACTIVE pointer (0 disables the watcher)
+app.config['MODEL_WATCH_SECONDS'] = float(os.environ.get('MODEL_WATCH_SECONDS', 0))
+# Distilled model served for /predict?model=compact (see distill.py), if the file exists
+app.config['COMPACT_MODEL'] = os.environ.get('COMPACT_MODEL', COMPACT_PATH)
+# Campaigns accepted by one POST /predict/records
+app.config['MAX_JSON_RECORDS'] = int(os.environ.get('MAX_JSON_RECORDS', MAX_RECORDS))
+# Uploads bigger than this are refused with a 413 (0 for no limit)
+app.config['MAX_UPLOAD_MB'] = float(os.environ.get('MAX_UPLOAD_MB', 512))
+app.config['MAX_CONTENT_LENGTH'] = int(app.config['MAX_UPLOAD_MB'] * 1024 * 1024) or None
+# POST requests worked on at once per process, and how many may wait for a turn
+# (and for how long) before the rest get a 429/503 (MAX_IN_FLIGHT=0 turns this off)
+app.config['MAX_IN_FLIGHT'] = int(os.environ.get('MAX_IN_FLIGHT', DEFAULT_MAX_IN_FLIGHT))
+app.config['MAX_QUEUED'] = int(os.environ.get('MAX_QUEUED', DEFAULT_MAX_QUEUED))
+app.config['QUEUE_SECONDS'] = float(os.environ.get('QUEUE_SECONDS', DEFAULT_QUEUE_SECONDS))
+# Seconds a request may spend scoring before it ends with a 504 (0 for no limit)
+app.config['REQUEST_TIMEOUT_SECONDS'] = float(os.environ.get('REQUEST_TIMEOUT_SECONDS',
+                                                             DEFAULT_REQUEST_TIMEOUT))
+# Share of requests that write INFO/DEBUG logs (warnings and errors are always logged)
+app.config['LOG_SAMPLE_RATE'] = float(os.environ.get('LOG_SAMPLE_RATE', DEFAULT_LOG_SAMPLE_RATE))
 
 if not os.path.exists('uploads'):
     os.makedirs('uploads')
 
 # Load model
+model_server = ModelServer(ModelRegistry(app.config['MODEL_REGISTRY']),
+                           cache_size=app.config['SCORE_CACHE_SIZE'],
+                           workers=app.config['PREDICT_WORKERS'],
+                           pool_min_rows=app.config['POOL_MIN_ROWS'])
+load_started = time.perf_counter()
 try:
-    with open('dependencies/roi_pipeline.pkl', 'rb') as f:
-        model = pickle.load(f)
-        use_pipeline = True
-        print("✓ Pipeline loaded")
-except:
+    served = model_server.load_initial()
+    if served.use_pipeline:
+        logger.info("Pipeline %s loaded from %s (compiled: %s)",
+                    served.version, served.path, served.model.compiled)
+    else:
+        logger.info("Old model loaded - using manual encoding")
+except Exception:
+    logger.exception("No model found")
+try:
+    compact = model_server.load_compact(app.config['COMPACT_MODEL'])
+    if compact is not None:
+        logger.info("Compact model %s loaded from %s", compact.version, compact.path)
+except Exception:
+    logger.exception("Compact model not loaded")
+model_load_seconds = time.perf_counter() - load_started
+
+if app.config['MODEL_WATCH_SECONDS'] > 0:
+    model_server.watch(app.config['MODEL_WATCH_SECONDS'])
+
+# Score surfaces for /optimize, built once per model version
+surfaces = SurfaceCache()
+
+upload_store = None
+if app.config['UPLOAD_STORE_BYTES'] > 0:
+    upload_store = UploadStore(app.config['UPLOAD_STORE'], app.config['UPLOAD_STORE_BYTES'])
+
+admission = None
+if app.config['MAX_IN_FLIGHT'] > 0:
+    admission = AdmissionGate(app.config['MAX_IN_FLIGHT'], app.config['MAX_QUEUED'],
+                              app.config['QUEUE_SECONDS'])
+
+job_store = JobStore(os.path.join(app.config['UPLOAD_FOLDER'], 'jobs'),
+                     workers=app.config['JOB_WORKERS'])
+
+startup_seconds = time.perf_counter() - started_at
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    'roi_request_seconds', 'Request latency by endpoint.', ['endpoint'])
+REQUESTS = REGISTRY.counter(
+    'roi_requests_total', 'Requests by endpoint and status code.', ['endpoint', 'status'])
+
+def _served_gauge(name, help, read):
+    """A gauge read from the serving model; absent while no model is loaded."""
+    REGISTRY.gauge(name, help, lambda: {(): read(model_server.active)} if model_server.active else {})
+
+# Cache counters are per model version and start again after a swap
+_served_gauge('roi_score_cache_hits', 'Score cache hits for the serving model.',
+              lambda served: served.cache.hits)
+_served_gauge('roi_score_cache_misses', 'Score cache misses for the serving model.',
+              lambda served: served.cache.misses)
+_served_gauge('roi_score_cache_entries', 'Campaign configurations in the score cache.',
+              lambda served: served.cache.stats()['size'])
+_served_gauge('roi_score_cache_max_entries', 'Score cache capacity.',
+              lambda served: served.cache.max_size)
+_served_gauge('roi_model_in_flight', 'Requests and jobs holding the serving model.',
+              lambda served: served.in_flight())
+_served_gauge('roi_model_loaded_timestamp_seconds', 'When the serving model was loaded.',
+              lambda served: served.loaded_at)
+_served_gauge('roi_pool_workers', 'Prediction pool worker processes.',
+              lambda served: len(served.pool.worker_pids()) if served.pool else 0)
+REGISTRY.gauge('roi_header_cache_hits', 'Upload headers found in the schema resolution cache.',
+               lambda: {(): header_cache_info().hits})
+REGISTRY.gauge('roi_header_cache_misses', 'Upload headers resolved from scratch.',
+               lambda: {(): header_cache_info().misses})
+REGISTRY.gauge('roi_header_cache_entries', 'Distinct header layouts in the schema resolution cache.',
+               lambda: {(): header_cache_info().currsize})
+REGISTRY.gauge('roi_upload_store_bytes', 'Bytes of uploads and results in the upload store.',
+               lambda: {(): upload_store.stats()['bytes']} if upload_store else {})
+REGISTRY.gauge('roi_result_store_hits', 'Re-submitted uploads answered from the result store.',
+               lambda: {(): upload_store.stats()['hits']} if upload_store else {})
+REGISTRY.gauge('roi_result_store_misses', 'Uploads with no stored result for the serving model.',
+               lambda: {(): upload_store.stats()['misses']} if upload_store else {})
+REGISTRY.gauge('roi_admitted_requests', 'POST requests being worked on.',
+               lambda: {(): admission.stats()['in_flight']} if admission else {})
+REGISTRY.gauge('roi_queued_requests', 'POST requests waiting for a turn.',
+               lambda: {(): admission.stats()['queued']} if admission else {})
+REGISTRY.gauge('roi_shed_requests', 'Requests turned away since startup, by status code.',
+               lambda: {(str(status),): count for status, count in admission.stats()['rejected'].items()}
+               if admission else {}, ['status'])
+REGISTRY.gauge('roi_model_info', 'The model version currently serving (always 1).',
+               lambda: {(model_server.active.version, model_server.active.path): 1}
+               if model_server.active else {}, ['version', 'path'])
+REGISTRY.gauge('roi_jobs', 'Background scoring jobs by status.',
+               lambda: {(status,): count for status, count in job_store.status_counts().items()},
+               ['status'])
+def _resident_memory():
+    rss_mb = memory_usage()['rss_mb']
+    # Unknown where neither /proc nor getrusage is available: no sample
+    return {} if rss_mb is None else {(): rss_mb * 1024 * 1024}
+
+REGISTRY.gauge('roi_process_resident_memory_bytes', 'Resident memory of the server process.',
+               _resident_memory)
+REGISTRY.gauge('roi_startup_seconds', 'Time from import to ready, and the share spent loading the model.',
+               lambda: {('startup',): startup_seconds, ('model_load',): model_load_seconds}, ['phase'])
+
+@app.before_request
+def start_request():
+    g.log_token = sample_request(app.config['LOG_SAMPLE_RATE'])
+    g.timer = RequestTimer().__enter__()
+    # Scoring requests take a turn; health checks, metrics and job polling never wait
+    if admission is not None and request.method == 'POST':
+        with stage('queue'):
+            admission.enter()
+        g.admitted = True
+    g.deadline_token = set_deadline(app.config['REQUEST_TIMEOUT_SECONDS'])
+
+def release_once(leave):
+    released = threading.Lock()
+
+    def release():
+        if released.acquire(blocking=False):
+            leave()
+    return release
+
+def released_after(body, release):
+    """body, calling release once it is used up (or dropped half way)."""
     try:
-        with open('dependencies/roi_model.pkl', 'rb') as f:
-            model = pickle.load(f)
-            use_pipeline = False
-            print("✓ Old model loaded - using manual encoding")
-    except:
-        print("✗ No model found")
-        model = None
-        use_pipeline = False
+        yield from body
+    finally:
+        release()
+
+@app.after_request
+def finish_request(response):
+    if response.is_streamed and g.pop('admitted', False):
+        # A streamed body is still being scored as it is sent, so the turn lasts
+        # until it is read to the end or closed; any other body is done and
+        # teardown frees it
+        release = release_once(admission.leave)
+        response.response = released_after(response.response, release)
+        response.call_on_close(release)
+    timer = g.timer
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUEST_SECONDS.observe(timer.elapsed(), endpoint=endpoint)
+    REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    if timer.stages:
+        response.headers['Server-Timing'] = timer.server_timing()
+        logger.info("%s %s %d in %.1fms: %s", request.method, request.path, response.status_code,
+                    timer.elapsed() * 1000, timer.summary())
+    return response
+
+@app.teardown_request
+def end_request(exc):
+    if g.pop('admitted', False):
+        admission.leave()
+    if 'deadline_token' in g:
+        reset_deadline(g.deadline_token)
+    if 'timer' in g:
+        g.timer.__exit__(None, None, None)
+    if 'log_token' in g:
+        reset_sampling(g.log_token)
+
+@app.errorhandler(Overloaded)
+def overloaded(e):
+    response = jsonify({"error": str(e)})
+    response.status_code = e.status
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+@app.errorhandler(RequestTimeout)
+def request_timeout(e):
+    logger.warning("%s %s stopped after its %gs limit", request.method, request.path,
+                   app.config['REQUEST_TIMEOUT_SECONDS'])
+    return jsonify({"error": f"Request took longer than {app.config['REQUEST_TIMEOUT_SECONDS']:g}s; "
+                             "use /predict/jobs for large files"}), 504
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    return jsonify({"error": f"Upload is larger than {app.config['MAX_UPLOAD_MB']:g} MB; "
+                             "split it or use python batch.py"}), 413
+
+@app.errorhandler(Exception)
+def unexpected_error(e):
+    if isinstance(e, HTTPException):
+        return e
+    # Details go to the log only, never to the client
+    logger.exception("%s %s failed", request.method, request.path)
+    return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({"status": "ok", "model_loaded": model is not None})
+    served = model_server.active
+    pool = served.pool if served else None
+    return jsonify({
+        "status": "ok",
+        "model_loaded": served is not None,
+        "model_version": served.version if served else None,
+        "model_path": served.path if served else None,
+        "compact_model_version": model_server.compact.version if model_server.compact else None,
+        "startup_seconds": round(startup_seconds, 3),
+        "model_load_seconds": round(model_load_seconds, 3),
+        "memory": memory_usage(),
+        # An exported engine's forest is shared between processes (mapped_bytes)
+        "engine_memory": (served.model.memory_layout()
+                          if served and getattr(served.model, 'compiled', False) else None),
+        "cache": served.cache.stats() if served else None,
+        "upload_store": upload_store.stats() if upload_store else None,
+        "admission": admission.stats() if admission else None,
+        "workers": app.config['PREDICT_WORKERS'] if pool else 0,
+        "worker_memory": [memory_usage(pid) for pid in pool.worker_pids()] if pool else []
+    })
+
+@app.route('/models', methods=['GET'])
+def list_models():
+    served = model_server.active
+    return jsonify({
+        "serving": served.version if served else None,
+        "active": model_server.registry.active_version(),
+        "versions": model_server.registry.versions()
+    })
+
+@app.route('/models/activate', methods=['POST'])
+def activate_model():
+    """Swap the serving model; requests already running finish on the old one.
+
+    Other server processes swap when their ACTIVE watcher sees the change
+    (MODEL_WATCH_SECONDS; serve.py turns it on for --processes > 1).
+    """
+    version = (request.get_json(silent=True) or {}).get('version')
+    if version is None:
+        # Compact (distilled) versions are only activated by name
+        version = model_server.registry.latest()
+        if version is None:
+            return jsonify({"error": "No registered models"}), 404
+
+    previous = model_server.active.version if model_server.active else None
+    try:
+        served = model_server.activate(version)
+    except (KeyError, FileNotFoundError):
+        return jsonify({"error": f"Unknown model version '{version}'"}), 404
+    return jsonify({"model_version": served.version, "previous_version": previous})
+
+def wants_streaming(filename, size):
+    mode = request.args.get('mode') or request.form.get('mode')
+    if mode == 'stream':
+        return True
+    if mode == 'full':
+        return False
+    if filename.endswith(EXCEL_EXTENSIONS):
+        return size > app.config['EXCEL_STREAM_THRESHOLD_BYTES']
+    return size > app.config['STREAM_THRESHOLD_BYTES']
+
+def stream_results(served, file, mimetype, encoding=None):
+    filename = file.filename
+    stream = detach_stream(file)
+    chunk_rows = app.config['STREAM_CHUNK_ROWS']
+    chunks = upload_chunks(stream, filename, chunk_rows, encoding)
+
+    scored = (chunk for chunk, _, _ in iter_scored_chunks(chunks=chunks, **served.score_kwargs()))
+    # Score the first chunk now so bad uploads still get a JSON error response
+    try:
+        first = next(scored, None)
+    except Exception:
+        stream.close()
+        raise
+
+    def rows():
+        try:
+            if first is not None:
+                yield first
+            yield from scored
+        finally:
+            stream.close()
+
+    download_name = f"{os.path.splitext(os.path.basename(filename))[0]}.scored.{EXTENSIONS[mimetype]}"
+    logger.debug("Streaming scored rows as %s", mimetype)
+    # The body is scored as it is sent, after the view returns, so it carries the deadline along
+    body = iter_with_deadline(current_deadline(), STREAMERS[mimetype](rows()))
+    # The response outlives the view, so it holds its own reference to the model
+    # until the body is used up or closed
+    served.acquire()
+    release = release_once(served.release)
+    response = Response(released_after(body, release), mimetype=mimetype,
+                        headers={"Content-Disposition": f'attachment; filename="{download_name}"',
+                                 "X-Model-Version": served.version})
+    response.call_on_close(release)
+    return response
 
 @app.route('/predict', methods=['POST'])
 def predict():
-    print("📥 Received prediction request")
-    
-    if model is None:
+    if model_server.active is None:
         return jsonify({"error": "Model not loaded"}), 500
     
     if 'file' not in request.files:
         return jsonify({"error": "No file uploaded"}), 400
     
     file = request.files['file']
-    print(f"📄 File: {file.filename}")
-    
+    logger.debug("Received %s", file.filename)
+
     if file.filename == '':
         return jsonify({"error": "No file selected"}), 400
 
+    if not file.filename.endswith(CSV_EXTENSIONS + EXCEL_EXTENSIONS):
+        return jsonify({"error": "Unsupported file type"}), 400
+
     try:
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-        file.save(filepath)
-        print(f"💾 Saved to: {filepath}")
-
-        # Read file
-        if filepath.endswith('.csv'):
-            try:
-                df = pd.read_csv(filepath, encoding='utf-8')
-            except:
-                df = pd.read_csv(filepath, encoding='latin1')
-        elif filepath.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(filepath, engine='openpyxl')
-        else:
-            return jsonify({"error": "Unsupported file type"}), 400
-
-        print(f"📊 Loaded {len(df)} rows")
-        print(f"Original columns: {list(df.columns)}")
-
-        # Column mapping
-        df.columns = df.columns.str.strip().str.lower()
-        
-        column_map = {
-            'budget': 'Budget',
-            'duration': 'Duration',
-            'platform': 'Platform',
-            'content_type': 'Content_Type',
-            'content type': 'Content_Type',
-            'target_gender': 'Target_Gender',
-            'target gender': 'Target_Gender',
-            'gender': 'Target_Gender',
-            'region': 'Region',
-            'target_age': 'Target_Age',
-            'target age': 'Target_Age',
-            'age': 'Target_Age',
-            'age group': 'Target_Age',
-            'agegroup': 'Target_Age'
-        }
-        
-        df = df.rename(columns=column_map)
-        print(f"After mapping: {list(df.columns)}")
-        
-        required = ['Budget', 'Duration', 'Platform', 'Content_Type', 
-                   'Target_Gender', 'Region', 'Target_Age']
-        
-        missing = [col for col in required if col not in df.columns]
-        if missing:
+        mimetype = negotiate(request.args.get('format'), request.accept_mimetypes)
+    except UnsupportedFormatError as e:
+        return jsonify({"error": str(e)}), 406
+
+    # ?model=compact scores with the distilled model instead of the full forest
+    compact = request.args.get('model') == 'compact'
+    if compact and model_server.compact is None:
+        return jsonify({"error": "No compact model loaded"}), 404
+
+    # The whole request is scored by the model serving when it arrived,
+    # even if another version is activated meanwhile
+    with model_server.use(compact) as served:
+        try:
+            # Parse straight from the request stream; writing to disk is opt-in
+            stream = file.stream
+            size = upload_size(stream)
+            BYTES_INGESTED.inc(size)
+
+            digest = encoding = None
+            if upload_store is not None:
+                # One pass hashes the bytes (and stores them once, however often they arrive)
+                with stage('hash'):
+                    if file.filename.endswith(CSV_EXTENSIONS):
+                        # The CSV's encoding check reads every byte anyway
+                        with upload_store.begin(keep=app.config['PERSIST_UPLOADS']) as upload:
+                            encoding = detect_encoding(stream, on_block=upload.update)
+                        digest = upload.digest
+                    else:
+                        digest = upload_store.ingest(stream, keep=app.config['PERSIST_UPLOADS'])
+                logger.debug("Upload %s is %s", file.filename, digest)
+                if mimetype == JSON:
+                    result = upload_store.get_result(digest, served.version)
+                    if result is not None:
+                        logger.info("Scored %s: served stored result for %s", file.filename, digest)
+                        return json_result(served, result, 'hit')
+            elif app.config['PERSIST_UPLOADS']:
+                with stage('save'):
+                    filepath = persist_upload(file, app.config['UPLOAD_FOLDER'])
+                logger.debug("Saved to %s", filepath)
+
+            # NDJSON / Arrow / Parquet: stream every scored row back, chunk by chunk
+            if mimetype != JSON:
+                return stream_results(served, file, mimetype, encoding)
+
+            # Stream large files through the model in chunks instead of loading them whole
+            if wants_streaming(file.filename, size):
+                logger.debug("Streaming in chunks of %d rows", app.config['STREAM_CHUNK_ROWS'])
+                chunks = upload_chunks(stream, file.filename, app.config['STREAM_CHUNK_ROWS'], encoding)
+                summary = score_chunks(chunks=chunks, **served.score_kwargs())
+                logger.info("Scored %s: %d/%d successful", file.filename, summary.successful, summary.total)
+                return scored_response(served, summary, digest)
+
+            # Read file
+            with stage('read'):
+                df = read_upload(stream, file.filename, encoding)
+            logger.debug("Loaded %d rows, columns: %s", len(df), list(df.columns))
+
+            # Column mapping
+            with stage('validate'):
+                df = normalize_columns(df)
+
+            predictions, probabilities = score(df=df, **served.score_kwargs())
+
+            with stage('serialize'):
+                # Add results to the uploaded dataframe
+                add_results(df, predictions, probabilities)
+
+                summary = ScoreSummary()
+                summary.add(df, predictions, probabilities)
+                response = scored_response(served, summary, digest)
+
+            logger.info("Scored %s: %d/%d successful", file.filename, summary.successful, summary.total)
+            return response
+
+        except HeaderError as e:
             return jsonify({
-                "error": f"Missing columns: {missing}",
-                "found": list(df.columns)
+                "error": str(e),
+                "found": e.found
             }), 400
 
-        # Save original for display
-        original_df = df.copy()
-
-        if use_pipeline:
-            # NEW PIPELINE - handles encoding automatically
-            print("Using pipeline (automatic encoding)")
-            X = df[required].copy()
-            predictions = model.predict(X)
-            probabilities = model.predict_proba(X)[:, 1]
-            
-        else:
-            # OLD MODEL - needs manual one-hot encoding
-            print("Using old model (manual encoding)")
-            
-            # Select features
-            feature_df = df[required].copy()
-            
-            # One-hot encode categorical columns
-            categorical_cols = ['Platform', 'Content_Type', 'Target_Gender', 'Region', 'Target_Age']
-            encoded_df = pd.get_dummies(feature_df, columns=categorical_cols, drop_first=True)
-            
-            print(f"Encoded columns: {list(encoded_df.columns)}")
-            
-            # Make predictions
-            predictions = model.predict(encoded_df)
-            
-            if hasattr(model, 'predict_proba'):
-                probabilities = model.predict_proba(encoded_df)[:, 1]
-            else:
-                probabilities = predictions
-        
-        # Add results to original dataframe
-        original_df['Predicted_Success'] = predictions
-        original_df['Success_Probability'] = probabilities * 100
-        original_df['Recommendation'] = ['Invest' if p == 1 else 'Avoid' for p in predictions]
-        
-        # Calculate stats
-        total_campaigns = len(original_df)
-        successful = int(predictions.sum())
-        success_rate = (successful / total_campaigns) * 100
-        
-        print(f"✅ Predictions complete: {successful}/{total_campaigns} successful")
-        
-        response = {
-            "total_campaigns": total_campaigns,
-            "predicted_successful": successful,
-            "predicted_unsuccessful": total_campaigns - successful,
-            "success_rate": round(success_rate, 2),
-            "avg_confidence": round(probabilities.mean() * 100, 2),
-            "campaigns": original_df.to_dict(orient='records')[:100]
-        }
-        
-        return jsonify(response)
-        
-    except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"❌ Error: {e}")
-        print(error_trace)
-        return jsonify({"error": str(e), "trace": error_trace}), 500
+def scored_response(served, summary, digest=None):
+    result = summary.as_dict()
+    result["model_version"] = served.version
+    if digest is None:
+        return json_result(served, result)
+    response = json_result(served, result, 'miss')
+    upload_store.put_result(digest, served.version, response.get_json())
+    return response
+
+def json_result(served, result, cache_status=None):
+    response = jsonify(result)
+    response.headers["X-Model-Version"] = served.version
+    if cache_status is not None:
+        response.headers["X-Result-Cache"] = cache_status
+    return response
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Score many files in one request: several 'files' parts and/or zip archives.
+
+    Returns the per-file and combined summaries, or with ?format=zip an
+    archive of every file's scored rows plus summary.json.
+    """
+    if model_server.active is None:
+        return jsonify({"error": "Model not loaded"}), 500
+
+    uploads = request.files.getlist('files') + request.files.getlist('file')
+    uploads = [file for file in uploads if file.filename]
+    if not uploads:
+        return jsonify({"error": "No files uploaded"}), 400
+
+    compact = request.args.get('model') == 'compact'
+    if compact and model_server.compact is None:
+        return jsonify({"error": "No compact model loaded"}), 404
+    as_zip = request.args.get('format') == 'zip'
+
+    sources, unpacked = [], []
+    # Archives may unpack to no more than the upload limit, all of them together
+    unpack_budget = app.config['MAX_CONTENT_LENGTH']
+    try:
+        with stage('read'):
+            for file in uploads:
+                BYTES_INGESTED.inc(upload_size(file.stream))
+                if file.filename.endswith('.zip'):
+                    try:
+                        members = zip_sources(file.stream, max_bytes=unpack_budget)
+                    except ArchiveTooLarge:
+                        return jsonify({"error": f"Archives unpack to more than "
+                                                 f"{app.config['MAX_UPLOAD_MB']:g} MB; "
+                                                 "split them or use python batch.py"}), 413
+                    unpacked.extend(stream for _, stream in members)
+                    sources.extend(members)
+                    if unpack_budget is not None:
+                        unpack_budget -= sum(upload_size(stream) for _, stream in members)
+                else:
+                    sources.append((file.filename, file.stream))
+        if not sources:
+            return jsonify({"error": "No CSV or Excel files in the upload"}), 400
+
+        with model_server.use(compact) as served, tempfile.TemporaryDirectory() as output_dir:
+            batch = score_batch(sources, served.score_kwargs(), app.config['STREAM_CHUNK_ROWS'],
+                                output_dir if as_zip else None, app.config['BATCH_WORKERS'])
+            batch["model_version"] = served.version
+            logger.info("Scored batch of %d files: %d/%d successful", len(sources),
+                        batch['predicted_successful'], batch['total_campaigns'])
+            if not as_zip:
+                response = jsonify(batch)
+                response.headers["X-Model-Version"] = served.version
+                return response
+
+            with stage('serialize'):
+                archive = tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024)
+                with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+                    for name in sorted(os.listdir(output_dir)):
+                        zf.write(os.path.join(output_dir, name), name)
+                archive.seek(0)
+            response = send_file(archive, mimetype='application/zip', as_attachment=True,
+                                 download_name='scored.zip')
+            response.headers["X-Model-Version"] = served.version
+            return response
+    finally:
+        for stream in unpacked:
+            stream.close()
+
+def score_json(records, body):
+    """Score JSON campaigns with the serving (or ?model=compact) model.
+
+    body(scored rows) builds the response object; the model version is added.
+    """
+    compact = request.args.get('model') == 'compact'
+    if compact and model_server.compact is None:
+        return jsonify({"error": "No compact model loaded"}), 404
+    with model_server.use(compact) as served:
+        try:
+            campaigns = score_records(served.model, served.use_pipeline, served.encoder, records)
+        except HeaderError as e:
+            return jsonify({"error": str(e), "found": e.found}), 400
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    result = body(campaigns)
+    result["model_version"] = served.version
+    return json_result(served, result)
+
+@app.route('/predict/one', methods=['POST'])
+def predict_one():
+    """Score one campaign sent as a JSON object, e.g. for what-if sliders."""
+    if model_server.active is None:
+        return jsonify({"error": "Model not loaded"}), 500
+
+    record = request.get_json(silent=True)
+    if not isinstance(record, dict):
+        return jsonify({"error": "Send one campaign as a JSON object"}), 400
+    return score_json([record], lambda campaigns: {"campaign": campaigns[0]})
+
+@app.route('/predict/records', methods=['POST'])
+def predict_records():
+    """Score a JSON array of campaigns (or {"campaigns": [...]}) in one pass."""
+    if model_server.active is None:
+        return jsonify({"error": "Model not loaded"}), 500
+
+    records = request.get_json(silent=True)
+    if isinstance(records, dict):
+        records = records.get('campaigns')
+    if not isinstance(records, list) or not records:
+        return jsonify({"error": "Send a JSON array of campaigns"}), 400
+    if len(records) > app.config['MAX_JSON_RECORDS']:
+        return jsonify({"error": f"At most {app.config['MAX_JSON_RECORDS']} campaigns per request; "
+                                 "upload a file to /predict for more"}), 413
+
+    return score_json(records, lambda campaigns: {
+        "total_campaigns": len(campaigns),
+        "predicted_successful": sum(campaign["Predicted_Success"] for campaign in campaigns),
+        "campaigns": campaigns
+    })
+
+@app.route('/optimize', methods=['POST'])
+def optimize():
+    """Best campaigns for a total budget, searched over the model's whole grid.
+
+    JSON body: total_budget, optional max_campaigns, min_probability (0-1)
+    and constraints ({"Platform": [...], "Budget": {"min": .., "max": ..}}).
+    """
+    if model_server.active is None:
+        return jsonify({"error": "Model not loaded"}), 500
+
+    query = request.get_json(silent=True)
+    if not isinstance(query, dict):
+        return jsonify({"error": "Send a JSON object with total_budget"}), 400
+
+    compact = request.args.get('model') == 'compact'
+    if compact and model_server.compact is None:
+        return jsonify({"error": "No compact model loaded"}), 404
+
+    with model_server.use(compact) as served:
+        try:
+            args = query_args(query)
+            with stage('surface'):
+                surface, built = surfaces.get(served)
+            with stage('optimize'):
+                result = surface.optimize(**args)
+        except OptimizerError as e:
+            return jsonify({"error": str(e)}), 400
+
+    result["model_version"] = served.version
+    result["surface"] = {"points": int(surface.proba.size), "built_now": built,
+                         "build_seconds": round(surface.build_seconds, 3)}
+    logger.info("Optimized %s over %d candidates: %d campaigns", result["total_budget"],
+                result["candidates_considered"], len(result["campaigns"]))
+    response = jsonify(result)
+    response.headers["X-Model-Version"] = served.version
+    return response
+
+@app.route('/predict/jobs', methods=['POST'])
+def create_job():
+    if model_server.active is None:
+        return jsonify({"error": "Model not loaded"}), 500
+
+    if 'file' not in request.files:
+        return jsonify({"error": "No file uploaded"}), 400
+
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({"error": "No file selected"}), 400
+    if not file.filename.endswith(CSV_EXTENSIONS + EXCEL_EXTENSIONS):
+        return jsonify({"error": "Unsupported file type"}), 400
+
+    # The job keeps the model it was queued with until it finishes
+    served = model_server.active.acquire()
+    try:
+        job = job_store.submit(file, file.filename,
+                               dict(served.score_kwargs(), chunk_rows=app.config['STREAM_CHUNK_ROWS']),
+                               model_version=served.version, on_finish=served.release)
+    except Exception:
+        served.release()
+        raise
+    logger.info("Queued job %s for %s", job.id, file.filename)
+
+    response = job.as_dict()
+    response["status_url"] = f"/predict/jobs/{job.id}"
+    response["results_url"] = f"/predict/jobs/{job.id}/results"
+    return jsonify(response), 202
+
+@app.route('/predict/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.as_dict())
+
+@app.route('/predict/jobs/<job_id>/results', methods=['GET'])
+def job_results(job_id):
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job.status != 'done':
+        return jsonify({"error": f"Job is {job.status}", "status": job.status}), 409
+
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    campaigns = job_store.results(job, offset, limit)
+
+    next_offset = offset + len(campaigns)
+    return jsonify({
+        "job_id": job.id,
+        "offset": offset,
+        "limit": limit,
+        "total": job.rows_scored,
+        "next_offset": next_offset if next_offset < job.rows_scored else None,
+        "campaigns": campaigns
+    })
 
 if __name__ == '__main__':
+    # Development only; python serve.py runs the production server
     print("\n🚀 Starting Flask server...")
     print("📍 Server will run on: http://127.0.0.1:5000")
     print("🔧 CORS enabled for all origins\n")
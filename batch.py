@@ -0,0 +1,202 @@
+"""Score many campaign files at once: POST /predict/batch and a nightly CLI.
+
+Files are scored concurrently on threads that share one loaded model (its
+score cache and prediction pool included), each one chunk by chunk as in
+/predict/jobs. Every file gets its own scored CSV and summary; the batch
+summary adds them up. Files that fail are reported, not fatal.
+
+    python batch.py uploads/ [--output-dir uploads/scored] [--workers 4] [--compact]
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from admission import RequestTimeout, current_deadline, with_deadline
+from ingest import CSV_EXTENSIONS, EXCEL_EXTENSIONS, upload_chunks
+from scoring import DEFAULT_CHUNK_ROWS, HeaderError, ScoreSummary, score_chunks
+
+logger = logging.getLogger(__name__)
+
+BATCH_EXTENSIONS = CSV_EXTENSIONS + EXCEL_EXTENSIONS
+DEFAULT_BATCH_WORKERS = 4
+# Zip members up to this size are unpacked in memory, bigger ones to a temp file
+SPOOL_BYTES = 16 * 1024 * 1024
+
+
+def output_name(filename, taken):
+    """'<stem>.scored.csv', numbered when two inputs share a name."""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    name = f"{stem}.scored.csv"
+    n = 1
+    while name in taken:
+        n += 1
+        name = f"{stem}.{n}.scored.csv"
+    taken.add(name)
+    return name
+
+
+def score_file(source, filename, score_kwargs, chunk_rows=DEFAULT_CHUNK_ROWS, output_path=None):
+    """Score one CSV/Excel path or stream, writing its scored rows to output_path.
+
+    Returns (result dict, ScoreSummary or None when the file failed).
+    """
+    result = {"filename": filename}
+    started = time.perf_counter()
+
+    def write_chunk(index, chunk):
+        chunk.to_csv(output_path, mode='w' if index == 0 else 'a', header=index == 0, index=False)
+
+    summary = None
+    if not filename.endswith(BATCH_EXTENSIONS):
+        result.update(status='failed', error="Unsupported file type", seconds=0.0)
+        return result, summary
+    try:
+        chunks = upload_chunks(source, filename, chunk_rows)
+        summary = score_chunks(chunks=chunks, on_chunk=write_chunk if output_path else None,
+                               **score_kwargs)
+        stats = summary.as_dict()
+        stats.pop('campaigns')
+        result.update(stats, status='done')
+        if output_path:
+            result["output"] = os.path.basename(output_path)
+    except HeaderError as e:
+        result.update(status='failed', error=str(e), found=e.found)
+    except RequestTimeout:
+        # The whole request is out of time, not just this file
+        raise
+    except Exception as e:
+        logger.exception("Scoring %s failed", filename)
+        result.update(status='failed', error=str(e))
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result, summary
+
+
+def score_batch(sources, score_kwargs, chunk_rows=DEFAULT_CHUNK_ROWS, output_dir=None,
+                workers=DEFAULT_BATCH_WORKERS):
+    """Score (filename, path or stream) pairs concurrently.
+
+    With output_dir, each file's scored rows go to <stem>.scored.csv there
+    and the batch summary to summary.json. Returns the batch summary.
+    """
+    started = time.perf_counter()
+    taken = set()
+    jobs = []
+    for filename, source in sources:
+        output_path = os.path.join(output_dir, output_name(filename, taken)) if output_dir else None
+        jobs.append((source, filename, output_path))
+
+    # The files share the calling request's deadline
+    run = with_deadline(current_deadline(), score_file)
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='batch') as executor:
+        futures = [executor.submit(run, source, filename, score_kwargs, chunk_rows, output_path)
+                   for source, filename, output_path in jobs]
+        outcomes = [future.result() for future in futures]
+
+    combined = ScoreSummary(preview_rows=0)
+    for _, summary in outcomes:
+        if summary is not None:
+            combined.merge(summary)
+    totals = combined.as_dict()
+    totals.pop('campaigns')
+
+    files = [result for result, _ in outcomes]
+    batch = {
+        "files_scored": sum(result["status"] == 'done' for result in files),
+        "files_failed": sum(result["status"] == 'failed' for result in files),
+        **totals,
+        "seconds": round(time.perf_counter() - started, 3),
+        "files": files
+    }
+    if output_dir:
+        with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
+            json.dump(batch, f, indent=2)
+    return batch
+
+
+class ArchiveTooLarge(ValueError):
+    """A zip archive whose members add up to more than the caller allows."""
+
+
+def zip_sources(archive, max_bytes=None):
+    """(member name, seekable stream) for every CSV/Excel file in a zip archive.
+
+    Members are unpacked up front since the readers seek. Close the streams
+    when done. With max_bytes, an archive whose members' uncompressed sizes
+    add up to more raises ArchiveTooLarge before anything is unpacked.
+    """
+    sources = []
+    with zipfile.ZipFile(archive) as zf:
+        infos = zf.infolist()
+        if max_bytes is not None and sum(info.file_size for info in infos) > max_bytes:
+            raise ArchiveTooLarge(f"Archive unpacks to more than {max_bytes} bytes")
+        for info in infos:
+            name = info.filename
+            base = os.path.basename(name)
+            if info.is_dir() or base.startswith('.') or name.startswith('__MACOSX/'):
+                continue
+            if not name.endswith(BATCH_EXTENSIONS):
+                continue
+            stream = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+            with zf.open(info) as member:
+                shutil.copyfileobj(member, stream)
+            stream.seek(0)
+            sources.append((name, stream))
+    return sources
+
+
+def directory_sources(directory):
+    """(filename, path) for every CSV/Excel file directly in directory."""
+    return [(name, os.path.join(directory, name)) for name in sorted(os.listdir(directory))
+            if name.endswith(BATCH_EXTENSIONS) and os.path.isfile(os.path.join(directory, name))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score every CSV/Excel file in a directory.")
+    parser.add_argument('directory')
+    parser.add_argument('--output-dir', default=None,
+                        help="where scored files and summary.json go (default: <directory>/scored)")
+    parser.add_argument('--workers', type=int, default=DEFAULT_BATCH_WORKERS,
+                        help="files scored at the same time")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--compact', action='store_true',
+                        help="score with the distilled model (see distill.py)")
+    args = parser.parse_args()
+
+    from log_config import configure_logging
+    from model_registry import ModelRegistry, ModelServer
+    from score_cache import DEFAULT_CACHE_SIZE
+
+    configure_logging()
+    # Same model the server would pick: the registry's active version, else dependencies/
+    model_server = ModelServer(ModelRegistry(), cache_size=DEFAULT_CACHE_SIZE)
+    served = model_server.load_compact() if args.compact else model_server.load_initial()
+    if served is None:
+        sys.exit("No compact model found; run distill.py first")
+
+    sources = directory_sources(args.directory)
+    output_dir = args.output_dir or os.path.join(args.directory, 'scored')
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"Scoring {len(sources)} files with model {served.version} on {args.workers} threads...")
+
+    batch = score_batch(sources, served.score_kwargs(), args.chunk_rows, output_dir, args.workers)
+    for result in batch["files"]:
+        if result["status"] == 'done':
+            print(f"  ✓ {result['filename']}: {result['predicted_successful']}/"
+                  f"{result['total_campaigns']} successful ({result['seconds']}s)")
+        else:
+            print(f"  ✗ {result['filename']}: {result['error']}")
+    print(f"\n{batch['files_scored']} scored, {batch['files_failed']} failed: "
+          f"{batch['predicted_successful']}/{batch['total_campaigns']} campaigns successful "
+          f"in {batch['seconds']}s")
+    print(f"Results in {output_dir}")
+
+
+if __name__ == '__main__':
+    main()
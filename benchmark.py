@@ -0,0 +1,341 @@
+"""Benchmarks for the /predict serving path and the training fit.
+
+Synthetic campaign files shaped like data.csv are generated once per size
+(and kept under benchmarks/data), then each request stage is timed on its
+own: parse, column mapping, encoding, predict_proba, predict and
+serialization. Scoring goes through the serving engine plus, for reference,
+the sklearn pipeline it was compiled from. End-to-end /predict latency and
+throughput come from the Flask test client. Results are written as JSON so
+runs on different commits can be compared with --compare.
+
+    python benchmark.py [--sizes 1000,100000,10000000] [--train-sizes 1000,100000]
+                        [--output benchmarks/results.json] [--compare old.json]
+"""
+import argparse
+import json
+import os
+import pickle
+import platform
+import statistics
+import subprocess
+import time
+
+import numpy as np
+import pandas as pd
+
+from ingest import detect_encoding
+from model_store import PIPELINE_PATH, load_model
+from scoring import (REQUIRED, DEFAULT_CHUNK_ROWS, ScoreSummary, add_results,
+                     csv_chunks, normalize_columns)
+from training import FEATURE_COLS, TARGET_COL, balance, build_pipeline
+
+DEFAULT_SIZES = (1000, 100000, 10000000)
+DEFAULT_TRAIN_SIZES = (1000, 100000)
+DATA_DIR = 'benchmarks/data'
+OUTPUT_PATH = 'benchmarks/results.json'
+# Bigger inputs are timed once; repeating a 10M row pass adds little
+REPEAT_MAX_ROWS = 1000000
+# The sklearn reference is slow; skip it above this many rows
+REFERENCE_MAX_ROWS = 1000000
+
+VOCABULARY = {
+    'Platform': ['Facebook', 'Google', 'Instagram', 'LinkedIn', 'YouTube'],
+    'Content_Type': ['Carousel', 'Image', 'Story', 'Text', 'Video'],
+    'Target_Age': ['18-24', '25-34', '35-44', '45-54', '55+'],
+    'Target_Gender': ['All', 'Female', 'Male'],
+    'Region': ['Canada', 'Germany', 'India', 'UK', 'US']
+}
+
+# Header spellings seen in uploads/ (alternative_naming_campaigns.csv)
+ALIAS_HEADERS = {
+    'Content_Type': 'content type',
+    'Target_Gender': 'gender',
+    'Target_Age': 'age group'
+}
+
+
+def synthetic_campaigns(n_rows, seed=0, start=0):
+    """A frame with data.csv's columns and a learnable Success label."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'Campaign_ID': [f"CAMP-{i:08d}" for i in range(start, start + n_rows)],
+        'Budget': rng.integers(100, 50000, n_rows),
+        'Duration': rng.integers(3, 61, n_rows)
+    })
+    for col, values in VOCABULARY.items():
+        df[col] = rng.choice(values, n_rows)
+
+    clicks = rng.integers(100, 60000, n_rows)
+    conversions = (clicks * rng.uniform(0.01, 0.2, n_rows)).astype(np.int64)
+    df['Clicks'] = clicks
+    df['Conversions'] = conversions
+    df['CTR'] = clicks / df['Budget'] * 100
+    df['CPC'] = df['Budget'] / clicks
+    df['Conversion_Rate'] = conversions / clicks * 100
+
+    # Roughly data.csv's 90% success rate, driven by the model's features
+    logit = (2.2 + df['Budget'] / 50000 - df['Duration'] / 60
+             + np.where(df['Platform'] == 'LinkedIn', -0.8, 0.0)
+             + np.where(df['Content_Type'] == 'Video', 0.5, 0.0))
+    df[TARGET_COL] = (rng.random(n_rows) < 1 / (1 + np.exp(-logit))).astype(np.int64)
+    return df
+
+
+def generate_campaigns(n_rows, path, layout='data', seed=0, chunk_rows=1000000):
+    """Write n_rows synthetic campaigns to path in chunks.
+
+    layout 'data' matches data.csv, 'alias' renames headers like the
+    alternative-naming upload and 'minimal' keeps only the feature columns.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    for start in range(0, n_rows, chunk_rows):
+        chunk = synthetic_campaigns(min(chunk_rows, n_rows - start), seed=seed + start, start=start)
+        if layout == 'alias':
+            chunk = chunk.rename(columns=ALIAS_HEADERS)
+        elif layout == 'minimal':
+            chunk = chunk[REQUIRED]
+        chunk.to_csv(tmp_path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def dataset(n_rows, layout='data', data_dir=DATA_DIR):
+    """Path of a cached synthetic file, generating it on first use."""
+    path = os.path.join(data_dir, f"campaigns_{layout}_{n_rows}.csv")
+    if not os.path.exists(path):
+        print(f"Generating {n_rows:,} rows ({layout}) -> {path}")
+        generate_campaigns(n_rows, path, layout=layout)
+    return path
+
+
+class StageTimer:
+    """Accumulates wall time per named stage."""
+
+    def __init__(self):
+        self.seconds = {}
+
+    def time(self, stage, fn, *args, **kwargs):
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + time.perf_counter() - started
+        return result
+
+
+def best_of(runs):
+    """Per stage, the fastest of several StageTimer runs."""
+    return {stage: min(run[stage] for run in runs) for stage in runs[0]}
+
+
+def time_scoring(engine, path, chunk_rows):
+    """One pass over a file with every /predict stage timed separately."""
+    timer = StageTimer()
+    encoding = timer.time('detect_encoding', detect_encoding, path)
+    chunks = csv_chunks(path, chunk_rows, encoding=encoding)
+    summary = ScoreSummary()
+    while True:
+        chunk = timer.time('parse', next, chunks, None)
+        if chunk is None:
+            break
+        chunk = timer.time('map_columns', normalize_columns, chunk)
+        X = chunk[REQUIRED]
+        encoded = timer.time('encode', engine.transform, X)
+        proba = timer.time('predict_proba', engine._forest_proba, encoded)
+        predictions = timer.time('predict', lambda p: engine.classes_.take(np.argmax(p, axis=1)),
+                                 proba)
+        probabilities = proba[:, 1]
+
+        def serialize(df):
+            add_results(df, predictions, probabilities)
+            summary.add(df, predictions, probabilities)
+        timer.time('serialize', serialize, chunk)
+        timer.time('serialize_ndjson', chunk.to_json, orient='records', lines=True)
+    timer.time('serialize', json.dumps, summary.as_dict())
+    return timer.seconds
+
+
+def time_reference(pipeline, path):
+    """The uncompiled sklearn pipeline on the same rows, for comparison."""
+    timer = StageTimer()
+    X = normalize_columns(pd.read_csv(path))[REQUIRED]
+    timer.time('encode', pipeline.named_steps['preprocessor'].transform, X)
+    timer.time('predict', pipeline.predict, X)
+    timer.time('predict_proba', pipeline.predict_proba, X)
+    return timer.seconds
+
+
+def time_end_to_end(client, path, fmt):
+    with open(path, 'rb') as f:
+        started = time.perf_counter()
+        # Closing the response ends the request, as a server would after sending it
+        with client.post(f'/predict?format={fmt}',
+                         data={'file': (f, os.path.basename(path))},
+                         content_type='multipart/form-data') as response:
+            body = response.get_data()
+        seconds = time.perf_counter() - started
+    if response.status_code != 200:
+        raise RuntimeError(f"/predict returned {response.status_code}: {body[:200]}")
+    return seconds
+
+
+def with_throughput(seconds, rows):
+    return {
+        "seconds": {stage: round(value, 6) for stage, value in seconds.items()},
+        "rows_per_second": {stage: round(rows / value) if value > 0 else None
+                            for stage, value in seconds.items()}
+    }
+
+
+def bench_serving(sizes, repeat, chunk_rows, data_dir, end_to_end=True):
+    model, use_pipeline, version, model_path = load_model()
+    if not use_pipeline or not model.compiled:
+        raise SystemExit("Serving benchmarks need the compiled pipeline (run roiPredictor.py)")
+
+    pipeline = None
+    if os.path.exists(PIPELINE_PATH):
+        with open(PIPELINE_PATH, 'rb') as f:
+            pipeline = pickle.load(f)
+
+    client = None
+    if end_to_end:
+        # Imported here: app loads the model and reads its config at import time.
+        # The benchmark files outgrow the server's upload size and time limits
+        # (0 is no limit), unless they were set explicitly.
+        os.environ.setdefault('MAX_UPLOAD_MB', '0')
+        os.environ.setdefault('REQUEST_TIMEOUT_SECONDS', '0')
+        from app import app, model_server
+        client = app.test_client()
+
+    results = []
+    for rows in sizes:
+        path = dataset(rows, data_dir=data_dir)
+        runs = repeat if rows <= REPEAT_MAX_ROWS else 1
+        print(f"Scoring {rows:,} rows x{runs}")
+
+        result = {"benchmark": "serving", "rows": rows, "bytes": os.path.getsize(path),
+                  "model_version": version, "model_path": model_path, "repeat": runs}
+        stages = best_of([time_scoring(model, path, chunk_rows) for _ in range(runs)])
+        stages['total'] = sum(seconds for stage, seconds in stages.items()
+                              if stage != 'serialize_ndjson')
+        result.update(with_throughput(stages, rows))
+
+        if pipeline is not None and rows <= REFERENCE_MAX_ROWS:
+            reference = best_of([time_reference(pipeline, path) for _ in range(runs)])
+            result["sklearn_reference"] = with_throughput(reference, rows)
+
+        upload_limit = client.application.config['MAX_CONTENT_LENGTH'] if client else None
+        if client is not None and upload_limit and result["bytes"] > upload_limit:
+            # Limits set explicitly in the environment: the server would answer a 413
+            print(f"  end-to-end skipped: {result['bytes']:,} bytes is over MAX_UPLOAD_MB")
+            result["end_to_end"] = {"skipped": "file is larger than MAX_UPLOAD_MB"}
+        elif client is not None:
+            result["end_to_end"] = {}
+            for fmt in ('json', 'ndjson'):
+                latencies = []
+                for _ in range(runs):
+                    # Time cold scoring, not repeat hits on the score cache
+                    model_server.active.cache.clear()
+                    latencies.append(time_end_to_end(client, path, fmt))
+                result["end_to_end"][fmt] = {
+                    "latency_seconds_min": round(min(latencies), 6),
+                    "latency_seconds_median": round(statistics.median(latencies), 6),
+                    "rows_per_second": round(rows / min(latencies))
+                }
+        results.append(result)
+    return results
+
+
+def bench_training(sizes, repeat, data_dir):
+    results = []
+    for rows in sizes:
+        path = dataset(rows, data_dir=data_dir)
+        runs = repeat if rows <= REPEAT_MAX_ROWS else 1
+        print(f"Training on {rows:,} rows x{runs}")
+
+        timings = []
+        for _ in range(runs):
+            timer = StageTimer()
+            df = timer.time('read', pd.read_csv, path)
+            df_balanced = timer.time('balance', balance, df)
+            pipeline = build_pipeline()
+            timer.time('fit', pipeline.fit, df_balanced[FEATURE_COLS], df_balanced[TARGET_COL])
+            timings.append(timer.seconds)
+
+        stages = best_of(timings)
+        result = {"benchmark": "training", "rows": rows, "balanced_rows": len(df_balanced),
+                  "repeat": runs}
+        result.update(with_throughput(stages, len(df_balanced)))
+        results.append(result)
+    return results
+
+
+def environment():
+    import sklearn
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "created_at": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__
+    }
+
+
+def compare(current, previous):
+    """Print each stage's time relative to an earlier results file."""
+    def stage_times(report):
+        times = {}
+        for result in report["results"]:
+            for stage, seconds in result["seconds"].items():
+                times[(result["benchmark"], result["rows"], stage)] = seconds
+        return times
+
+    old = stage_times(previous)
+    print(f"\nvs {previous['environment'].get('commit')}:")
+    for key, seconds in sorted(stage_times(current).items()):
+        if old.get(key):
+            benchmark, rows, stage = key
+            print(f"  {benchmark:9} {rows:>10,} {stage:17} {seconds:10.4f}s  x{seconds / old[key]:.2f}")
+
+
+def parse_sizes(text):
+    return [int(float(size)) for size in text.split(',') if size]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=parse_sizes, default=list(DEFAULT_SIZES),
+                        help="rows per serving benchmark, comma separated")
+    parser.add_argument('--train-sizes', type=parse_sizes, default=list(DEFAULT_TRAIN_SIZES),
+                        help="rows per training benchmark, comma separated (empty to skip)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    parser.add_argument('--no-end-to-end', action='store_true',
+                        help="skip the /predict requests through the Flask test client")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    report = {
+        "environment": environment(),
+        "results": bench_serving(args.sizes, args.repeat, args.chunk_rows, args.data_dir,
+                                 end_to_end=not args.no_end_to_end)
+                   + bench_training(args.train_sizes, args.repeat, args.data_dir)
+    }
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✓ Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
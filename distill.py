@@ -0,0 +1,212 @@
+"""Distil the serving forest into a compact forest that mimics its probabilities.
+
+The student is a RandomForestClassifier with a few shallow trees behind the
+teacher's own fitted preprocessor, so it compiles, exports and serves
+exactly like the full pipeline. It is fitted on soft labels: each transfer
+row appears once as a success weighted by the teacher's probability and
+once as a failure weighted by the rest, so every leaf ends up holding the
+mean teacher probability of the rows that reach it.
+
+The transfer set is the training data plus synthetic campaigns: every
+categorical drawn uniformly from the encoder's categories, budget and
+duration from the training rows or uniformly over their range. The report
+compares teacher and student on held-out transfer rows and on the training
+data: label agreement, probability error, artifact size and per-row
+latency through the serving engine.
+
+    python distill.py [--data data.csv] [--trees 10] [--max-leaf-nodes 128]
+                      [--transfer-rows 100000]
+
+writes dependencies/roi_compact.pkl, its engine and a .report.json next to
+it, and registers the compact version (marked compact, so activating
+"the latest" model never picks it); the server answers
+/predict?model=compact with it.
+"""
+import argparse
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline
+
+from forest_engine import compile_pipeline
+from model_registry import ModelRegistry
+from model_store import COMPACT_PATH, PIPELINE_PATH, artifact_version, engine_path_for, save_engine
+from training import CATEGORICAL_COLS, FEATURE_COLS, NUMERICAL_COLS, build_forest
+
+# Size is bounded by trees x leaves, however large the transfer set
+STUDENT_PARAMS = {
+    "n_estimators": 10,
+    "max_depth": None,
+    "max_leaf_nodes": 128,
+    "min_samples_split": 2,
+    "min_samples_leaf": 100,
+    # All features per split: with this few trees, decorrelating them costs accuracy
+    "max_features": None,
+}
+DEFAULT_TRANSFER_ROWS = 100000
+# Share of the transfer set held out for the agreement report
+HOLDOUT = 0.2
+# Rows per timed batch, and how often a single row is timed (best of)
+LATENCY_ROWS = 10000
+LATENCY_REPEAT = 20
+
+
+def transfer_set(data, categories, n_rows, random_state=42):
+    """Synthetic campaigns covering the categorical grid, plus the real ones."""
+    rng = np.random.default_rng(random_state)
+    synthetic = pd.DataFrame({
+        col: rng.choice(np.asarray(cats, dtype=object), n_rows)
+        for col, cats in zip(CATEGORICAL_COLS, categories)
+    })
+    # Half the numbers follow the training rows, half cover their whole range
+    observed = data[NUMERICAL_COLS].dropna().to_numpy()
+    picked = observed[rng.integers(0, len(observed), n_rows)]
+    uniform = rng.uniform(observed.min(axis=0), observed.max(axis=0), (n_rows, len(NUMERICAL_COLS)))
+    numbers = np.where(rng.random(n_rows)[:, None] < 0.5, picked, uniform)
+    for i, col in enumerate(NUMERICAL_COLS):
+        synthetic[col] = numbers[:, i]
+
+    rows = pd.concat([data[FEATURE_COLS], synthetic[FEATURE_COLS]], ignore_index=True)
+    return rows.sample(frac=1, random_state=random_state).reset_index(drop=True)
+
+
+def fit_student(teacher, X, n_jobs=-1, **params):
+    """Fit a forest to the teacher's probabilities on X. Returns the student pipeline."""
+    preprocessor = teacher.named_steps['preprocessor']
+    encoded = preprocessor.transform(X)
+    proba = teacher.named_steps['classifier'].predict_proba(encoded)[:, 1]
+
+    forest = build_forest(n_jobs=n_jobs, **{**STUDENT_PARAMS, **params})
+    n = len(encoded)
+    forest.fit(np.vstack([encoded, encoded]),
+               np.concatenate([np.ones(n, dtype=int), np.zeros(n, dtype=int)]),
+               sample_weight=np.concatenate([proba, 1.0 - proba]))
+    # sklearn keeps the fit's weights around (twice the transfer set); serving never needs them
+    forest.__dict__.pop('_sample_weight', None)
+    return Pipeline([('preprocessor', preprocessor), ('classifier', forest)])
+
+
+def agreement(teacher_engine, student_engine, X):
+    teacher_labels, teacher_proba = teacher_engine.predict_with_proba(X)
+    student_labels, student_proba = student_engine.predict_with_proba(X)
+    error = np.abs(teacher_proba[:, 1] - student_proba[:, 1])
+    return {
+        "rows": len(X),
+        "label_agreement": float(np.mean(teacher_labels == student_labels)),
+        "mean_abs_proba_error": float(error.mean()),
+        "p99_abs_proba_error": float(np.quantile(error, 0.99)),
+        "max_abs_proba_error": float(error.max()),
+    }
+
+
+def latency(engine, X):
+    batch = X.iloc[:LATENCY_ROWS]
+    started = time.perf_counter()
+    engine.predict_with_proba(batch)
+    batch_seconds = time.perf_counter() - started
+
+    one = X.iloc[:1]
+    single = []
+    for _ in range(LATENCY_REPEAT):
+        started = time.perf_counter()
+        engine.predict_with_proba(one)
+        single.append(time.perf_counter() - started)
+    return {"batch_us_per_row": batch_seconds / len(batch) * 1e6,
+            "single_row_ms": min(single) * 1000}
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def describe(pipeline, pickle_bytes, engine_path):
+    forest = pipeline.named_steps['classifier']
+    return {
+        "trees": len(forest.estimators_),
+        "max_depth": max(tree.tree_.max_depth for tree in forest.estimators_),
+        "nodes": int(sum(tree.tree_.node_count for tree in forest.estimators_)),
+        "pickle_bytes": pickle_bytes,
+        "engine_bytes": directory_size(engine_path) if os.path.isdir(engine_path) else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--pipeline', default=PIPELINE_PATH, help="teacher pipeline pickle")
+    parser.add_argument('--data', default='data.csv', help="training CSV the teacher was fitted on")
+    parser.add_argument('--output', default=COMPACT_PATH)
+    parser.add_argument('--trees', type=int, default=STUDENT_PARAMS['n_estimators'])
+    parser.add_argument('--max-leaf-nodes', type=int, default=STUDENT_PARAMS['max_leaf_nodes'])
+    parser.add_argument('--transfer-rows', type=int, default=DEFAULT_TRANSFER_ROWS,
+                        help="synthetic campaigns added to the training rows")
+    args = parser.parse_args()
+
+    with open(args.pipeline, 'rb') as f:
+        teacher_bytes = f.read()
+    teacher = pickle.loads(teacher_bytes)
+    data = pd.read_csv(args.data)
+
+    categories = teacher.named_steps['preprocessor'].named_transformers_['cat'].categories_
+    X = transfer_set(data, categories, args.transfer_rows)
+    n_holdout = int(len(X) * HOLDOUT)
+    X_holdout, X_fit = X.iloc[:n_holdout], X.iloc[n_holdout:]
+
+    print(f"Fitting {args.trees} trees of at most {args.max_leaf_nodes} leaves to the teacher "
+          f"on {len(X_fit)} rows...")
+    started = time.perf_counter()
+    student = fit_student(teacher, X_fit, n_estimators=args.trees,
+                          max_leaf_nodes=args.max_leaf_nodes)
+    fit_seconds = time.perf_counter() - started
+
+    student_bytes = pickle.dumps(student)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'wb') as f:
+        f.write(student_bytes)
+    engine_path = engine_path_for(args.output)
+    version = artifact_version(student_bytes)
+
+    teacher_engine = compile_pipeline(teacher)
+    student_engine = compile_pipeline(student)
+    save_engine(student_engine, engine_path, version)
+
+    teacher_engine_path = engine_path_for(args.pipeline)
+    report = {
+        "teacher": dict(describe(teacher, len(teacher_bytes), teacher_engine_path),
+                        version=artifact_version(teacher_bytes), path=args.pipeline,
+                        **latency(teacher_engine, X_holdout)),
+        "student": dict(describe(student, len(student_bytes), engine_path),
+                        version=version, path=args.output, fit_seconds=fit_seconds,
+                        **latency(student_engine, X_holdout)),
+        "agreement": {
+            "holdout": agreement(teacher_engine, student_engine, X_holdout),
+            "training_data": agreement(teacher_engine, student_engine, data[FEATURE_COLS]),
+        },
+    }
+    report_path = os.path.splitext(args.output)[0] + '.report.json'
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    teacher_info, student_info = report["teacher"], report["student"]
+    print(f"\n{'':16}{'teacher':>12}{'student':>12}")
+    for name in ("trees", "max_depth", "nodes", "pickle_bytes", "engine_bytes", "batch_us_per_row",
+                 "single_row_ms"):
+        print(f"{name:16}{teacher_info[name] or 0:>12.4g}{student_info[name] or 0:>12.4g}")
+    for name, result in report["agreement"].items():
+        print(f"{name}: {result['label_agreement']:.2%} labels agree, "
+              f"mean |dp| {result['mean_abs_proba_error']:.4f}, "
+              f"p99 {result['p99_abs_proba_error']:.4f}")
+    print(f"\nCompact model {version} saved as {args.output} (report: {report_path})")
+
+    # Registered so it can also replace the forest outright, but only when named
+    ModelRegistry().register(args.output, compact=True)
+    print(f"Served by /predict?model=compact; to serve it for every request: "
+          f"python model_registry.py activate {version}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+import logging
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import OneHotEncoder
+from sklearn.tree._tree import NODE_DTYPE
+
+from metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# Batches up to this many rows walk every tree at once (see _walk_all)
+SMALL_BATCH_ROWS = 64
+
+
+class CompiledPipeline:
+    """The trained ColumnTransformer + RandomForest pipeline flattened into NumPy arrays.
+
+    The one-hot encoder becomes category -> column lookup tables and every
+    tree's normalised leaf probabilities are concatenated into one value
+    array, so a request is encoded once and walks each tree once. Labels are
+    the argmax of those probabilities, exactly like
+    RandomForestClassifier.predict. Anything the compiler does not understand
+    falls back to a single pipeline.predict_proba call.
+    """
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.compiled = False
+        if pipeline is None:
+            return
+        self.classes_ = pipeline.classes_
+
+        try:
+            self._compile_encoder(pipeline.steps[0][1])
+            self._compile_forest(pipeline.steps[-1][1])
+            self.compiled = len(pipeline.steps) == 2
+        except (TypeError, ValueError, AttributeError) as e:
+            logger.warning("Forest not compiled, using sklearn: %s", e)
+
+    @classmethod
+    def from_arrays(cls, meta, arrays):
+        """Rebuild an engine saved by to_arrays() without the sklearn pipeline.
+
+        arrays may be read-only memory maps. They are walked in place (no
+        sklearn Tree is built), so every process mapping the same export
+        shares one copy of the whole forest through the page cache.
+        """
+        engine = cls(None)
+        engine.classes_ = np.asarray(meta['classes'])
+        engine.numeric_cols = [tuple(item) for item in meta['numeric_cols']]
+        engine.onehot = [(col, pd.Index(cats), np.asarray(positions, dtype=np.intp))
+                         for col, cats, positions in meta['onehot']]
+        engine.n_features = meta['n_features']
+
+        engine.trees = None
+        engine.offsets = np.asarray(meta['offsets'], dtype=np.intp)
+        engine._depths = list(meta['max_depths'])
+        engine._max_depth = max(engine._depths)
+        engine.value_by_class = arrays['leaf_values']
+        engine._children = arrays['children']
+        engine._feature = arrays['feature']
+        engine._threshold = arrays['threshold']
+        engine._missing_left = arrays['missing_left']
+        # Views into the children array: nothing copied
+        engine._left = engine._children[:, 0]
+        engine._right = engine._children[:, 1]
+        engine._mapped = all(isinstance(array, np.memmap) for array in arrays.values())
+        engine.compiled = True
+        return engine
+
+    def memory_layout(self):
+        """Bytes of forest arrays shared through a memory-mapped file vs private to this process."""
+        arrays = [self.value_by_class, self._children, self._feature, self._threshold,
+                  self._missing_left]
+        forest_bytes = sum(a.nbytes for a in arrays)
+        if self._mapped:
+            return {"mapped_bytes": int(forest_bytes), "private_bytes": 0}
+        # Each Tree's own node and value buffers, besides the flattened copies
+        forest_bytes += sum(tree.node_count * NODE_DTYPE.itemsize + tree.value.nbytes
+                            for tree in self.trees)
+        return {"mapped_bytes": 0, "private_bytes": int(forest_bytes)}
+
+    def to_arrays(self):
+        """Return (meta, arrays) for saving with from_arrays()."""
+        meta = {
+            'classes': self.classes_.tolist(),
+            'numeric_cols': self.numeric_cols,
+            'onehot': [(col, cats.tolist(), positions.tolist())
+                       for col, cats, positions in self.onehot],
+            'n_features': self.n_features,
+            'offsets': self.offsets.tolist(),
+            'max_depths': list(self._depths)
+        }
+        arrays = {'leaf_values': self.value_by_class, 'children': self._children,
+                  'feature': self._feature, 'threshold': self._threshold,
+                  'missing_left': self._missing_left}
+        return meta, arrays
+
+    def split_thresholds(self, position):
+        """Every split value the forest compares feature `position` against."""
+        split = self._left != np.arange(len(self._left))
+        return np.asarray(self._threshold[split & (self._feature == position)])
+
+    def _compile_encoder(self, preprocessor):
+        if not isinstance(preprocessor, ColumnTransformer):
+            raise TypeError("preprocessor is not a ColumnTransformer")
+        if preprocessor.remainder != 'drop':
+            raise ValueError("remainder columns are not supported")
+
+        self.numeric_cols = []
+        self.onehot = []  # (column, categories, output index per category or -1)
+        width = 0
+        # The unfitted spec says what was passthrough; fitted encoders come from named_transformers_
+        for name, spec, columns in preprocessor.transformers:
+            transformer = preprocessor.named_transformers_[name]
+            if isinstance(spec, str) and spec == 'drop':
+                continue
+            if isinstance(spec, str) and spec == 'passthrough':
+                self.numeric_cols += [(col, width + i) for i, col in enumerate(columns)]
+                width += len(columns)
+            elif isinstance(transformer, OneHotEncoder):
+                if getattr(transformer, '_infrequent_enabled', False):
+                    raise ValueError("infrequent categories are not supported")
+                drop_idx = transformer.drop_idx_
+                for i, col in enumerate(columns):
+                    cats = transformer.categories_[i]
+                    if pd.isna(cats).any():
+                        raise ValueError(f"missing values seen as a category in {col}")
+                    positions = np.full(len(cats), -1, dtype=np.intp)
+                    kept = [j for j in range(len(cats))
+                            if drop_idx is None or drop_idx[i] is None or j != drop_idx[i]]
+                    positions[kept] = width + np.arange(len(kept))
+                    self.onehot.append((col, pd.Index(cats), positions))
+                    width += len(kept)
+            else:
+                raise TypeError(f"unsupported transformer {name}")
+        self.n_features = width
+
+    def _compile_forest(self, forest):
+        if not isinstance(forest, RandomForestClassifier) or forest.n_outputs_ != 1:
+            raise TypeError("classifier is not a single-output RandomForestClassifier")
+        if forest.n_features_in_ != self.n_features:
+            raise ValueError("encoder width does not match the forest")
+
+        values, offsets = [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            # Same normalisation as DecisionTreeClassifier.predict_proba, done once
+            proba = tree.value[:, 0, :forest.n_classes_].astype(np.float64)
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(proba / normalizer)
+            offsets.append(offset)
+            offset += tree.node_count
+
+        self.trees = [estimator.tree_ for estimator in forest.estimators_]
+        self.value_by_class = np.ascontiguousarray(np.concatenate(values).T)
+        self.offsets = np.asarray(offsets, dtype=np.intp)
+        self._flatten_trees()
+
+    def _flatten_trees(self):
+        """Every tree's nodes in one set of arrays, numbered like value_by_class.
+
+        Leaves point back at themselves, so a walk can take max_depth steps
+        for every tree without checking where it has stopped.
+        """
+        left, right, feature, threshold, missing_left = [], [], [], [], []
+        for tree, offset in zip(self.trees, self.offsets):
+            node = np.arange(tree.node_count, dtype=np.intp) + offset
+            leaf = tree.children_left == -1
+            left.append(np.where(leaf, node, tree.children_left + offset))
+            right.append(np.where(leaf, node, tree.children_right + offset))
+            feature.append(np.where(leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            missing_left.append(tree.missing_go_to_left.astype(bool))
+        # Row node*2 + went_right: one gather picks either child
+        self._children = np.ascontiguousarray(np.stack([np.concatenate(left),
+                                                        np.concatenate(right)], axis=1))
+        self._left = self._children[:, 0]
+        self._right = self._children[:, 1]
+        self._feature = np.concatenate(feature).astype(np.intp)
+        self._threshold = np.concatenate(threshold)
+        # Where the fit sends a missing value at each split, as Tree.apply follows it
+        self._missing_left = np.concatenate(missing_left)
+        self._depths = [tree.max_depth for tree in self.trees]
+        self._max_depth = max(self._depths)
+        self._mapped = False
+
+    def transform(self, X):
+        """Encode a DataFrame into the float32 matrix the trees compare against."""
+        return encode_frame(X, self.n_features, self.numeric_cols, self.onehot)
+
+    def _walk_all(self, X):
+        """Leaf reached in every tree, (rows, trees), in max_depth vectorised steps.
+
+        For a handful of rows this beats one Tree.apply call per tree, whose
+        fixed cost dominates when there is almost nothing to walk.
+        """
+        node = np.tile(self.offsets, (X.shape[0], 1))
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        for _ in range(self._max_depth):
+            # Same comparison Tree.apply makes: float32 feature against float64 threshold,
+            # and missing values wherever the fit routed them
+            value = X[rows, self._feature[node]]
+            go_left = np.where(np.isnan(value), self._missing_left[node], value <= self._threshold[node])
+            node = np.where(go_left, self._left[node], self._right[node])
+        return node
+
+    def _walk_tree(self, columns, n_rows, offset, depth, has_missing):
+        """Leaf each row reaches in one tree, following the flattened node arrays.
+
+        columns is the feature matrix transposed and flattened, so a row's
+        value at a node is a single gather. Slower than Tree.apply, but reads
+        the (possibly memory-mapped) arrays where they are.
+        """
+        node = np.full(n_rows, offset, dtype=np.intp)
+        rows = np.arange(n_rows)
+        for _ in range(depth):
+            value = columns.take(self._feature.take(node) * n_rows + rows)
+            # Not (value <= threshold), as Tree.apply tests; NaN is settled below
+            go_right = value > self._threshold.take(node)
+            if has_missing:
+                missing = np.isnan(value)
+                go_right[missing] = ~self._missing_left.take(node[missing])
+            node = self._children.take(node * 2 + go_right)
+        return node
+
+    def _forest_proba(self, X):
+        n_classes = self.value_by_class.shape[0]
+        n_trees = len(self.offsets)
+        if X.shape[0] <= SMALL_BATCH_ROWS:
+            leaves = self._walk_all(X)
+            # cumsum adds tree by tree, in the order the loop below does
+            proba = np.stack([np.cumsum(self.value_by_class[k][leaves], axis=1)[:, -1]
+                              for k in range(n_classes)], axis=1)
+            return proba / n_trees
+        proba = np.zeros((n_classes, X.shape[0]), dtype=np.float64)
+        leaf_value = np.empty(X.shape[0], dtype=np.float64)
+        if self.trees is None:
+            columns = np.ascontiguousarray(X.T).ravel()
+            has_missing = bool(np.isnan(columns).any())
+            leaves_of = (lambda i: self._walk_tree(columns, X.shape[0], self.offsets[i],
+                                                   self._depths[i], has_missing))
+        else:
+            # Tree.apply is the raw Cython walker: no input validation, no copies
+            leaves_of = (lambda i: self.trees[i].apply(X) + self.offsets[i])
+        # Accumulate tree by tree, in the same order sklearn does
+        for i in range(n_trees):
+            leaves = leaves_of(i)
+            for k in range(n_classes):
+                np.take(self.value_by_class[k], leaves, out=leaf_value)
+                proba[k] += leaf_value
+        proba /= n_trees
+        return proba.T
+
+    def predict_proba(self, X):
+        if not self.compiled:
+            with stage('predict_proba'):
+                return self.pipeline.predict_proba(X)
+        with stage('encode'):
+            encoded = self.transform(X)
+        with stage('predict_proba'):
+            # Missing numbers stay NaN; the walk routes them like sklearn does
+            return self._forest_proba(encoded)
+
+    def predict_with_proba(self, X):
+        """Return (labels, probabilities) from a single pass over the forest."""
+        proba = self.predict_proba(X)
+        with stage('predict'):
+            labels = self.classes_.take(np.argmax(proba, axis=1), axis=0)
+        return labels, proba
+
+    def predict(self, X):
+        return self.predict_with_proba(X)[0]
+
+
+def encode_frame(X, n_features, numeric_cols, onehot):
+    """Write a DataFrame's numbers and one-hot indicators into a float32 matrix.
+
+    numeric_cols is [(column, position)], onehot [(column, categories,
+    position per category or -1)].
+    """
+    out = np.zeros((len(X), n_features), dtype=np.float32)
+    for col, position in numeric_cols:
+        out[:, position] = np.asarray(X[col], dtype=np.float64)
+    rows = np.arange(len(X))
+    for col, cats, positions in onehot:
+        codes = category_codes(X[col], cats)
+        # Unknown categories (code -1) and the dropped one stay all-zero
+        target = np.where(codes >= 0, positions[codes], -1)
+        hit = target >= 0
+        out[rows[hit], target[hit]] = 1.0
+    return out
+
+
+def category_codes(values, cats):
+    """Codes of a column's values in an encoder's categories, -1 for anything unseen."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        # Hash the rows once into their own few distinct values
+        codes, uniques = pd.factorize(values)
+    # Remap the (few) distinct values, not the rows. The extra -1 at the end
+    # is where missing values (code -1) land.
+    lookup = np.append(cats.get_indexer(uniques), -1)
+    return lookup[codes]
+
+
+def compile_pipeline(pipeline):
+    return CompiledPipeline(pipeline)
@@ -0,0 +1,263 @@
+import codecs
+import io
+import itertools
+import operator
+import os
+
+import pandas as pd
+
+from schema import (ID_COLUMN, REQUIRED, MissingColumnsError, arrow_column_types,
+                    csv_read_options, resolve_header)
+
+# Bytes decoded per step while checking an upload's encoding
+BLOCK_BYTES = 1 << 20
+
+# Bytes sampled from the top of a CSV to size pyarrow blocks to roughly chunk_rows rows
+ROW_SAMPLE_BYTES = 1 << 16
+
+# Sheet rows converted to a DataFrame at a time when reading a whole workbook
+EXCEL_READ_ROWS = 50000
+
+CSV_EXTENSIONS = ('.csv',)
+EXCEL_EXTENSIONS = ('.xlsx', '.xls')
+
+
+def detect_encoding(source, on_block=None):
+    """Return 'utf-8' if the whole upload decodes as UTF-8, else 'latin1'.
+
+    source is a path or a seekable binary stream (left where it started).
+    Decoding is a fast C loop over fixed-size blocks, so the file is parsed
+    once with the right encoding instead of failing part way and re-parsing.
+    on_block, if given, is passed every block of the upload, so it can be
+    hashed in the same read.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return detect_encoding(f, on_block)
+
+    start = source.tell()
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    encoding = 'utf-8'
+    try:
+        while True:
+            block = source.read(BLOCK_BYTES)
+            if block and on_block is not None:
+                on_block(block)
+            if encoding == 'utf-8':
+                try:
+                    decoder.decode(block, final=not block)
+                except UnicodeDecodeError:
+                    encoding = 'latin1'
+                    # Only on_block still needs the rest of the bytes
+                    if on_block is None:
+                        break
+            if not block:
+                break
+    finally:
+        source.seek(start)
+    return encoding
+
+
+def upload_size(stream):
+    """Size in bytes of a seekable upload stream."""
+    start = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(start)
+    return size
+
+
+def _arrow_csv():
+    """pyarrow.csv when installed (its multi-threaded reader is optional)."""
+    try:
+        import pyarrow.csv
+    except ImportError:
+        return None
+    return pyarrow.csv
+
+
+def _arrow_options(pa_csv, mapping, options, block_size=None):
+    read_options = pa_csv.ReadOptions(encoding=options['encoding'], use_threads=True)
+    if block_size is not None:
+        read_options.block_size = block_size
+    convert_options = pa_csv.ConvertOptions(include_columns=mapping.columns,
+                                            column_types=arrow_column_types(mapping),
+                                            strings_can_be_null=True)
+    return {"read_options": read_options, "convert_options": convert_options}
+
+
+def _rows_to_bytes(source, rows):
+    """Rough byte size of `rows` CSV rows, from the first ROW_SAMPLE_BYTES of source."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            sample = f.read(ROW_SAMPLE_BYTES)
+    else:
+        start = source.tell()
+        sample = source.read(ROW_SAMPLE_BYTES)
+        source.seek(start)
+    row_bytes = len(sample) / max(sample.count(b'\n'), 1)
+    return max(int(rows * row_bytes), BLOCK_BYTES)
+
+
+def read_csv_typed(source, encoding=None):
+    """Parse a CSV path or seekable stream into the model's columns, typed.
+
+    The mapped columns are read with declared dtypes (categoricals come back
+    as pandas categoricals); other columns pass through as parsed. Uses the pyarrow reader when installed.
+    """
+    if encoding is None:
+        encoding = detect_encoding(source)
+    mapping, options = csv_read_options(source, encoding)
+    pa_csv = _arrow_csv()
+    if pa_csv is not None:
+        table = pa_csv.read_csv(source, **_arrow_options(pa_csv, mapping, options))
+        return mapping.apply(table.to_pandas())
+    return mapping.apply(pd.read_csv(source, **options))
+
+
+def iter_csv_typed(source, chunk_rows, encoding=None):
+    """Like read_csv_typed, but yield DataFrames of about chunk_rows rows.
+
+    With pyarrow the chunks follow its read blocks, so their size is
+    approximate.
+    """
+    if encoding is None:
+        encoding = detect_encoding(source)
+    mapping, options = csv_read_options(source, encoding)
+    pa_csv = _arrow_csv()
+    if pa_csv is None:
+        for chunk in pd.read_csv(source, chunksize=chunk_rows, **options):
+            yield mapping.apply(chunk)
+        return
+
+    arrow_options = _arrow_options(pa_csv, mapping, options,
+                                   block_size=_rows_to_bytes(source, chunk_rows))
+    for batch in pa_csv.open_csv(source, **arrow_options):
+        if batch.num_rows:
+            yield mapping.apply(batch.to_pandas())
+
+
+def _calamine():
+    """python-calamine when installed: a much faster Excel reader than openpyxl."""
+    try:
+        import python_calamine
+    except ImportError:
+        return None
+    return python_calamine
+
+
+def _is_xlsx(source):
+    """Whether a workbook path or seekable stream is .xlsx (a zip), not legacy .xls."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read(4) == b'PK\x03\x04'
+    start = source.tell()
+    magic = source.read(4)
+    source.seek(start)
+    return magic == b'PK\x03\x04'
+
+
+def _excel_rows(source, whole=False):
+    """Yield the first sheet's rows as sequences of cell values.
+
+    openpyxl in read-only mode streams the sheet XML, so memory stays
+    bounded. calamine is much faster but loads the whole sheet, so it is
+    only used when the caller wants the whole sheet anyway (whole) or the
+    file is .xls, which openpyxl cannot read.
+    """
+    calamine = _calamine()
+    if calamine is not None and (whole or not _is_xlsx(source)):
+        workbook = calamine.load_workbook(source)
+        try:
+            yield from workbook.get_sheet_by_index(0).iter_rows()
+        finally:
+            workbook.close()
+        return
+
+    import openpyxl
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_excel_typed(source, chunk_rows, whole=False):
+    """Yield DataFrames of up to chunk_rows rows from the first sheet of a workbook.
+
+    Like iter_csv_typed: the header is resolved first and only the mapped
+    columns are typed, so memory stays bounded by chunk_rows however
+    big the .xlsx sheet is. whole says every chunk will be kept anyway, so
+    the sheet may be loaded at once. Needs calamine for .xls files.
+    """
+    rows = _excel_rows(source, whole)
+    header = next(rows, None)
+    if header is None:
+        raise MissingColumnsError(REQUIRED, [])
+    header = ['' if name is None else str(name) for name in header]
+    mapping = resolve_header(header)
+    width = len(header)
+    pick = operator.itemgetter(*[header.index(name) for name in mapping.columns])
+    # Text columns keep the cell values as the sheet has them
+    dtypes = {name: dtype for name, dtype in mapping.dtypes.items() if dtype is not str}
+
+    yielded = False
+    while True:
+        read = 0
+        block = []
+        for row in itertools.islice(rows, chunk_rows):
+            read += 1
+            if len(row) < width:
+                row = tuple(row) + (None,) * (width - len(row))
+            values = pick(row)
+            # Formatted-but-empty rows at the bottom of a sheet
+            if any(value is not None and value != '' for value in values):
+                block.append(values)
+        if block or not yielded:
+            df = pd.DataFrame.from_records(block, columns=mapping.columns)
+            # calamine reports empty cells as ''
+            df = df.replace('', None).astype(dtypes)
+            yielded = True
+            yield mapping.apply(df)
+        if read < chunk_rows:
+            return
+
+
+def read_upload(stream, filename, encoding=None):
+    """Parse an uploaded CSV/Excel stream straight into a DataFrame.
+
+    encoding is the CSV's, when already known from detect_encoding.
+    """
+    if filename.endswith(CSV_EXTENSIONS):
+        return read_csv_typed(stream, encoding)
+    if filename.endswith(EXCEL_EXTENSIONS):
+        return pd.concat(iter_excel_typed(stream, EXCEL_READ_ROWS, whole=True), ignore_index=True)
+    raise ValueError("Unsupported file type")
+
+
+def upload_chunks(source, filename, chunk_rows, encoding=None):
+    """Iterate a CSV or Excel upload (path or stream) as typed DataFrame chunks."""
+    if filename.endswith(CSV_EXTENSIONS):
+        return iter_csv_typed(source, chunk_rows, encoding)
+    if filename.endswith(EXCEL_EXTENSIONS):
+        return iter_excel_typed(source, chunk_rows)
+    raise ValueError("Unsupported file type")
+
+
+def persist_upload(file, folder):
+    """Keep a copy of the upload on disk and rewind it for parsing."""
+    filepath = os.path.join(folder, os.path.basename(file.filename))
+    file.save(filepath)
+    file.stream.seek(0)
+    return filepath
+
+
+def detach_stream(file):
+    """Take ownership of an upload's stream.
+
+    Flask closes request files as soon as the view returns; a streamed
+    response still needs to read the upload after that, and closes it itself.
+    """
+    stream = file.stream
+    file.stream = io.BytesIO()
+    return stream
@@ -0,0 +1,152 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from ingest import upload_chunks
+from metrics import BYTES_INGESTED
+from scoring import HeaderError, score_chunks
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_WORKERS = 2
+# Finished jobs kept (with their result files) before the oldest are dropped
+DEFAULT_JOB_HISTORY = 100
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 10000
+
+
+class Job:
+    def __init__(self, job_id, filename, upload_path, result_path, model_version=None):
+        self.id = job_id
+        self.filename = filename
+        self.model_version = model_version
+        self.upload_path = upload_path
+        self.result_path = result_path
+        self.status = 'queued'
+        self.rows_scored = 0
+        self.summary = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def as_dict(self):
+        info = {
+            "job_id": self.id,
+            "status": self.status,
+            "filename": self.filename,
+            "model_version": self.model_version,
+            "rows_scored": self.rows_scored,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+        if self.summary is not None:
+            info["summary"] = self.summary
+        if self.error is not None:
+            info["error"] = self.error
+        return info
+
+
+class JobStore:
+    """In-process registry of background scoring jobs.
+
+    Uploads and scored rows live on disk under job_dir, so a job's memory is
+    bounded by the chunk size no matter how big the file is. Only the job
+    metadata is kept in memory.
+    """
+
+    def __init__(self, job_dir, workers=DEFAULT_JOB_WORKERS, history=DEFAULT_JOB_HISTORY):
+        self.job_dir = job_dir
+        self.history = history
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='predict-job')
+        os.makedirs(job_dir, exist_ok=True)
+
+    def submit(self, file, filename, score_kwargs, model_version=None, on_finish=None):
+        """Save the upload and queue it for scoring. Returns the new Job.
+
+        on_finish is called once the job has finished, whatever the outcome.
+        """
+        job_id = uuid.uuid4().hex
+        extension = os.path.splitext(filename)[1].lower()
+        job = Job(job_id, filename,
+                  os.path.join(self.job_dir, f"{job_id}{extension}"),
+                  os.path.join(self.job_dir, f"{job_id}.scored.csv"),
+                  model_version=model_version)
+        file.save(job.upload_path)
+        BYTES_INGESTED.inc(os.path.getsize(job.upload_path))
+
+        with self._lock:
+            self._jobs[job_id] = job
+        self._evict()
+        self._executor.submit(self._run, job, score_kwargs, on_finish)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status_counts(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+    def results(self, job, offset, limit):
+        """Read one page of a finished job's scored rows from disk."""
+        if offset >= job.rows_scored:
+            return []
+        page = pd.read_csv(job.result_path, skiprows=range(1, offset + 1), nrows=limit)
+        return page.to_dict(orient='records')
+
+    def _run(self, job, score_kwargs, on_finish=None):
+        job.status = 'running'
+        job.started_at = time.time()
+
+        def write_chunk(index, chunk):
+            chunk.to_csv(job.result_path, mode='w' if index == 0 else 'a',
+                         header=index == 0, index=False)
+            job.rows_scored += len(chunk)
+
+        try:
+            kwargs = dict(score_kwargs)
+            chunks = upload_chunks(job.upload_path, job.upload_path, kwargs.pop('chunk_rows'))
+            summary = score_chunks(chunks=chunks, on_chunk=write_chunk, **kwargs)
+
+            result = summary.as_dict()
+            result.pop('campaigns')
+            job.summary = result
+            job.status = 'done'
+        except HeaderError as e:
+            job.error = f"{e} (found: {e.found})"
+            job.status = 'failed'
+        except Exception as e:
+            logger.exception("Job %s failed", job.id)
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+            if os.path.exists(job.upload_path):
+                os.remove(job.upload_path)
+            if on_finish is not None:
+                on_finish()
+
+    def _evict(self):
+        with self._lock:
+            finished = [j for j in self._jobs.values() if j.status in ('done', 'failed')]
+            excess = len(finished) - self.history
+            if excess <= 0:
+                return
+            finished.sort(key=lambda j: j.finished_at or 0)
+            for job in finished[:excess]:
+                del self._jobs[job.id]
+                if os.path.exists(job.result_path):
+                    os.remove(job.result_path)
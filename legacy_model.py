@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from metrics import stage
+from record_encoder import RecordEncoder
+
+
+class LegacyModel:
+    """The pre-pipeline forest (roi_model.pkl) with its one-hot encoding built in.
+
+    That model was fitted on pd.get_dummies output, so its columns are
+    Budget, Duration and one '<column>_<value>' indicator per category it
+    saw. The encoder is built once from feature_names_in_ and fills those
+    exact columns by category index, whatever values a file happens to
+    contain; values the model never saw leave their indicators at zero.
+    """
+
+    def __init__(self, model):
+        if not hasattr(model, 'feature_names_in_'):
+            raise ValueError("The old model has no feature_names_in_ to build its encoding from")
+        self.model = model
+        self.classes_ = model.classes_
+        self.feature_names = list(model.feature_names_in_)
+        self.encoder = RecordEncoder.from_feature_names(self.feature_names)
+
+    def _forest_proba(self, X):
+        # Named columns (no copy), so sklearn checks them against the fit instead of warning
+        return self.model.predict_proba(pd.DataFrame(X, columns=self.feature_names, copy=False))
+
+    def predict_proba(self, X):
+        with stage('encode'):
+            encoded = self.encoder.transform(X)
+        with stage('predict_proba'):
+            return self._forest_proba(encoded)
+
+    def predict_with_proba(self, X):
+        """Return (labels, probabilities) from one pass over the forest, as predict would."""
+        proba = self.predict_proba(X)
+        with stage('predict'):
+            labels = self.classes_.take(np.argmax(proba, axis=1), axis=0)
+        return labels, proba
+
+    def predict(self, X):
+        return self.predict_with_proba(X)[0]
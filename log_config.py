@@ -0,0 +1,38 @@
+import contextvars
+import logging
+import random
+
+# Share of requests whose INFO/DEBUG lines are written; warnings always are
+DEFAULT_LOG_SAMPLE_RATE = 1.0
+
+_sampled = contextvars.ContextVar('log_sampled', default=True)
+
+
+class SampledFilter(logging.Filter):
+    """Drop below-WARNING records from requests that were not sampled.
+
+    The decision is made once per request, so a sampled request logs all of
+    its lines and an unsampled one costs nothing but the level check.
+    Records outside a request (startup, jobs) are never dropped.
+    """
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or _sampled.get()
+
+
+def sample_request(rate):
+    """Decide whether the current request logs. Returns a token for reset_sampling."""
+    return _sampled.set(rate >= 1.0 or random.random() < rate)
+
+
+def reset_sampling(token):
+    _sampled.reset(token)
+
+
+def configure_logging(level='INFO'):
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    handler.addFilter(SampledFilter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
@@ -0,0 +1,181 @@
+"""In-process metrics in the Prometheus text format, plus per-request stage timing.
+
+Scoring code marks its stages with `with stage('encode'):`. Inside a request
+started with `RequestTimer`, each stage is recorded both in the request's
+own timings (for its log line and Server-Timing header) and in the
+roi_stage_seconds histogram; outside one (jobs, pool workers) stages only
+feed the histogram.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers a single-row request up to a multi-minute upload
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, _label_text(self.labelnames, key), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield (f'{self.name}_bucket',
+                       _label_text(self.labelnames + ('le',), key + (le,)), cumulative)
+            yield f'{self.name}_sum', _label_text(self.labelnames, key), total
+            yield f'{self.name}_count', _label_text(self.labelnames, key), cumulative
+
+
+class Gauge:
+    """A value read at scrape time from callback() -> {label tuple: value}."""
+    kind = 'gauge'
+
+    def __init__(self, name, help, callback, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def samples(self):
+        for key, value in sorted(self.callback().items()):
+            if value is not None:
+                yield self.name, _label_text(self.labelnames, key), value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name, help, callback, labelnames=()):
+        return self.register(Gauge(name, help, callback, labelnames))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {float(value)!r}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'roi_stage_seconds', 'Time spent in each scoring stage.', ['stage'])
+ROWS_SCORED = REGISTRY.counter(
+    'roi_rows_scored_total', 'Campaign rows scored by the model (cache hits included).')
+BYTES_INGESTED = REGISTRY.counter(
+    'roi_bytes_ingested_total', 'Bytes of uploaded campaign files accepted for scoring.')
+
+_current = contextvars.ContextVar('request_timer', default=None)
+
+
+class RequestTimer:
+    """Stage timings for one request, made current with `with timer:`."""
+
+    def __init__(self):
+        self.stages = {}
+        self.started = time.perf_counter()
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _current.reset(self._token)
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Value for a Server-Timing response header, in milliseconds."""
+        return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.stages.items())
+
+    def summary(self):
+        return ' '.join(f'{name}={seconds * 1000:.1f}ms' for name, seconds in self.stages.items())
+
+
+@contextmanager
+def stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage=name)
+        timer = _current.get()
+        if timer is not None:
+            timer.add(name, seconds)
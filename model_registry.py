@@ -0,0 +1,300 @@
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from model_store import (COMPACT_PATH, engine_version, file_version, load_artifact,
+                         load_model, load_pipeline, save_engine)
+from predict_pool import PredictionPool
+from record_encoder import encoder_for
+from score_cache import ScoreCache
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_PATH = 'dependencies/models'
+
+
+class ModelRegistry:
+    """Versioned pipeline artifacts on disk.
+
+    Each version lives in <root>/<version>/ (the pickle, its exported engine
+    and info.json); <root>/ACTIVE names the version servers should run.
+    Versions are the short hash of the pickle bytes, the same id the score
+    cache and the responses use. Compact models (distill.py) are registered
+    too, marked so they are only served when named.
+    """
+
+    def __init__(self, root=REGISTRY_PATH):
+        self.root = root
+
+    def version_dir(self, version):
+        return os.path.join(self.root, version)
+
+    def versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        found = []
+        for version in os.listdir(self.root):
+            info_path = os.path.join(self.root, version, 'info.json')
+            if os.path.exists(info_path):
+                with open(info_path) as f:
+                    found.append(json.load(f))
+        return sorted(found, key=lambda info: info['registered_at'])
+
+    def latest(self):
+        """The most recently registered full (not compact) version, or None."""
+        full = [info for info in self.versions() if not info.get('compact', False)]
+        return full[-1]['version'] if full else None
+
+    def register(self, pipeline_path, compact=False):
+        """Copy a trained pipeline into the registry. Returns its version.
+
+        compact marks a distilled model, which latest() never picks.
+        """
+        version = file_version(pipeline_path)
+        directory = self.version_dir(version)
+        if os.path.exists(os.path.join(directory, 'info.json')):
+            return version
+
+        os.makedirs(directory, exist_ok=True)
+        shutil.copyfile(pipeline_path, os.path.join(directory, 'roi_pipeline.pkl'))
+        engine, _ = load_artifact(pipeline_path, use_pipeline=True)
+        if engine.compiled:
+            save_engine(engine, os.path.join(directory, 'roi_pipeline.engine'), version)
+        # info.json last: it is what marks the version as complete
+        with open(os.path.join(directory, 'info.json'), 'w') as f:
+            json.dump({"version": version, "registered_at": time.time(),
+                       "source": os.path.abspath(pipeline_path), "compact": compact}, f)
+        return version
+
+    def is_registered(self, version):
+        """Whether version names a complete version in this registry (never a path)."""
+        return (isinstance(version, str)
+                and any(info['version'] == version for info in self.versions()))
+
+    def artifact_path(self, version):
+        """The fastest artifact stored for a version (engine, else pickle)."""
+        engine_path = os.path.join(self.version_dir(version), 'roi_pipeline.engine')
+        if engine_version(engine_path) == version:
+            return engine_path
+        return os.path.join(self.version_dir(version), 'roi_pipeline.pkl')
+
+    def active_version(self):
+        try:
+            with open(os.path.join(self.root, 'ACTIVE')) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def set_active(self, version):
+        if not self.is_registered(version):
+            raise KeyError(version)
+        # Write then rename so readers never see a half-written pointer
+        tmp_path = os.path.join(self.root, f'ACTIVE.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(self.root, 'ACTIVE'))
+
+
+class ServedModel:
+    """One loaded model version with its own score cache and worker pool.
+
+    Requests hold a ServedModel from start to finish, so a swap never changes
+    the model under an in-flight request. A retired model shuts its pool
+    down once the last request using it is done.
+    """
+
+    def __init__(self, model, use_pipeline, version, path,
+                 cache_size=0, workers=0, pool_min_rows=None):
+        self.model = model
+        self.use_pipeline = use_pipeline
+        self.version = version
+        self.path = path
+        self.loaded_at = time.time()
+
+        # Cached scores are only valid for the artifact that produced them
+        self.cache = ScoreCache(cache_size)
+        self.cache.bind(version)
+        # JSON campaigns skip pandas when the model's encoding can be tabulated
+        self.encoder = encoder_for(model, use_pipeline)
+
+        self.pool = None
+        self._pool_settings = (workers, pool_min_rows)
+        if workers > 0:
+            self._start_pool()
+
+        self._users = 0
+        self._retired = False
+        self._lock = threading.Lock()
+
+    def _start_pool(self):
+        workers, pool_min_rows = self._pool_settings
+        self.pool = PredictionPool(workers, self.path, self.use_pipeline,
+                                   min_rows=pool_min_rows, model=self.model)
+        self.pool.warm_up()
+        logger.info("Prediction pool started with %d workers for model %s", workers, self.version)
+
+    def before_fork(self):
+        """Stop the pool in a process about to fork servers; each starts its own."""
+        if self.pool is not None:
+            pool, self.pool = self.pool, None
+            pool.shutdown()
+
+    def after_fork(self):
+        """In a forked server process: start a pool of its own."""
+        if self._pool_settings[0] > 0:
+            self._start_pool()
+
+    def score_kwargs(self):
+        return {"model": self.model, "use_pipeline": self.use_pipeline,
+                "cache": self.cache, "pool": self.pool}
+
+    def acquire(self):
+        with self._lock:
+            self._users += 1
+        return self
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            idle = self._retired and self._users == 0
+        if idle:
+            self._close()
+
+    def in_flight(self):
+        """Requests and jobs currently holding this model."""
+        with self._lock:
+            return self._users
+
+    def retire(self):
+        with self._lock:
+            self._retired = True
+            idle = self._users == 0
+        if idle:
+            self._close()
+
+    def _close(self):
+        if self.pool is not None:
+            pool, self.pool = self.pool, None
+            threading.Thread(target=pool.shutdown, daemon=True).start()
+
+
+class ModelServer:
+    """Holds the active ServedModel and swaps it atomically.
+
+    A compact model distilled by distill.py can be loaded alongside it for
+    requests that ask for it.
+    """
+
+    def __init__(self, registry, cache_size=0, workers=0, pool_min_rows=None):
+        self.registry = registry
+        self.settings = {"cache_size": cache_size, "workers": workers,
+                         "pool_min_rows": pool_min_rows}
+        self.active = None
+        self.compact = None
+        self._watch_interval = None
+        self._swap_lock = threading.Lock()
+
+    def load_initial(self):
+        """Serve the registry's active version, or the plain dependencies/ files."""
+        version = self.registry.active_version()
+        if version is not None:
+            return self.activate(version)
+
+        model, use_pipeline, version, path = load_model()
+        self.active = ServedModel(model, use_pipeline, version, path, **self.settings)
+        return self.active
+
+    def load_compact(self, pipeline_path=COMPACT_PATH):
+        """Load the distilled model. Returns it, or None when there is none."""
+        if not os.path.exists(pipeline_path):
+            return None
+        model, version, path = load_pipeline(pipeline_path)
+        # Cheap enough to score in the request thread; no pool of its own
+        self.compact = ServedModel(model, True, version, path,
+                                   cache_size=self.settings["cache_size"])
+        return self.compact
+
+    def activate(self, version):
+        """Load a registered version and make it the one new requests use.
+
+        Raises KeyError for anything that is not a registered version.
+        """
+        if not self.registry.is_registered(version):
+            raise KeyError(version)
+        with self._swap_lock:
+            if self.active is not None and self.active.version == version:
+                return self.active
+
+            path = self.registry.artifact_path(version)
+            model, _ = load_artifact(path, use_pipeline=True)
+            served = ServedModel(model, True, version, path, **self.settings)
+
+            # The pointer first: other server processes follow it (see watch)
+            if self.registry.active_version() != version:
+                self.registry.set_active(version)
+            previous, self.active = self.active, served
+            if previous is not None:
+                previous.retire()
+            logger.info("Now serving model %s", version)
+            return served
+
+    @contextmanager
+    def use(self, compact=False):
+        served = (self.compact if compact else self.active).acquire()
+        try:
+            yield served
+        finally:
+            served.release()
+
+    def before_fork(self):
+        for served in (self.active, self.compact):
+            if served is not None:
+                served.before_fork()
+
+    def after_fork(self):
+        """Restart what a forked server process does not inherit: pools and the watcher."""
+        self._swap_lock = threading.Lock()
+        for served in (self.active, self.compact):
+            if served is not None:
+                served.after_fork()
+        if self._watch_interval is not None:
+            self.watch(self._watch_interval)
+
+    def watch(self, interval):
+        """Poll the registry's ACTIVE pointer and swap when it changes."""
+        self._watch_interval = interval
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                version = self.registry.active_version()
+                if version is not None and (self.active is None or version != self.active.version):
+                    try:
+                        self.activate(version)
+                    except Exception:
+                        logger.exception("Could not activate model %s", version)
+
+        threading.Thread(target=loop, daemon=True, name='model-watch').start()
+
+
+if __name__ == '__main__':
+    # python model_registry.py register [pipeline.pkl] | activate <version> | list
+    registry = ModelRegistry()
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+    if command == 'register':
+        from model_store import PIPELINE_PATH
+        print(registry.register(sys.argv[2] if len(sys.argv) > 2 else PIPELINE_PATH))
+    elif command == 'activate':
+        registry.set_active(sys.argv[2])
+        print(f"✓ {sys.argv[2]} is now active")
+    else:
+        active = registry.active_version()
+        for info in registry.versions():
+            marker = '*' if info['version'] == active else ' '
+            kind = '  (compact)' if info.get('compact', False) else ''
+            print(f"{marker} {info['version']}  {time.ctime(info['registered_at'])}{kind}")
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sys
+
+import numpy as np
+
+from forest_engine import CompiledPipeline, compile_pipeline
+from legacy_model import LegacyModel
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_PATH = 'dependencies/roi_pipeline.pkl'
+LEGACY_MODEL_PATH = 'dependencies/roi_model.pkl'
+# Compiled engine exported from PIPELINE_PATH: meta.json + memory-mapped .npy arrays
+ENGINE_PATH = 'dependencies/roi_pipeline.engine'
+# Bumped when the exported arrays change; older exports fall back to the pickle
+ENGINE_FORMAT = 2
+ENGINE_ARRAYS = ('children', 'feature', 'threshold', 'missing_left', 'leaf_values')
+# Small forest distilled from the pipeline by distill.py
+COMPACT_PATH = 'dependencies/roi_compact.pkl'
+
+
+def artifact_version(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def file_version(path):
+    with open(path, 'rb') as f:
+        return artifact_version(f.read())
+
+
+def load_artifact(path, use_pipeline):
+    """Load a model file or engine directory. Returns (model, version).
+
+    Pipelines come back compiled for single-pass scoring and the old model
+    with its encoding built in; the version is a short hash of the pickle
+    bytes so caches can tell artifacts apart.
+    """
+    if os.path.isdir(path):
+        return load_engine(path)
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    model = pickle.loads(data)
+    model = compile_pipeline(model) if use_pipeline else LegacyModel(model)
+    return model, artifact_version(data)
+
+
+def save_engine(engine, directory, version):
+    """Write a compiled engine as meta.json plus raw .npy arrays."""
+    if not engine.compiled:
+        raise ValueError("Only a compiled pipeline can be exported")
+    meta, arrays = engine.to_arrays()
+    meta['version'] = version
+    meta['format'] = ENGINE_FORMAT
+
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f'{name}.npy'), array)
+    # meta.json last: a directory without it is an unfinished export
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+def load_engine(directory):
+    """Load an exported engine. Returns (engine, version).
+
+    The arrays are opened with mmap_mode='r', so no pickle is involved and
+    every process that loads the same export shares one copy of the whole
+    forest (nodes and leaf values) in the page cache; the engine walks the
+    maps in place (see CompiledPipeline.memory_layout).
+    """
+    with open(os.path.join(directory, 'meta.json')) as f:
+        meta = json.load(f)
+    arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+              for name in ENGINE_ARRAYS}
+    return CompiledPipeline.from_arrays(meta, arrays), meta['version']
+
+
+def engine_version(directory):
+    """Version of a usable export in directory, else None (none, unfinished or an older format)."""
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('format') != ENGINE_FORMAT:
+        return None
+    return meta.get('version')
+
+
+def engine_path_for(pipeline_path):
+    """Where a pipeline pickle's engine is exported: x.pkl -> x.engine."""
+    return os.path.splitext(pipeline_path)[0] + '.engine'
+
+
+def load_pipeline(pipeline_path=PIPELINE_PATH):
+    """Load a pipeline pickle, from its engine export if that is up to date.
+
+    Returns (model, version, path).
+    """
+    engine_path = engine_path_for(pipeline_path)
+    version = file_version(pipeline_path)
+    if engine_version(engine_path) == version:
+        model, version = load_engine(engine_path)
+        return model, version, engine_path
+    model, version = load_artifact(pipeline_path, use_pipeline=True)
+    return model, version, pipeline_path
+
+
+def load_model():
+    """Load the serving model. Returns (model, use_pipeline, version, path).
+
+    Prefers the exported engine when it was built from the current pipeline
+    pickle, then the pickle itself, then the legacy model.
+    """
+    try:
+        model, version, path = load_pipeline()
+        return model, True, version, path
+    except Exception as e:
+        logger.warning("Pipeline not loaded (%s), trying the old model", e)
+
+    model, version = load_artifact(LEGACY_MODEL_PATH, use_pipeline=False)
+    return model, False, version, LEGACY_MODEL_PATH
+
+
+def export_engine(pipeline_path=PIPELINE_PATH, directory=ENGINE_PATH):
+    engine, version = load_artifact(pipeline_path, use_pipeline=True)
+    save_engine(engine, directory, version)
+    return version
+
+
+if __name__ == '__main__':
+    # python model_store.py [pipeline.pkl] [engine_dir]
+    version = export_engine(*sys.argv[1:3])
+    print(f"✓ Engine {version} exported")
@@ -0,0 +1,274 @@
+"""Budget allocation over the model's whole campaign grid.
+
+A ScoreSurface holds the success probability of every combination of the
+model's categories at a set of budget and duration points, scored once per
+model version in large encoded batches (no DataFrame: the one-hot columns
+are written straight into the matrix the trees read). The points are
+quantiles of the split values the forest actually uses for each feature,
+so the grid is dense exactly where predictions change.
+
+A query only slices that array: constraints pick the allowed categories
+and budget/duration range, each campaign configuration takes its best
+duration, and the allocation is a Lagrangian relaxation of the
+multiple-choice knapsack (at most one budget per configuration, at most
+max_campaigns configurations, total budget capped), solved by bisecting the
+price of a dollar. Everything per query is vectorised over the surface.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from schema import CATEGORICAL_COLS
+
+logger = logging.getLogger(__name__)
+
+BUDGET_POINTS = 24
+DURATION_POINTS = 12
+# Grid rows encoded and scored per batch while building a surface
+SURFACE_BATCH_ROWS = 65536
+# Surfaces kept, one per model version
+SURFACE_VERSIONS = 2
+# Bisection steps for the price of a dollar
+PRICE_STEPS = 60
+DEFAULT_MAX_CAMPAIGNS = 10
+
+
+class OptimizerError(ValueError):
+    """Raised for a query the optimizer cannot answer (reported as a 400)."""
+
+
+def split_points(engine, position, n_points):
+    """Evaluation points for a numeric feature, from the forest's split values.
+
+    Quantiles of the thresholds, moved just past them (features are whole
+    numbers in practice), plus one point below the lowest split.
+    """
+    thresholds = engine.split_thresholds(position)
+    # A forest fitted with missing values can split at inf (every known value one way)
+    thresholds = thresholds[np.isfinite(thresholds)]
+    if len(thresholds) == 0:
+        return np.array([0.0])
+    points = np.ceil(np.quantile(thresholds, np.linspace(0, 1, n_points)))
+    return np.unique(np.concatenate([[np.floor(thresholds.min())], points]))
+
+
+def query_args(query):
+    """optimize() keyword arguments from a JSON query, checked. Raises OptimizerError."""
+    return {
+        "total_budget": _number(query, 'total_budget', None),
+        "max_campaigns": _number(query, 'max_campaigns', DEFAULT_MAX_CAMPAIGNS, whole=True),
+        "constraints": query.get('constraints'),
+        "min_probability": _number(query, 'min_probability', 0.0),
+    }
+
+
+def _number(query, field, default, whole=False):
+    value = query.get(field, default)
+    kind = "a whole number" if whole else "a number"
+    # bool is an int to Python, but never a sensible amount
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise OptimizerError(f"{field} must be {kind}")
+    try:
+        number = float(value)
+    except ValueError:
+        raise OptimizerError(f"{field} must be {kind}, got {value!r}")
+    if not math.isfinite(number) or (whole and not number.is_integer()):
+        raise OptimizerError(f"{field} must be {kind}, got {value!r}")
+    return int(number) if whole else number
+
+
+class ScoreSurface:
+    """Success probability for every category combination x budget x duration."""
+
+    def __init__(self, engine, version, budget_points=BUDGET_POINTS,
+                 duration_points=DURATION_POINTS):
+        if not getattr(engine, 'compiled', False):
+            raise OptimizerError("The optimizer needs the compiled pipeline model")
+        started = time.perf_counter()
+        self.version = version
+        self.dimensions = list(CATEGORICAL_COLS)
+
+        onehot = {col: (cats, positions) for col, cats, positions in engine.onehot}
+        numeric = dict(engine.numeric_cols)
+        self.categories = {col: [str(cat) for cat in onehot[col][0]] for col in self.dimensions}
+        self.budgets = split_points(engine, numeric['Budget'], budget_points)
+        self.durations = split_points(engine, numeric['Duration'], duration_points)
+
+        self.shape = tuple(len(self.categories[col]) for col in self.dimensions)
+        self.shape += (len(self.budgets), len(self.durations))
+        self.proba = self._score(engine, onehot, numeric)
+        self.build_seconds = time.perf_counter() - started
+        logger.info("Score surface for model %s: %d points in %.2fs",
+                    version, self.proba.size, self.build_seconds)
+
+    def _score(self, engine, onehot, numeric):
+        positive = int(np.flatnonzero(engine.classes_ == 1)[0])
+        size = int(np.prod(self.shape))
+        proba = np.empty(size, dtype=np.float32)
+        for start in range(0, size, SURFACE_BATCH_ROWS):
+            index = np.arange(start, min(start + SURFACE_BATCH_ROWS, size))
+            codes = np.unravel_index(index, self.shape)
+            rows = np.arange(len(index))
+
+            X = np.zeros((len(index), engine.n_features), dtype=np.float32)
+            for col, code in zip(self.dimensions, codes):
+                target = onehot[col][1][code]
+                hit = target >= 0
+                X[rows[hit], target[hit]] = 1.0
+            X[:, numeric['Budget']] = self.budgets[codes[-2]]
+            X[:, numeric['Duration']] = self.durations[codes[-1]]
+            proba[index] = engine._forest_proba(X)[:, positive]
+        return proba.reshape(self.shape)
+
+    def _restrict(self, constraints):
+        """Index arrays per axis for the constrained part of the grid."""
+        if constraints is None:
+            constraints = {}
+        if not isinstance(constraints, dict):
+            raise OptimizerError("constraints must be an object keyed by column")
+        constraints = dict(constraints)
+        axes = []
+        for col in self.dimensions:
+            allowed = constraints.pop(col, None)
+            if allowed is None:
+                axes.append(np.arange(len(self.categories[col])))
+                continue
+            if isinstance(allowed, str):
+                allowed = [allowed]
+            if not isinstance(allowed, list) or not all(isinstance(value, str) for value in allowed):
+                raise OptimizerError(f"{col} constraint must be a value or a list of values")
+            unknown = [value for value in allowed if value not in self.categories[col]]
+            if unknown:
+                raise OptimizerError(f"Unknown {col} {unknown}; the model knows {self.categories[col]}")
+            axes.append(np.asarray([self.categories[col].index(value) for value in allowed]))
+
+        for col, points in (('Budget', self.budgets), ('Duration', self.durations)):
+            limits = constraints.pop(col, None)
+            if limits is None:
+                limits = {}
+            if not isinstance(limits, dict) or set(limits) - {'min', 'max'}:
+                raise OptimizerError(f"{col} constraint must be {{min, max}}")
+            low, high = limits.get('min', -np.inf), limits.get('max', np.inf)
+            # bool is an int to Python, but never a sensible limit
+            if not all(isinstance(limit, (int, float)) and not isinstance(limit, bool)
+                       for limit in (low, high)):
+                raise OptimizerError(f"{col} min and max must be numbers")
+            axes.append(np.flatnonzero((points >= low) & (points <= high)))
+
+        if constraints:
+            raise OptimizerError(f"Unknown constraint {sorted(constraints)}; use {self.dimensions} "
+                                 "(lists of values) or Budget/Duration ({min, max})")
+        if any(len(axis) == 0 for axis in axes):
+            raise OptimizerError("No candidates satisfy the constraints")
+        return axes
+
+    def optimize(self, total_budget, max_campaigns=DEFAULT_MAX_CAMPAIGNS, constraints=None,
+                 min_probability=0.0):
+        """Pick campaigns that maximise expected successes within total_budget.
+
+        Returns a dict with the chosen campaigns and the totals.
+        """
+        if not math.isfinite(total_budget) or total_budget <= 0:
+            raise OptimizerError("total_budget must be a positive number")
+        if max_campaigns < 1:
+            raise OptimizerError("max_campaigns must be at least 1")
+        # Written so NaN fails it too
+        if not 0.0 <= min_probability <= 1.0:
+            raise OptimizerError("min_probability must be between 0 and 1")
+
+        axes = self._restrict(constraints)
+        grid = self.proba[np.ix_(*axes)]
+        budgets = self.budgets[axes[-2]]
+        durations = self.durations[axes[-1]]
+
+        # Each configuration x budget keeps its best duration
+        best_duration = grid.argmax(axis=-1)
+        value = grid.max(axis=-1)
+        combos = value.shape[:-1]
+        value = value.reshape(-1, len(budgets)).astype(np.float64)
+        best_duration = best_duration.reshape(-1, len(budgets))
+        value[(value < min_probability) | (budgets[np.newaxis, :] > total_budget)] = -np.inf
+        candidates = int(np.isfinite(value).sum())
+        if candidates == 0:
+            raise OptimizerError("No candidate reaches min_probability within the budget")
+
+        def choose(price):
+            """Best option per configuration at this price per dollar, then the top ones."""
+            net = value - price * budgets[np.newaxis, :]
+            option = net.argmax(axis=1)
+            gain = net[np.arange(len(net)), option]
+            order = np.argsort(-gain, kind='stable')[:max_campaigns]
+            order = order[gain[order] > 0]
+            return order, option[order], budgets[option[order]].sum()
+
+        # Raising the price of a dollar trades probability for cheaper options
+        low, high = 0.0, float(np.nanmax(value[np.isfinite(value)]) / max(budgets.min(), 1.0)) * 2
+        chosen = choose(low)
+        if chosen[2] > total_budget:
+            chosen = choose(high)
+            for _ in range(PRICE_STEPS):
+                middle = (low + high) / 2
+                attempt = choose(middle)
+                if attempt[2] <= total_budget:
+                    high, chosen = middle, attempt
+                else:
+                    low = middle
+
+        rows, options, spent = chosen
+        campaigns = []
+        for row, option in zip(rows, options):
+            codes = np.unravel_index(row, combos)
+            campaign = {col: self.categories[col][axes[i][code]]
+                        for i, (col, code) in enumerate(zip(self.dimensions, codes))}
+            campaign.update({
+                "Budget": float(budgets[option]),
+                "Duration": float(durations[best_duration[row, option]]),
+                "Success_Probability": round(float(value[row, option]) * 100, 2),
+            })
+            campaigns.append(campaign)
+
+        expected = float(sum(value[row, option] for row, option in zip(rows, options)))
+        return {
+            "total_budget": total_budget,
+            "budget_allocated": float(spent),
+            "budget_remaining": float(total_budget - spent),
+            "expected_successes": round(expected, 3),
+            "candidates_considered": candidates * len(durations),
+            "campaigns": campaigns,
+        }
+
+
+class SurfaceCache:
+    """The last few model versions' surfaces, each built once even under load."""
+
+    def __init__(self, max_versions=SURFACE_VERSIONS):
+        self.max_versions = max_versions
+        self._surfaces = OrderedDict()
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def get(self, served):
+        """The surface for a ServedModel. Returns (surface, built_now)."""
+        with self._lock:
+            surface = self._surfaces.get(served.version)
+            if surface is not None:
+                self._surfaces.move_to_end(served.version)
+                return surface, False
+            build_lock = self._building.setdefault(served.version, threading.Lock())
+
+        with build_lock:
+            with self._lock:
+                surface = self._surfaces.get(served.version)
+            if surface is not None:
+                return surface, False
+            surface = ScoreSurface(served.model, served.version)
+            with self._lock:
+                self._surfaces[served.version] = surface
+                self._building.pop(served.version, None)
+                while len(self._surfaces) > self.max_versions:
+                    self._surfaces.popitem(last=False)
+            return surface, True
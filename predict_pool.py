@@ -0,0 +1,136 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from model_store import load_artifact
+from scoring import score_model
+
+logger = logging.getLogger(__name__)
+
+# Below this many rows a frame is scored in the request process
+DEFAULT_MIN_ROWS = 50000
+
+# Set once per worker by _init_worker
+_worker_model = None
+_worker_use_pipeline = False
+
+# Model already loaded by the parent; forked workers inherit it copy-on-write
+_parent_model = None
+
+
+def _init_worker(model_path, use_pipeline):
+    global _worker_model, _worker_use_pipeline
+    if _parent_model is not None:
+        _worker_model = _parent_model
+    else:
+        _worker_model, _ = load_artifact(model_path, use_pipeline)
+    _worker_use_pipeline = use_pipeline
+
+    # The workers are the parallelism; keep sklearn fallbacks single-threaded
+    estimator = getattr(_worker_model, 'pipeline', _worker_model)
+    if hasattr(estimator, 'steps'):
+        estimator = estimator.steps[-1][1]
+    if hasattr(estimator, 'n_jobs'):
+        estimator.n_jobs = 1
+
+
+def _score_shard(shard):
+    return score_model(_worker_model, _worker_use_pipeline, shard)
+
+
+def _ping():
+    return _worker_model is not None
+
+
+def _start_method():
+    """fork while this process has no other threads, else a method that does not fork them.
+
+    Forking a threaded process (a running server, another pool's manager
+    thread) copies locks those threads may hold, and the child can hang.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    if 'fork' in methods and threading.active_count() == 1:
+        return 'fork'
+    return 'forkserver' if 'forkserver' in methods else 'spawn'
+
+
+class PredictionPool:
+    """Process pool where every worker holds the model.
+
+    With fork, workers reuse the model the parent already loaded (pass it as
+    model) and share its pages copy-on-write. A pool started once the
+    process has other threads (a model swap in a running server) uses
+    forkserver or spawn instead, and each worker loads model_path once when
+    it starts. Large frames are split into contiguous shards, one per
+    worker, and the results are concatenated back in the original row order.
+
+    If a worker dies, the pool is replaced and the request that found it
+    broken is scored in this process.
+    """
+
+    def __init__(self, workers, model_path, use_pipeline, min_rows=DEFAULT_MIN_ROWS, model=None):
+        self.workers = workers
+        self.min_rows = min_rows
+        self.model_path = model_path
+        self.use_pipeline = use_pipeline
+        self._model = model
+        self._lock = threading.Lock()
+        self._executor = self._new_executor()
+
+    def _new_executor(self):
+        global _parent_model
+        method = _start_method()
+        # fork shares the already-imported libraries and the loaded model
+        _parent_model = self._model if method == 'fork' else None
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(method),
+            initializer=_init_worker,
+            initargs=(self.model_path, self.use_pipeline)
+        )
+
+    def _replace_broken(self, broken):
+        with self._lock:
+            if self._executor is not broken:
+                return
+            logger.warning("A prediction worker died; starting a new pool")
+            self._executor = self._new_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def warm_up(self):
+        """Start every worker now so no request pays for the model load."""
+        futures = [self._executor.submit(_ping) for _ in range(self.workers)]
+        return all(f.result() for f in futures)
+
+    def worker_pids(self):
+        return sorted(self._executor._processes)
+
+    def should_shard(self, n_rows):
+        return n_rows >= self.min_rows
+
+    def score(self, X):
+        executor = self._executor
+        try:
+            results = self._score_shards(executor, X)
+        except BrokenProcessPool:
+            self._replace_broken(executor)
+            if self._model is None:
+                self._model, _ = load_artifact(self.model_path, self.use_pipeline)
+            return score_model(self._model, self.use_pipeline, X)
+        predictions = np.concatenate([r[0] for r in results])
+        probabilities = np.concatenate([np.asarray(r[1], dtype=np.float64) for r in results])
+        return predictions, probabilities
+
+    def _score_shards(self, executor, X):
+        n_shards = max(1, min(self.workers, len(X)))
+        bounds = np.linspace(0, len(X), n_shards + 1).astype(int)
+        futures = [executor.submit(_score_shard, X.iloc[start:end])
+                   for start, end in zip(bounds[:-1], bounds[1:])]
+        return [f.result() for f in futures]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
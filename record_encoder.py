@@ -0,0 +1,170 @@
+"""Score campaigns sent as JSON without pandas: POST /predict/one and /predict/records.
+
+The encoder turns the model's learned categories into plain dict lookups
+once per model version. Each campaign's fields are then written straight
+into a reused float32 feature matrix, which goes to the forest as is. No
+file, no DataFrame and no ColumnTransformer are involved, so one campaign
+costs a few microseconds to encode plus one walk of the trees.
+"""
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+
+from forest_engine import encode_frame
+from metrics import ROWS_SCORED, stage
+from schema import CATEGORICAL_COLS, ID_COLUMN, REQUIRED, resolve_header
+from scoring import score_model
+
+# Campaigns accepted by one /predict/records call
+MAX_RECORDS = 10000
+
+
+class RecordEncoder:
+    """Campaigns -> the feature matrix one model reads.
+
+    numeric is [(column, position)] and onehot is [(column, categories,
+    positions)], a position of -1 meaning the category has no column of its
+    own (the dropped one). Values the model never saw leave their columns
+    all-zero, as they do for uploaded files.
+    """
+
+    def __init__(self, n_features, numeric, onehot):
+        self.n_features = n_features
+        self.numeric = list(numeric)
+        self.onehot = [(col, pd.Index(cats), np.asarray(positions, dtype=np.intp))
+                       for col, cats, positions in onehot]
+        # value -> position, for encoding one campaign at a time
+        self._lookup = [(col, dict(zip(cats.tolist(), positions.tolist())))
+                        for col, cats, positions in self.onehot]
+        self._local = threading.local()
+
+    @classmethod
+    def from_engine(cls, engine):
+        """From a compiled pipeline's encoder tables (see forest_engine)."""
+        return cls(engine.n_features, engine.numeric_cols, engine.onehot)
+
+    @classmethod
+    def from_feature_names(cls, names):
+        """From the columns a model was fitted on: numbers plus '<column>_<value>' dummies.
+
+        Raises ValueError for a column that is neither.
+        """
+        numeric, dummies = [], {col: ([], []) for col in CATEGORICAL_COLS}
+        # Longest prefix first, so no column can claim another's dummies
+        prefixes = sorted(CATEGORICAL_COLS, key=len, reverse=True)
+        for position, name in enumerate(names):
+            if name in REQUIRED and name not in CATEGORICAL_COLS:
+                numeric.append((name, position))
+                continue
+            col = next((col for col in prefixes if name.startswith(f'{col}_')), None)
+            if col is None:
+                raise ValueError(f"Feature {name!r} is neither a model column nor one of its dummies")
+            dummies[col][0].append(name[len(col) + 1:])
+            dummies[col][1].append(position)
+        return cls(len(names), numeric,
+                   [(col, cats, positions) for col, (cats, positions) in dummies.items()])
+
+    def _buffer(self, n_rows):
+        """This thread's feature matrix, zeroed, grown only when a call needs more rows."""
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or len(buffer) < n_rows:
+            buffer = np.zeros((max(n_rows, 1), self.n_features), dtype=np.float32)
+            self._local.buffer = buffer
+        out = buffer[:n_rows]
+        out.fill(0.0)
+        return out
+
+    def encode(self, rows):
+        """Encode canonical rows (see canonical_rows). Returns a float32 matrix.
+
+        The matrix is reused by the next call on the same thread.
+        """
+        out = self._buffer(len(rows))
+        for i, row in enumerate(rows):
+            features = out[i]
+            for col, position in self.numeric:
+                features[position] = row[col]
+            for col, positions in self._lookup:
+                position = positions.get(row[col], -1)
+                if position >= 0:
+                    features[position] = 1.0
+        return out
+
+    def transform(self, df):
+        """Encode a DataFrame's columns into a new float32 matrix, by category code."""
+        return encode_frame(df, self.n_features, self.numeric, self.onehot)
+
+
+def canonical_rows(records):
+    """Campaign dicts under the model's column names, with checked values.
+
+    Field names may be spelled any way an upload header may (see
+    schema.resolve_header). Raises HeaderError for a missing or ambiguous
+    field and ValueError for a number or category that is not one.
+    """
+    rows = []
+    for i, record in enumerate(records):
+        if not isinstance(record, dict):
+            raise ValueError(f"Campaign {i} is not a JSON object")
+        mapping = resolve_header(record.keys())
+        row = {target: record[source] for source, target in mapping.rename.items()}
+        for col in ('Budget', 'Duration'):
+            try:
+                value = float(row[col])
+            except (TypeError, ValueError):
+                value = math.nan
+            if not math.isfinite(value):
+                raise ValueError(f"Campaign {i}: {col} must be a number, got {row[col]!r}")
+            row[col] = value
+        for col in REQUIRED[2:]:
+            if not isinstance(row[col], str):
+                raise ValueError(f"Campaign {i}: {col} must be a string, got {row[col]!r}")
+        rows.append(row)
+    return rows
+
+
+def encoder_for(model, use_pipeline):
+    """The RecordEncoder for a loaded model, or None when it has to go through pandas."""
+    if not use_pipeline:
+        # The old model (legacy_model.LegacyModel) built its own from its feature names
+        return model.encoder
+    if getattr(model, 'compiled', False):
+        return RecordEncoder.from_engine(model)
+    return None
+
+
+def score_records(model, use_pipeline, encoder, records):
+    """Score campaign dicts. Returns the scored rows, ready for JSON.
+
+    Models without an encoder (an uncompiled pipeline) are scored through
+    a DataFrame instead, with the same results.
+    """
+    with stage('validate'):
+        rows = canonical_rows(records)
+    ROWS_SCORED.inc(len(rows))
+
+    if encoder is not None:
+        with stage('encode'):
+            X = encoder.encode(rows)
+        with stage('predict_proba'):
+            proba = model._forest_proba(X)
+        predictions = model.classes_.take(np.argmax(proba, axis=1), axis=0)
+        probabilities = proba[:, 1]
+    else:
+        predictions, probabilities = score_model(model, use_pipeline, pd.DataFrame(rows, columns=REQUIRED))
+        predictions, probabilities = np.asarray(predictions), np.asarray(probabilities)
+
+    scored = []
+    for row, prediction, probability in zip(rows, predictions.tolist(), probabilities.tolist()):
+        result = {col: row[col] for col in REQUIRED}
+        if ID_COLUMN in row:
+            result[ID_COLUMN] = row[ID_COLUMN]
+        result.update({
+            "Predicted_Success": int(prediction),
+            "Success_Probability": probability * 100,
+            "Recommendation": 'Invest' if prediction == 1 else 'Avoid',
+        })
+        scored.append(result)
+    return scored
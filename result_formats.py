@@ -0,0 +1,132 @@
+JSON = 'application/json'
+NDJSON = 'application/x-ndjson'
+ARROW = 'application/vnd.apache.arrow.stream'
+PARQUET = 'application/vnd.apache.parquet'
+
+# ?format= names for each response type
+FORMATS = {
+    'json': JSON,
+    'ndjson': NDJSON,
+    'arrow': ARROW,
+    'parquet': PARQUET
+}
+
+EXTENSIONS = {
+    NDJSON: 'ndjson',
+    ARROW: 'arrows',
+    PARQUET: 'parquet'
+}
+
+
+class UnsupportedFormatError(ValueError):
+    pass
+
+
+def negotiate(format_name, accept_mimetypes):
+    """Pick the response mimetype from ?format= or else the Accept header.
+
+    JSON (the summary plus preview rows) stays the default.
+    """
+    if format_name:
+        if format_name not in FORMATS:
+            raise UnsupportedFormatError(
+                f"Unknown format '{format_name}', use one of {sorted(FORMATS)}")
+        mimetype = FORMATS[format_name]
+    else:
+        mimetype = accept_mimetypes.best_match([JSON, NDJSON, ARROW, PARQUET], default=JSON)
+
+    if mimetype in (ARROW, PARQUET):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise UnsupportedFormatError("Arrow and Parquet output need pyarrow installed")
+    return mimetype
+
+
+def ndjson_stream(scored_chunks):
+    """One JSON object per scored row, serialised a chunk at a time."""
+    for chunk in scored_chunks:
+        yield chunk.to_json(orient='records', lines=True)
+
+
+class _ByteSink:
+    """Write-only file object that hands its bytes out as they are produced.
+
+    tell() keeps counting across drains so writers that record offsets
+    (Parquet footers) stay correct.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _record_batches(scored_chunks):
+    import pyarrow as pa
+
+    schema = None
+    for chunk in scored_chunks:
+        # Later chunks are cast to the first chunk's schema so every batch matches
+        table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+        table = table.replace_schema_metadata(None)
+        schema = table.schema
+        yield table
+
+
+def arrow_stream(scored_chunks):
+    """Arrow IPC stream format, one record batch per scored chunk."""
+    import pyarrow as pa
+
+    sink = _ByteSink()
+    writer = None
+    for table in _record_batches(scored_chunks):
+        if writer is None:
+            writer = pa.ipc.new_stream(sink, table.schema)
+        writer.write_table(table)
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+def parquet_stream(scored_chunks):
+    """Parquet file bytes, one row group per scored chunk."""
+    import pyarrow.parquet as pq
+
+    sink = _ByteSink()
+    writer = None
+    for table in _record_batches(scored_chunks):
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table)
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+STREAMERS = {
+    NDJSON: ndjson_stream,
+    ARROW: arrow_stream,
+    PARQUET: parquet_stream
+}
@@ -1,78 +1,126 @@
-<<<<<<< HEAD
+import argparse
+import json
 import pandas as pd
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.pipeline import Pipeline
-from sklearn.compose import ColumnTransformer
-from sklearn.preprocessing import OneHotEncoder
 from sklearn.metrics import accuracy_score, classification_report
-from sklearn.utils import resample
 import pickle
 import os
 
-# Read the csv
-df = pd.read_csv("data.csv")
+from model_registry import ModelRegistry
+from model_store import ENGINE_PATH, export_engine
+from training import (CATEGORICAL_COLS, NUMERICAL_COLS, FEATURE_COLS, TARGET_COL,
+                      TRAIN_CHUNK_ROWS, TrainingState, balance, build_pipeline, state_path,
+                      stream_sample, warm_start_update)
+
+parser = argparse.ArgumentParser(description="Train the campaign success pipeline.")
+parser.add_argument('--data', nargs='+', default=['data.csv'],
+                    help="training CSV (default: data.csv); several with --out-of-core")
+parser.add_argument('--params', type=json.loads, default={},
+                    help="JSON object of forest parameters overriding training.FOREST_PARAMS "
+                         "(e.g. a tuning.py leaderboard entry)")
+parser.add_argument('--incremental', action='store_true',
+                    help="only train on records appended to --data since the last run, "
+                         "adding trees to the saved forest")
+parser.add_argument('--add-trees', type=int, default=50,
+                    help="trees fitted on the new records in an incremental run")
+parser.add_argument('--max-trees', type=int, default=400,
+                    help="oldest trees are dropped beyond this many")
+parser.add_argument('--min-new-rows', type=int, default=100,
+                    help="skip an incremental run with fewer new records than this")
+parser.add_argument('--out-of-core', action='store_true',
+                    help="stream --data in chunks and train on a class-stratified sample "
+                         "that fits --memory-mb, for histories larger than RAM")
+parser.add_argument('--memory-mb', type=int, default=1024,
+                    help="approximate memory for the --out-of-core training data "
+                         "(the fitted forest is extra)")
+parser.add_argument('--chunk-rows', type=int, default=TRAIN_CHUNK_ROWS,
+                    help="rows read per chunk with --out-of-core")
+args = parser.parse_args()
+if len(args.data) > 1 and not args.out_of_core:
+    parser.error("several --data files need --out-of-core")
+
+pipeline_path = os.path.join('dependencies', 'roi_pipeline.pkl')
+checkpoint_path = state_path(pipeline_path)
+
+
+def save_pipeline(pipeline, state):
+    """Write the pipeline, its serving engine and registry entry, then the checkpoint."""
+    os.makedirs('dependencies', exist_ok=True)
+    with open(pipeline_path, 'wb') as f:
+        pickle.dump(pipeline, f)
+
+    print(f"\nPipeline saved as {pipeline_path}")
+
+    # Memory-mappable copy for fast server startup
+    engine_version = export_engine(pipeline_path, ENGINE_PATH)
+    print(f"Serving engine exported to {ENGINE_PATH} (version {engine_version})")
+
+    # Register the new version; running servers switch only when it is activated
+    registered_version = ModelRegistry().register(pipeline_path)
+    print(f"Registered as model {registered_version} "
+          f"(activate with: python model_registry.py activate {registered_version})")
+
+    # Last, so a crash above leaves the new records to be picked up again
+    if state is not None:
+        state.save(checkpoint_path)
+    elif os.path.exists(checkpoint_path):
+        # It described the previous pipeline's source
+        os.remove(checkpoint_path)
+    return registered_version
+
+
+if args.incremental:
+    if not os.path.exists(checkpoint_path):
+        raise SystemExit(f"No training checkpoint at {checkpoint_path}; run a full training first")
+    state = TrainingState.load(checkpoint_path)
+    df_new, end = state.read_new()
+    print(f"{len(df_new)} new records in {state.source} since the last run "
+          f"({state.rows} already trained on)")
+
+    # Too little (or one-sided) data would only add noisy trees; leave it for the next run
+    if len(df_new) < args.min_new_rows or df_new[TARGET_COL].nunique() < 2:
+        raise SystemExit("Not enough new records with both outcomes; nothing to do")
+
+    with open(pipeline_path, 'rb') as f:
+        pipeline = pickle.load(f)
+
+    df_balanced = balance(df_new)
+    X_train, X_test, y_train, y_test = train_test_split(
+        df_balanced[FEATURE_COLS], df_balanced[TARGET_COL],
+        test_size=0.2, random_state=42, stratify=df_balanced[TARGET_COL]
+    )
+    before = accuracy_score(y_test, pipeline.predict(X_test))
+
+    trees = len(pipeline.named_steps['classifier'].estimators_)
+    print(f"\nAdding {args.add_trees} trees to {trees}...")
+    warm_start_update(pipeline, X_train, y_train, args.add_trees, args.max_trees)
+    after = accuracy_score(y_test, pipeline.predict(X_test))
+    trees = len(pipeline.named_steps['classifier'].estimators_)
+    print(f"Accuracy on held-out new records: {before:.4f} before, {after:.4f} after "
+          f"({trees} trees)")
+
+    state.advance(end, len(df_new), mode='incremental', trees=trees, accuracy=after)
+    save_pipeline(pipeline, state)
+    raise SystemExit(0)
+
+if args.out_of_core:
+    # Memory stays bounded by the sample, not by the size of the history
+    df, reservoir, state = stream_sample(args.data, args.memory_mb << 20, args.chunk_rows)
+    print(f"Streamed {sum(reservoir.seen.values())} records from {len(args.data)} file(s); "
+          f"sampled {len(df)} within {args.memory_mb} MB "
+          f"(seen per class: {reservoir.seen}, kept per class: {reservoir.capacity})")
+else:
+    # Read the csv (complete records only; the checkpoint remembers where they end)
+    df, state = TrainingState.read_source(args.data[0])
 print("Original data shape:", df.shape)
 print(df.head())
-=======
-
-# import pandas as pd
-# from sklearn.model_selection import train_test_split
-# from sklearn.ensemble import RandomForestClassifier
-# from sklearn.metrics import accuracy_score, classification_report
-# import pickle
-# import os
-# import sys
-
-# # ===== FILE READING FUNCTION =====
-# def read_data_file(filepath):
-#     """
-#     Read data from CSV or Excel file
-#     """
-#     file_extension = os.path.splitext(filepath)[1].lower()
-    
-#     if file_extension == '.csv':
-#         print(f"Reading CSV file: {filepath}")
-#         try:
-#             df = pd.read_csv(filepath, encoding='utf-8')
-#         except UnicodeDecodeError:
-#             print("UTF-8 failed, trying latin1 encoding...")
-#             df = pd.read_csv(filepath, encoding='latin1')
-#     elif file_extension in ['.xlsx', '.xls']:
-#         print(f"Reading Excel file: {filepath}")
-#         try:
-#             df = pd.read_excel(filepath, engine='openpyxl')
-#         except ImportError:
-#             print("Error: openpyxl not installed. Installing...")
-#             os.system('pip install openpyxl')
-#             df = pd.read_excel(filepath, engine='openpyxl')
-#     else:
-#         raise ValueError(f"Unsupported file format: {file_extension}. Use .csv, .xlsx, or .xls")
-    
-#     return df
-
-# # ===== MAIN CODE =====
->>>>>>> 7dcb3cc55ed0bee3a545032d0d83a3e16868c829
-
-# # Check if file path is provided as argument, otherwise use default
-# if len(sys.argv) > 1:
-#     data_file = sys.argv[1]
-# else:
-#     # Try to find data file automatically
-#     if os.path.exists("data.csv"):
-#         data_file = "data.csv"
-#     elif os.path.exists("data.xlsx"):
-#         data_file = "data.xlsx"
-#     elif os.path.exists("data.xls"):
-#         data_file = "data.xls"
-#     else:
-#         print("Error: No data file found!")
-#         print("Usage: python roiPredictor.py <filepath>")
-#         print("Example: python roiPredictor.py data.csv")
-#         print("         python roiPredictor.py data.xlsx")
-#         sys.exit(1)
-
-<<<<<<< HEAD
+
+# Define features and target
+categorical_cols = CATEGORICAL_COLS
+numerical_cols = NUMERICAL_COLS
+feature_cols = FEATURE_COLS
+target_col = TARGET_COL
+
 print("\nOriginal class distribution:")
 print(df[target_col].value_counts())
 print(df[target_col].value_counts(normalize=True))
@@ -83,23 +131,8 @@ df_fail = df[df[target_col] == 0]
 
 print(f"\nOriginal: {len(df_success)} successful, {len(df_fail)} unsuccessful")
 
-# Downsample majority class to match minority class * 2
-target_size = min(len(df_fail) * 2, len(df_success))
-
-df_success_downsampled = resample(df_success,
-                                  replace=False,
-                                  n_samples=target_size,
-                                  random_state=42)
-
-# Upsample minority class
-df_fail_upsampled = resample(df_fail,
-                             replace=True,
-                             n_samples=target_size // 2,
-                             random_state=42)
-
-# Combine
-df_balanced = pd.concat([df_success_downsampled, df_fail_upsampled])
-df_balanced = df_balanced.sample(frac=1, random_state=42).reset_index(drop=True)
+# Downsample majority class to match minority class * 2, upsample the minority
+df_balanced = balance(df)
 
 print(f"\nBalanced: {len(df_balanced)} total campaigns")
 print("\nBalanced class distribution:")
@@ -115,29 +148,8 @@ X_train, X_test, y_train, y_test = train_test_split(
     X, y, test_size=0.2, random_state=42, stratify=y
 )
 
-# Create preprocessor
-preprocessor = ColumnTransformer(
-    transformers=[
-        ('num', 'passthrough', numerical_cols),
-        ('cat', OneHotEncoder(drop='first', sparse_output=False, handle_unknown='ignore'), 
-         categorical_cols)
-    ],
-    remainder='drop'
-)
-
 # Create pipeline with better settings
-pipeline = Pipeline([
-    ('preprocessor', preprocessor),
-    ('classifier', RandomForestClassifier(
-        n_estimators=200,
-        random_state=42,
-        class_weight=None,  # Already balanced data
-        max_depth=15,
-        min_samples_split=10,
-        min_samples_leaf=4,
-        max_features='sqrt'
-    ))
-])
+pipeline = build_pipeline(**args.params)
 
 # Train
 print("\nTraining balanced pipeline...")
@@ -156,69 +168,11 @@ print("\nPercentages:")
 print(pred_dist / len(y_pred) * 100)
 
 # Save
-os.makedirs('dependencies', exist_ok=True)
-pipeline_path = os.path.join('dependencies', 'roi_pipeline.pkl')
-=======
-# print(f"Using data file: {data_file}")
-# print("=" * 50)
-
-# # Read the data file
-# df = read_data_file(data_file)
-
-# print("\nFirst 5 rows:")
-# print(df.head())
-# print("\nDataframe info:")
-# =======
-# <<<<<<< HEAD
-# import pandas as pd
-# from sklearn.model_selection import train_test_split
-# from sklearn.ensemble import RandomForestClassifier
-# from sklearn.pipeline import Pipeline
-# from sklearn.compose import ColumnTransformer
-# from sklearn.preprocessing import OneHotEncoder
-# from sklearn.metrics import accuracy_score, classification_report
-# import pickle
-# import os
-
-# # Read the csv using pandas
-# df = pd.read_csv("data.csv")
-# print(df.head())
-# >>>>>>> 868b2aa414e10b94ce508c9ffe150317430fda60
-# print(df.info())
-
-# # Check for null values
-# print("\nNull values:")
-# print(df.isnull().sum())
-
-# # Look at distribution
-# print("\nData description:")
-# print(df.describe())
-
-# <<<<<<< HEAD
-# # Data preprocessing
-# # Convert categorical columns into numbers: using one hot encoding
-# categorical_cols = ["Platform", "Content_Type", "Target_Gender", "Region", "Target_Age"]
-
-# # Check if all required columns exist
-# missing_cols = [col for col in categorical_cols if col not in df.columns]
-# if missing_cols:
-#     print(f"\nError: Missing required columns: {missing_cols}")
-#     print(f"Found columns: {list(df.columns)}")
-#     sys.exit(1)
-
-# df = pd.get_dummies(df, columns=categorical_cols)
-
-# # Deciding target and features
-# target_col = "Success"
->>>>>>> 7dcb3cc55ed0bee3a545032d0d83a3e16868c829
-
-# if target_col not in df.columns:
-#     print(f"\nError: Target column '{target_col}' not found in data!")
-#     print(f"Available columns: {list(df.columns)}")
-#     sys.exit(1)
-
-<<<<<<< HEAD
-print(f"\nPipeline saved as {pipeline_path}")
+if state is not None:
+    state.log_run(mode='out-of-core' if args.out_of_core else 'full', rows=state.rows,
+                  trees=len(pipeline.named_steps['classifier'].estimators_),
+                  accuracy=accuracy_score(y_test, y_pred))
+save_pipeline(pipeline, state)
 print("Ready to use with Flask!")
 
 # Test with diverse samples
@@ -239,279 +193,14 @@ test_samples = pd.DataFrame([
 
 predictions = pipeline.predict(test_samples)
 probabilities = pipeline.predict_proba(test_samples)
-=======
-# # Remove features that are calculated FROM or directly determine the Success label
-# leaky_features = ['CTR', 'CPC', 'Conversion_Rate', 'Clicks', 'Conversions']
-
-# # Only remove leaky features that exist
-# leaky_to_remove = [col for col in leaky_features if col in df.columns]
-# columns_to_drop = ["Campaign_ID", target_col] + leaky_to_remove
-
-# # Remove only columns that exist
-# columns_to_drop = [col for col in columns_to_drop if col in df.columns]
-
-# X = df.drop(columns=columns_to_drop)
-# y = df[target_col]
-
-# print("\nFeatures being used:", X.columns.tolist())
-# print(f"Total features: {len(X.columns)}")
-# =======
-# # Define features and target
-# categorical_cols = ["Platform", "Content_Type", "Target_Age", "Target_Gender", "Region"]
-# numerical_cols = ["Budget", "Duration"]
-# feature_cols = numerical_cols + categorical_cols
-# target_col = "Success"
-
-# # Select only the columns we need
-# X = df[feature_cols]
-# y = df[target_col]
-
-# print("\nFeatures being used:", feature_cols)
-# >>>>>>> 868b2aa414e10b94ce508c9ffe150317430fda60
-
-# # Check class distribution
-# print("\nClass distribution:")
-# print(y.value_counts())
-# <<<<<<< HEAD
-# print("\nClass distribution (%):")
-# print(y.value_counts(normalize=True) * 100)
-# =======
-# print(y.value_counts(normalize=True))
-# >>>>>>> 868b2aa414e10b94ce508c9ffe150317430fda60
-
-# # Split Data into Train and Test Sets with stratification
-# X_train, X_test, y_train, y_test = train_test_split(
-#     X, y, test_size=0.2, random_state=42, stratify=y
-# )
-
-# <<<<<<< HEAD
-# print(f"\nTraining set size: {len(X_train)}")
-# print(f"Test set size: {len(X_test)}")
-
-# # Training Model with class balancing
-# print("\n" + "=" * 50)
-# print("Training Random Forest Model...")
-# print("=" * 50)
-
-# model = RandomForestClassifier(
-#     n_estimators=100, 
-#     random_state=42,
-#     class_weight='balanced',
-#     max_depth=10,
-#     min_samples_split=20
-# )
-# model.fit(X_train, y_train)
-
-# print("✓ Model training complete!")
-
-# # Model evaluation
-# y_pred = model.predict(X_test)
-# print("\n" + "=" * 50)
-# print("MODEL EVALUATION")
-# print("=" * 50)
-# print(f"\nAccuracy on test set: {accuracy_score(y_test, y_pred):.4f}")
-# print("\nClassification Report:")
-# print(classification_report(y_test, y_pred))
-# =======
-# # Create preprocessor
-# preprocessor = ColumnTransformer(
-#     transformers=[
-#         ('num', 'passthrough', numerical_cols),
-#         ('cat', OneHotEncoder(drop='first', sparse_output=False, handle_unknown='ignore'), 
-#          categorical_cols)
-#     ],
-#     remainder='drop'  # Drop any other columns
-# )
-
-# # Create pipeline with preprocessing and model
-# pipeline = Pipeline([
-#     ('preprocessor', preprocessor),
-#     ('classifier', RandomForestClassifier(
-#         n_estimators=100, 
-#         random_state=42,
-#         class_weight='balanced',
-#         max_depth=10,
-#         min_samples_split=20
-#     ))
-# ])
-
-# # Train pipeline
-# print("\nTraining pipeline...")
-# pipeline.fit(X_train, y_train)
-
-# # Model evaluation
-# y_pred = pipeline.predict(X_test)
-# print("\nAccuracy on test set:", accuracy_score(y_test, y_pred))
-# print("\nClassification Report:\n", classification_report(y_test, y_pred))
-
-# # Check prediction distribution
-# print("\nPrediction distribution on test set:")
-# print(pd.Series(y_pred).value_counts())
-
-# # Save pipeline
-# os.makedirs('dependencies', exist_ok=True)
-# pipeline_path = os.path.join('dependencies', 'roi_pipeline.pkl')
-
-# with open(pipeline_path, 'wb') as f:
-#     pickle.dump(pipeline, f)
-
-# print(f"\n✅ Pipeline saved as {pipeline_path}")
-# print("✅ Ready to integrate with Flask backend!")
-
-# # Test the pipeline with sample data
-# print("\n--- Testing Pipeline ---")
-# test_sample = pd.DataFrame([{
-#     'Budget': 25000,
-#     'Duration': 30,
-#     'Platform': 'Instagram',
-#     'Content_Type': 'Video',
-#     'Target_Age': '25-34',
-#     'Target_Gender': 'Female',
-#     'Region': 'US'
-# }])
-
-# prediction = pipeline.predict(test_sample)[0]
-# probability = pipeline.predict_proba(test_sample)[0]
-
-# print(f"Test prediction: {prediction}")
-# print(f"Recommendation: {'Invest' if prediction == 1 else 'Avoid'}")
-# print(f"Confidence: {probability[prediction] * 100:.2f}%")
-# =======
-# import pandas as pd
-# from sklearn.model_selection import train_test_split
-# from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
-# from sklearn.preprocessing import LabelEncoder
-# from sklearn.metrics import accuracy_score, classification_report, mean_squared_error, r2_score
->>>>>>> 7dcb3cc55ed0bee3a545032d0d83a3e16868c829
 
 for i in range(len(test_samples)):
     print(f"\nCampaign {i+1}: {test_samples.iloc[i]['Platform']}, ${test_samples.iloc[i]['Budget']}, {test_samples.iloc[i]['Duration']} days")
     print(f"  Prediction: {'SUCCESS (Invest)' if predictions[i] == 1 else 'FAIL (Avoid)'}")
     print(f"  Confidence: {probabilities[i][predictions[i]] * 100:.1f}%")
 
-<<<<<<< HEAD
 print("\n" + "="*60)
 success_count = predictions.sum()
 print(f"Results: {success_count}/4 predicted successful")
 print("If you see VARIED predictions above, the model is working well!")
 print("="*60)
-=======
-# # read the csv using pandas
-# df = pd.read_csv("data.csv")
-# print(df.head())
-# print(df.info())
-
-# #  check for null values
-# print(df.isnull().sum())
-
-# # Look at distribution of key columns like Clicks, Conversions, Budget:
-# print(df.describe())
-
-# # data preprocessing
-#     # Convert categorical columns into numbers: using one hot encoding
-# categorical_cols = ["Platform", "Content_Type", "Target_Gender", "Region","Target_Age"]
-# df = pd.get_dummies(df, columns=categorical_cols)
-
-#     # deciding target  and features
-# target_col = "Success"
-
-# # Remove features that are calculated FROM or directly determine the Success label
-# leaky_features = ['CTR', 'CPC', 'Conversion_Rate', 'Clicks', 'Conversions']
-
-# X = df.drop(columns=["Campaign_ID", target_col] + leaky_features)
-# y = df[target_col]
-
-# print("Features being used:", X.columns.tolist())
-
-# # Check class distribution
-# print("\nClass distribution:")
-# print(y.value_counts())
-# print(y.value_counts(normalize=True))
-
-# # Split Data into Train and Test Sets with stratification
-# X_train, X_test, y_train, y_test = train_test_split(
-#     X, y, test_size=0.2, random_state=42, stratify=y
-# )
-
-# # Training Model with class balancing
-# model = RandomForestClassifier(
-#     n_estimators=100, 
-#     random_state=42,
-#     class_weight='balanced'
-# )
-# model.fit(X_train, y_train)
-
-# # Model evaluation
-# y_pred = model.predict(X_test)
-# print("\nAccuracy on test set:", accuracy_score(y_test, y_pred))
-# print("\nClassification Report:\n", classification_report(y_test, y_pred))
-# >>>>>>> 868b2aa414e10b94ce508c9ffe150317430fda60
-
-# # Check prediction distribution
-# print("\nPrediction distribution on test set:")
-# print(pd.Series(y_pred).value_counts())
-
-# # Recommendations
-# <<<<<<< HEAD
-# # Add predictions and recommendations to dataframe
-# print("\n" + "=" * 50)
-# print("GENERATING PREDICTIONS")
-# print("=" * 50)
-
-# df["Predicted_Success"] = model.predict(X)
-# df["Recommendation"] = ["Invest" if pred == 1 else "Avoid" for pred in df["Predicted_Success"]]
-
-# # Showing first 20 campaigns with predictions
-# =======
-#     # Add predictions and recommendations to dataframe
-# df["Predicted_Success"] = model.predict(X)
-# df["Recommendation"] = ["Invest" if pred == 1 else "Avoid" for pred in df["Predicted_Success"]]
-
-# # Showing first 10 campaigns with predictions
-# >>>>>>> 868b2aa414e10b94ce508c9ffe150317430fda60
-# print("\nSample Recommendations:")
-# print(df[["Campaign_ID", "Predicted_Success", "Recommendation"]].head(20))
-
-# # Show prediction distribution on full dataset
-# print("\nFull dataset prediction distribution:")
-# print(df["Predicted_Success"].value_counts())
-# <<<<<<< HEAD
-# print("\nRecommendation distribution:")
-# print(df["Recommendation"].value_counts())
-
-# # Saving Model for Backend Integration
-# print("\n" + "=" * 50)
-# print("SAVING MODEL")
-# print("=" * 50)
-
-# # Create dependencies folder if it doesn't exist
-# os.makedirs('dependencies', exist_ok=True)
-
-# model_path = os.path.join('dependencies', 'roi_model.pkl')
-
-# with open(model_path, "wb") as f:
-#     pickle.dump(model, f)
-
-# print(f"\n✓ Model saved as {model_path}")
-# print("✓ Ready to integrate with website backend!")
-
-# # Save a sample of predictions to CSV for verification
-# output_file = "predictions_" + os.path.splitext(os.path.basename(data_file))[0] + ".csv"
-# df[["Campaign_ID", "Budget", "Duration", "Predicted_Success", "Recommendation"]].to_csv(output_file, index=False)
-# print(f"✓ Predictions saved to {output_file}")
-
-# print("\n" + "=" * 50)
-# print("DONE!")
-# print("=" * 50)
-# =======
-# print(df["Recommendation"].value_counts())
-
-# #   Saving Model for Backend Integration
-# import pickle
-# with open("roi_model.pkl", "wb") as f:
-#     pickle.dump(model, f)
-
-# print("\nModel saved as roi_model.pkl. Ready to integrate with website backend.")
-# >>>>>>> cfca9b5308dc58eb825b7088b636af14894912aa
-# >>>>>>> 868b2aa414e10b94ce508c9ffe150317430fda60
->>>>>>> 7dcb3cc55ed0bee3a545032d0d83a3e16868c829
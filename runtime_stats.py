@@ -0,0 +1,30 @@
+import os
+import sys
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def memory_usage(pid='self'):
+    """Resident and shared memory of a process in MB.
+
+    Shared pages (libraries, memory-mapped model arrays, copy-on-write pages
+    inherited from the parent) are what forked workers do not pay for twice.
+    Falls back to peak RSS of this process where /proc is unavailable.
+    """
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            _, resident, shared = (int(v) for v in f.read().split()[:3])
+        page_mb = os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+        return {"pid": os.getpid() if pid == 'self' else pid,
+                "rss_mb": round(resident * page_mb, 1),
+                "shared_mb": round(shared * page_mb, 1)}
+    except (OSError, ValueError):
+        if pid != 'self' or resource is None:
+            return {"pid": pid, "rss_mb": None, "shared_mb": None}
+        # ru_maxrss is KB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        return {"pid": os.getpid(), "rss_mb": round(peak / scale, 1), "shared_mb": None}
@@ -0,0 +1,222 @@
+import difflib
+import hashlib
+import re
+from collections import Counter
+from functools import lru_cache
+
+import pandas as pd
+
+REQUIRED = ['Budget', 'Duration', 'Platform', 'Content_Type',
+            'Target_Gender', 'Region', 'Target_Age']
+
+CATEGORICAL_COLS = ['Platform', 'Content_Type', 'Target_Gender', 'Region', 'Target_Age']
+
+# Carried through to the scored rows when the upload has it, so results can be matched up
+ID_COLUMN = 'Campaign_ID'
+
+# Declared up front instead of inferred per file. Categoricals are parsed
+# straight into codes + a small per-file dictionary, never as row strings.
+DTYPES = {
+    'Budget': 'float64',
+    'Duration': 'float64',
+    'Platform': 'category',
+    'Content_Type': 'category',
+    'Target_Gender': 'category',
+    'Region': 'category',
+    'Target_Age': 'category',
+    ID_COLUMN: str
+}
+
+# Header spellings (after header_key()) accepted for each column. Only names
+# that cannot mean anything else: 'cost', 'content' or 'id' are left to pass
+# through untouched rather than guessed at.
+SYNONYMS = {
+    'Budget': ['budget', 'spend', 'ad_spend', 'total_budget', 'campaign_budget'],
+    'Duration': ['duration', 'duration_days', 'campaign_duration', 'run_days'],
+    'Platform': ['platform', 'channel', 'network', 'ad_platform'],
+    'Content_Type': ['content_type', 'creative', 'creative_type', 'ad_format', 'ad_type'],
+    'Target_Gender': ['target_gender', 'gender', 'sex', 'audience_gender'],
+    'Region': ['region', 'country', 'market', 'geo', 'location', 'target_region'],
+    'Target_Age': ['target_age', 'age', 'age_group', 'agegroup', 'age_range', 'age_bracket',
+                   'audience_age', 'target_age_group'],
+    ID_COLUMN: ['campaign_id', 'campaignid']
+}
+
+# difflib ratio a header needs to count as a misspelling of a required column's
+# synonym; shorter headers are too easy to confuse ('age' / 'page') and must
+# match exactly. Campaign_ID is optional and never guessed ('Campaign_Name').
+FUZZY_CUTOFF = 0.8
+FUZZY_MIN_LENGTH = 5
+# Distinct headers whose resolution is remembered
+HEADER_CACHE_SIZE = 1024
+
+
+class HeaderError(ValueError):
+    """Raised when an upload's header cannot be mapped onto the model's columns."""
+
+    def __init__(self, message, found):
+        super().__init__(message)
+        self.found = found
+
+
+class MissingColumnsError(HeaderError):
+    """Raised when an upload does not have every required feature column."""
+
+    def __init__(self, missing, found):
+        super().__init__(f"Missing columns: {missing}", found)
+        self.missing = missing
+
+
+class AmbiguousColumnsError(HeaderError):
+    """Raised when several headers could be the same column. candidates maps column -> headers."""
+
+    def __init__(self, candidates, found):
+        details = '; '.join(f"{target} could be any of {names}" for target, names in candidates.items())
+        super().__init__(f"Ambiguous columns: {details}", found)
+        self.candidates = candidates
+
+
+class HeaderMapping:
+    """How one header layout maps onto the model's columns.
+
+    columns are the source headers to read (in file order): the mapped ones
+    plus any others passed through as they are. rename maps the mapped ones
+    to the model's names and dtypes is keyed by source header for read_csv.
+    Passed-through columns are read as text: their type is never inferred,
+    so a late row cannot contradict what the first block of a file implied.
+    """
+
+    def __init__(self, fingerprint, columns, rename):
+        self.fingerprint = fingerprint
+        self.columns = columns
+        self.rename = rename
+        self.dtypes = {source: DTYPES[rename[source]] if source in rename else str
+                       for source in columns}
+
+    def apply(self, df):
+        """Select the columns of a frame read with this header, the mapped ones renamed."""
+        if list(df.columns) == self.columns and all(s == t for s, t in self.rename.items()):
+            return df
+        return df[self.columns].rename(columns=self.rename)
+
+
+def header_key(name):
+    """'Content Type ', 'content-type' and 'CONTENT_TYPE' all become 'content_type'."""
+    return re.sub(r'[^0-9a-z]+', '_', str(name).strip().lower()).strip('_')
+
+
+def fingerprint(header):
+    return hashlib.sha1('\x1f'.join(header).encode('utf-8')).hexdigest()[:12]
+
+
+# header_key -> (column, preference); earlier synonyms win when a file has several
+_SYNONYM_KEYS = {key: (target, rank) for target, keys in SYNONYMS.items()
+                 for rank, key in enumerate(keys)}
+
+
+@lru_cache(maxsize=HEADER_CACHE_SIZE)
+def _resolve(header):
+    keys = [header_key(name) for name in header]
+
+    # Exact synonyms first. A column's own name beats its aliases; anything
+    # else that leaves two headers for one column is ambiguous.
+    exact = {}
+    for name, key in zip(header, keys):
+        if key in _SYNONYM_KEYS:
+            target, rank = _SYNONYM_KEYS[key]
+            exact.setdefault(target, []).append((rank, name))
+    resolved, ambiguous = {}, {}
+    for target, found in exact.items():
+        found.sort()
+        if len(found) == 1 or found[0][0] == 0 < found[1][0]:
+            resolved[found[0][1]] = target
+        else:
+            ambiguous[target] = [name for _, name in found]
+
+    # Then close misspellings of required columns still missing
+    missing = [col for col in REQUIRED if col not in resolved.values() and col not in ambiguous]
+    if missing:
+        candidates = {key: target for key, (target, _) in _SYNONYM_KEYS.items() if target in missing}
+        close = {}
+        for name, key in zip(header, keys):
+            if key in _SYNONYM_KEYS or len(key) < FUZZY_MIN_LENGTH:
+                continue
+            targets = {candidates[match] for match in
+                       difflib.get_close_matches(key, candidates, n=3, cutoff=FUZZY_CUTOFF)}
+            # A header close to two columns' names is not evidence for either
+            if len(targets) == 1:
+                close.setdefault(targets.pop(), []).append(name)
+        for target, names in close.items():
+            if len(names) == 1:
+                resolved[names[0]] = target
+            else:
+                ambiguous[target] = names
+
+    if ambiguous:
+        raise AmbiguousColumnsError(ambiguous, list(header))
+    missing = [col for col in REQUIRED if col not in resolved.values()]
+    if missing:
+        raise MissingColumnsError(missing, list(header))
+
+    passthrough = _passthrough(header, resolved)
+    columns = [name for name in header if name in resolved or name in passthrough]
+    return HeaderMapping(fingerprint(header), columns, resolved)
+
+
+def _passthrough(header, resolved):
+    """The unmapped headers carried through to the scored rows as they are.
+
+    Blank and repeated headers are left out: readers name those differently
+    (pandas 'Unnamed: 3' and 'x.1', pyarrow '' and 'x'), so they can't be
+    picked by name.
+    """
+    counts = Counter(header)
+    for name in header:
+        repeat = re.fullmatch(r'(.+)\.\d+', name)
+        if repeat and repeat.group(1) in counts:
+            counts[name] += 1
+            counts[repeat.group(1)] += 1
+    return {name for name in header
+            if name not in resolved and name.strip() and counts[name] == 1
+            and not name.startswith('Unnamed: ')}
+
+
+def resolve_header(columns):
+    """Map a header onto the model's columns. Cached per distinct header.
+
+    Raises MissingColumnsError when a required column can't be found and
+    AmbiguousColumnsError when several headers could be the same column.
+    """
+    return _resolve(tuple(str(name) for name in columns))
+
+
+def header_cache_info():
+    return _resolve.cache_info()
+
+
+def read_header(source, encoding):
+    """The header row of a CSV path or seekable stream (left where it started)."""
+    if hasattr(source, 'seek'):
+        start = source.tell()
+        header = pd.read_csv(source, nrows=0, encoding=encoding).columns
+        source.seek(start)
+        return header
+    return pd.read_csv(source, nrows=0, encoding=encoding).columns
+
+
+def arrow_column_types(mapping):
+    """DTYPES as pyarrow types, keyed by source header (for pyarrow.csv)."""
+    import pyarrow as pa
+
+    types = {'float64': pa.float64(), 'category': pa.dictionary(pa.int32(), pa.string()),
+             str: pa.string()}
+    return {source: types[dtype] for source, dtype in mapping.dtypes.items()}
+
+
+def csv_read_options(source, encoding):
+    """read_csv keyword arguments that parse the mapping's columns, the mapped ones typed.
+
+    Returns (mapping, kwargs); apply the mapping to each parsed frame.
+    """
+    mapping = resolve_header(read_header(source, encoding))
+    return mapping, {"encoding": encoding, "usecols": mapping.columns, "dtype": mapping.dtypes}
@@ -0,0 +1,105 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_CACHE_SIZE = 100000
+
+
+class ScoreCache:
+    """LRU cache of (prediction, probability) per campaign configuration.
+
+    Keys are the 7 model features as the model sees them: Budget/Duration
+    rounded through float32 (the precision the trees compare at) and the
+    category strings untouched. Entries belong to one model version; binding
+    a different version empties the cache.
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.model_version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bind(self, model_version):
+        with self._lock:
+            if model_version != self.model_version:
+                self._entries.clear()
+                self.model_version = model_version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_many(self, keys):
+        """Return a list with the cached (prediction, probability) or None per key."""
+        found = []
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key)
+                if value is None:
+                    self.misses += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                found.append(value)
+        return found
+
+    def put_many(self, keys, predictions, probabilities):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            for key, prediction, probability in zip(keys, predictions, probabilities):
+                self._entries[key] = (prediction, probability)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "model_version": self.model_version,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups * 100, 2) if lookups else 0.0
+        }
+
+
+def cache_keys(X, columns):
+    """Normalise the feature columns of X into hashable per-row keys.
+
+    Returns (keys of the distinct rows, index of each row into those keys,
+    position of the first row with each key).
+    """
+    key_df = X[columns].copy()
+    for col in ('Budget', 'Duration'):
+        key_df[col] = np.asarray(key_df[col], dtype=np.float64).astype(np.float32).astype(np.float64)
+
+    # Groups are numbered in order of first appearance
+    row_group = key_df.groupby(columns, sort=False, dropna=False, observed=True).ngroup().to_numpy()
+    first_row = np.unique(row_group, return_index=True)[1]
+    distinct = key_df.iloc[first_row]
+    return list(distinct.itertuples(index=False, name=None)), row_group, first_row
+
+
+def score_with_cache(cache, score_fn, X, columns):
+    """Score X through score_fn, only for configurations not already cached."""
+    keys, row_group, first_row = cache_keys(X, columns)
+    found = cache.get_many(keys)
+
+    missing = [i for i, value in enumerate(found) if value is None]
+    if missing:
+        miss_df = X.iloc[first_row[missing]]
+        miss_predictions, miss_probabilities = score_fn(miss_df)
+        miss_keys = [keys[i] for i in missing]
+        cache.put_many(miss_keys, miss_predictions, miss_probabilities)
+        for i, prediction, probability in zip(missing, miss_predictions, miss_probabilities):
+            found[i] = (prediction, probability)
+
+    predictions = np.array([value[0] for value in found])
+    probabilities = np.array([value[1] for value in found], dtype=np.float64)
+    return predictions[row_group], probabilities[row_group]
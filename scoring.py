@@ -0,0 +1,147 @@
+from admission import check_deadline
+from aggregates import AggregateCube
+from ingest import iter_csv_typed
+from metrics import ROWS_SCORED, stage
+from schema import REQUIRED, HeaderError, resolve_header
+from score_cache import score_with_cache
+
+# Rows per chunk when streaming a CSV through the model
+DEFAULT_CHUNK_ROWS = 50000
+PREVIEW_ROWS = 100
+
+
+def normalize_columns(df):
+    """Rename the model's columns (and Campaign_ID) to their canonical names.
+
+    Other columns pass through untouched, apart from blank or repeated headers.
+
+    The header is resolved once per distinct layout (see schema.resolve_header).
+    """
+    if not all(isinstance(name, str) for name in df.columns):
+        df.columns = df.columns.map(str)
+    return resolve_header(df.columns).apply(df)
+
+
+def score(model, use_pipeline, df, cache=None, pool=None):
+    """Return (predictions, probabilities) for the required columns of df.
+
+    With a ScoreCache, only configurations it has not seen reach the model.
+    With a PredictionPool, large frames are scored across its workers.
+    """
+    def score_fn(X):
+        if pool is not None and pool.should_shard(len(X)):
+            with stage('pool'):
+                return pool.score(X[REQUIRED])
+        return score_model(model, use_pipeline, X)
+
+    check_deadline()
+    ROWS_SCORED.inc(len(df))
+    if cache is not None and cache.max_size > 0:
+        return score_with_cache(cache, score_fn, df[REQUIRED], REQUIRED)
+    return score_fn(df)
+
+
+def score_model(model, use_pipeline, df):
+    """Score df with the model in this process."""
+    X = df[REQUIRED]
+    if hasattr(model, 'predict_with_proba'):
+        # Compiled engine or the old model: one encode, one pass over the forest
+        predictions, proba = model.predict_with_proba(X)
+        return predictions, proba[:, 1]
+    with stage('predict'):
+        predictions = model.predict(X)
+    with stage('predict_proba'):
+        probabilities = model.predict_proba(X)[:, 1]
+    return predictions, probabilities
+
+
+def add_results(df, predictions, probabilities):
+    df['Predicted_Success'] = predictions
+    df['Success_Probability'] = probabilities * 100
+    df['Recommendation'] = ['Invest' if p == 1 else 'Avoid' for p in predictions]
+    return df
+
+
+class ScoreSummary:
+    """Running totals for the /predict stats, folded one chunk at a time."""
+
+    def __init__(self, preview_rows=PREVIEW_ROWS):
+        self.preview_rows = preview_rows
+        self.total = 0
+        self.successful = 0
+        self.probability_sum = 0.0
+        self.campaigns = []
+        # Breakdowns over every row, not just the preview
+        self.aggregates = AggregateCube()
+
+    def add(self, scored_df, predictions, probabilities):
+        self.total += len(predictions)
+        self.successful += int(predictions.sum())
+        self.probability_sum += float(probabilities.sum())
+        with stage('aggregate'):
+            self.aggregates.add(scored_df, predictions, probabilities)
+
+        room = self.preview_rows - len(self.campaigns)
+        if room > 0:
+            self.campaigns.extend(scored_df.head(room).to_dict(orient='records'))
+
+    def merge(self, other):
+        """Fold another summary's totals (not its preview rows) into this one."""
+        self.total += other.total
+        self.successful += other.successful
+        self.probability_sum += other.probability_sum
+        self.aggregates.merge(other.aggregates)
+
+    def as_dict(self):
+        total = self.total
+        success_rate = (self.successful / total) * 100 if total else 0.0
+        avg_confidence = (self.probability_sum / total) * 100 if total else 0.0
+        return {
+            "total_campaigns": total,
+            "predicted_successful": self.successful,
+            "predicted_unsuccessful": total - self.successful,
+            "success_rate": round(success_rate, 2),
+            "avg_confidence": round(avg_confidence, 2),
+            "aggregates": self.aggregates.as_dict(),
+            "campaigns": self.campaigns
+        }
+
+
+def iter_scored_chunks(model, use_pipeline, chunks, cache=None, pool=None):
+    """Yield (scored_chunk, predictions, probabilities) for each DataFrame chunk."""
+    chunks = iter(chunks)
+    while True:
+        check_deadline()
+        with stage('read'):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        with stage('validate'):
+            chunk = normalize_columns(chunk)
+        predictions, probabilities = score(model, use_pipeline, chunk,
+                                            cache=cache, pool=pool)
+        add_results(chunk, predictions, probabilities)
+        yield chunk, predictions, probabilities
+
+
+def score_chunks(model, use_pipeline, chunks, cache=None, pool=None, on_chunk=None):
+    """Score an iterable of DataFrame chunks into one ScoreSummary.
+
+    on_chunk(index, scored_chunk) is called after each chunk, e.g. to write
+    the scored rows somewhere or report progress.
+    """
+    summary = ScoreSummary()
+    scored = iter_scored_chunks(model, use_pipeline, chunks, cache=cache, pool=pool)
+    for i, (chunk, predictions, probabilities) in enumerate(scored):
+        summary.add(chunk, predictions, probabilities)
+        if on_chunk is not None:
+            on_chunk(i, chunk)
+    return summary
+
+
+def csv_chunks(source, chunk_rows=DEFAULT_CHUNK_ROWS, encoding=None):
+    """Iterate a CSV path or seekable stream in DataFrames of about chunk_rows rows.
+
+    Only the mapped columns are parsed, typed (see ingest.iter_csv_typed).
+    """
+    return iter_csv_typed(source, chunk_rows, encoding)
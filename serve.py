@@ -0,0 +1,143 @@
+"""Run app.py under a production WSGI server.
+
+    python serve.py [--port 5000] [--threads 24] [--processes 1] [--server auto]
+
+One process with a thread pool (waitress, or gunicorn's gthread worker)
+loads the model once and every thread shares it, with its score cache and
+prediction pool. --processes N (gunicorn only) forks N such processes from
+a parent that has already loaded the model, so they share its memory
+copy-on-write (and the exported engine's memory-mapped forest through the page
+cache); each gets its own prediction pool. Background jobs live in the
+process that accepted them, so with several processes clients polling
+/predict/jobs must reach the same one (sticky sessions). /models/activate
+swaps only the process that answers it; the others follow the registry's
+ACTIVE file, which every process polls (MODEL_WATCH_SECONDS, default
+WATCH_SECONDS when there are several processes).
+
+Threads only bound the connections being served. What keeps latency
+predictable under a burst is the app's admission gate (MAX_IN_FLIGHT,
+MAX_QUEUED, QUEUE_SECONDS), which answers excess requests at once with a
+429/503, and REQUEST_TIMEOUT_SECONDS / MAX_UPLOAD_MB, which bound what
+one request can take. By default the server gets enough threads for the
+gate's in-flight and queued requests plus a few for health checks and
+job polling, so the gate and not the server's own queue decides who waits.
+"""
+import argparse
+import os
+import sys
+
+from admission import DEFAULT_MAX_IN_FLIGHT, DEFAULT_MAX_QUEUED, DEFAULT_REQUEST_TIMEOUT
+
+# Threads beyond the gate's limits, for requests it never holds back (GETs)
+SPARE_THREADS = 4
+# Pending connections the OS keeps before refusing more
+DEFAULT_BACKLOG = 256
+# Seconds an idle keep-alive connection is kept open
+IDLE_SECONDS = 30
+# Seconds between checks of the registry's ACTIVE file with several processes
+WATCH_SECONDS = 5
+
+
+def default_threads():
+    max_in_flight = int(os.environ.get('MAX_IN_FLIGHT', DEFAULT_MAX_IN_FLIGHT))
+    max_queued = int(os.environ.get('MAX_QUEUED', DEFAULT_MAX_QUEUED))
+    return max_in_flight + max_queued + SPARE_THREADS
+
+
+def available(module):
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+def run_waitress(args):
+    from waitress import serve
+
+    from app import app
+    serve(app, host=args.host, port=args.port, threads=args.threads,
+          connection_limit=args.threads + args.backlog, backlog=args.backlog,
+          channel_timeout=IDLE_SECONDS, ident='roi-predictor')
+
+
+def run_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    request_timeout = float(os.environ.get('REQUEST_TIMEOUT_SECONDS', DEFAULT_REQUEST_TIMEOUT))
+    if args.processes > 1:
+        # Read by app.py at import: each process then follows model activations made in another
+        os.environ.setdefault('MODEL_WATCH_SECONDS', str(WATCH_SECONDS))
+
+    def when_ready(server):
+        # The model is loaded; the processes about to be forked start their own pools
+        import app as app_module
+        app_module.model_server.before_fork()
+
+    def post_fork(server, worker):
+        import app as app_module
+        app_module.model_server.after_fork()
+
+    class Server(BaseApplication):
+        def load_config(self):
+            settings = {
+                'bind': f'{args.host}:{args.port}',
+                'workers': args.processes,
+                'worker_class': 'gthread',
+                'threads': args.threads,
+                'backlog': args.backlog,
+                'keepalive': IDLE_SECONDS,
+                # Load app.py (and the model) once, before forking the processes
+                'preload_app': True,
+                'when_ready': when_ready,
+                'post_fork': post_fork,
+                # Past the app's own deadline, a process that stops answering is replaced
+                'timeout': int(request_timeout) + 30 if request_timeout else 0,
+                'graceful_timeout': 30,
+            }
+            for key, value in settings.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import app
+            return app
+
+    Server().run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the ROI predictor API.")
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--server', choices=['auto', 'waitress', 'gunicorn'],
+                        default=os.environ.get('SERVER', 'auto'),
+                        help="auto: waitress for one process, gunicorn for several")
+    parser.add_argument('--processes', type=int, default=int(os.environ.get('SERVER_PROCESSES', 1)),
+                        help="server processes sharing the preloaded model (gunicorn)")
+    parser.add_argument('--threads', type=int,
+                        default=int(os.environ.get('SERVER_THREADS', default_threads())),
+                        help="request threads per process (default: in-flight + queued + spare)")
+    parser.add_argument('--backlog', type=int, default=int(os.environ.get('SERVER_BACKLOG', DEFAULT_BACKLOG)))
+    args = parser.parse_args()
+
+    server = args.server
+    if server == 'auto':
+        if args.processes > 1 or not available('waitress'):
+            server = 'gunicorn'
+        else:
+            server = 'waitress'
+    if server == 'waitress' and args.processes > 1:
+        sys.exit("waitress runs one process; use --server gunicorn for --processes > 1")
+    if not available(server):
+        sys.exit(f"{server} is not installed: pip install -r requirements-flask.txt")
+
+    print(f"Serving on http://{args.host}:{args.port} with {server}: "
+          f"{args.processes} process(es) x {args.threads} threads")
+    if server == 'gunicorn':
+        run_gunicorn(args)
+    else:
+        run_waitress(args)
+
+
+if __name__ == '__main__':
+    main()
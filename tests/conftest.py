@@ -0,0 +1,66 @@
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from training import FEATURE_COLS, TARGET_COL, build_pipeline  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def campaigns():
+    return pd.read_csv(os.path.join(ROOT, 'data.csv'))
+
+
+@pytest.fixture(scope='session')
+def pipeline(campaigns):
+    """A small forest fitted on data.csv with some budgets missing, so its splits route NaN."""
+    X = campaigns[FEATURE_COLS].copy()
+    X.loc[X.sample(frac=0.1, random_state=0).index, 'Budget'] = np.nan
+    return build_pipeline(n_jobs=1, n_estimators=10).fit(X, campaigns[TARGET_COL])
+
+
+@pytest.fixture
+def with_missing(campaigns):
+    """The campaigns with holes in both numbers and one category."""
+    X = campaigns[FEATURE_COLS].copy()
+    rng = np.random.default_rng(1)
+    for col, share in (('Budget', 0.2), ('Duration', 0.2), ('Platform', 0.1)):
+        X.loc[rng.random(len(X)) < share, col] = np.nan
+    return X
+
+
+@pytest.fixture(scope='session')
+def app_module(pipeline, tmp_path_factory):
+    """app.py serving the test pipeline from a scratch directory, one request at a time.
+
+    app reads its config and loads the model at import, so the environment
+    and dependencies/ are set up first.
+    """
+    workdir = tmp_path_factory.mktemp('server')
+    os.makedirs(workdir / 'dependencies')
+    with open(workdir / 'dependencies' / 'roi_pipeline.pkl', 'wb') as f:
+        pickle.dump(pipeline, f)
+    previous = os.getcwd()
+    os.chdir(workdir)
+    env = pytest.MonkeyPatch()
+    env.setenv('MAX_IN_FLIGHT', '1')
+    env.setenv('MAX_QUEUED', '1')
+    env.setenv('QUEUE_SECONDS', '0.5')
+    env.setenv('UPLOAD_STORE_BYTES', str(1 << 20))
+    try:
+        import app
+        yield app
+    finally:
+        env.undo()
+        os.chdir(previous)
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,75 @@
+import io
+import time
+
+import pytest
+
+from admission import (AdmissionGate, Overloaded, RequestTimeout, check_deadline, current_deadline,
+                       iter_with_deadline)
+
+
+def test_gate_queues_then_turns_away():
+    gate = AdmissionGate(max_in_flight=1, max_queued=0, queue_seconds=0.01)
+    gate.enter()
+    with pytest.raises(Overloaded) as excinfo:
+        gate.enter()
+    assert excinfo.value.status == 429
+
+    gate = AdmissionGate(max_in_flight=1, max_queued=1, queue_seconds=0.01)
+    gate.enter()
+    with pytest.raises(Overloaded) as excinfo:
+        gate.enter()
+    assert excinfo.value.status == 503
+    gate.leave()
+    gate.enter()
+    assert gate.stats()['in_flight'] == 1
+
+
+def upload(campaigns, rows=20):
+    return {'file': (io.BytesIO(campaigns.head(rows).to_csv(index=False).encode()), 'campaigns.csv')}
+
+
+@pytest.mark.parametrize('fmt', ['json', 'ndjson'])
+def test_test_client_requests_release_their_turn(client, app_module, campaigns, fmt):
+    # One turn in total: a request that kept it would turn the next one away
+    for _ in range(3):
+        response = client.post(f'/predict?format={fmt}', data=upload(campaigns),
+                               content_type='multipart/form-data')
+        response.get_data()
+        assert response.status_code == 200
+    assert app_module.admission.stats()['in_flight'] == 0
+
+
+def test_streamed_response_holds_its_turn_until_closed(client, app_module, campaigns):
+    app_module.app.config['STREAM_THRESHOLD_BYTES'] = 0
+    try:
+        with client.post('/predict?format=ndjson', data=upload(campaigns),
+                         content_type='multipart/form-data') as response:
+            assert response.is_streamed
+            assert app_module.admission.stats()['in_flight'] == 1
+            response.get_data()
+        assert app_module.admission.stats()['in_flight'] == 0
+    finally:
+        app_module.app.config['STREAM_THRESHOLD_BYTES'] = 50 * 1024 * 1024
+
+
+def test_body_generated_later_keeps_the_deadline():
+    def body():
+        for _ in range(3):
+            check_deadline()
+            yield b'rows'
+
+    assert list(iter_with_deadline(time.monotonic() + 60, body())) == [b'rows'] * 3
+    with pytest.raises(RequestTimeout):
+        list(iter_with_deadline(time.monotonic() - 1, body()))
+    assert current_deadline() is None
+
+
+def test_scoring_errors_stay_out_of_the_response(client, app_module, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("secret detail")
+
+    monkeypatch.setattr(app_module, 'read_upload', fail)
+    response = client.post('/predict', data={'file': (io.BytesIO(b'Budget\n1\n'), 'x.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 500
+    assert response.get_json() == {"error": "Internal server error"}
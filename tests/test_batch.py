@@ -0,0 +1,43 @@
+import io
+import zipfile
+
+import pytest
+
+from batch import ArchiveTooLarge, zip_sources
+from schema import REQUIRED
+
+
+def _archive(campaigns, copies):
+    buffer = io.BytesIO()
+    csv = campaigns[REQUIRED].to_csv(index=False)
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for n in range(copies):
+            zf.writestr(f'part{n}.csv', csv)
+    buffer.seek(0)
+    return buffer, len(csv)
+
+
+def test_zip_members_unpacked(campaigns):
+    archive, size = _archive(campaigns, 2)
+    sources = zip_sources(archive, max_bytes=2 * size)
+    try:
+        assert [name for name, _ in sources] == ['part0.csv', 'part1.csv']
+    finally:
+        for _, stream in sources:
+            stream.close()
+
+
+def test_zip_over_limit_refused_before_unpacking(campaigns, monkeypatch):
+    archive, size = _archive(campaigns, 2)
+    monkeypatch.setattr(zipfile.ZipFile, 'open', lambda *args, **kwargs: pytest.fail("unpacked"))
+    with pytest.raises(ArchiveTooLarge):
+        zip_sources(archive, max_bytes=2 * size - 1)
+
+
+def test_batch_upload_unpacking_past_limit(client, app_module, campaigns, monkeypatch):
+    archive, size = _archive(campaigns, 4)
+    assert len(archive.getvalue()) < size
+    monkeypatch.setitem(app_module.app.config, 'MAX_CONTENT_LENGTH', 2 * size)
+    response = client.post('/predict/batch', data={'files': (archive, 'campaigns.zip')})
+    assert response.status_code == 413
+    assert 'unpack' in response.get_json()['error']
@@ -0,0 +1,60 @@
+import json
+
+import numpy as np
+import pytest
+
+from forest_engine import SMALL_BATCH_ROWS, compile_pipeline
+from model_store import engine_version, load_engine, save_engine
+from training import FEATURE_COLS
+
+
+@pytest.fixture(params=['compiled', 'exported'])
+def engine(request, pipeline, tmp_path):
+    engine = compile_pipeline(pipeline)
+    if request.param == 'exported':
+        save_engine(engine, str(tmp_path / 'engine'), 'v1')
+        engine, version = load_engine(str(tmp_path / 'engine'))
+        assert version == 'v1' and engine.pipeline is None
+    return engine
+
+
+def test_matches_pipeline(engine, pipeline, campaigns):
+    X = campaigns[FEATURE_COLS]
+    np.testing.assert_array_equal(engine.predict_proba(X), pipeline.predict_proba(X))
+
+
+@pytest.mark.parametrize('rows', [SMALL_BATCH_ROWS // 2, None])
+def test_missing_values_match_pipeline(engine, pipeline, with_missing, rows):
+    # Both the small-batch walk and sklearn's own tree walk
+    X = with_missing.iloc[:rows]
+    np.testing.assert_array_equal(engine.predict_proba(X), pipeline.predict_proba(X))
+    np.testing.assert_array_equal(engine.predict(X), pipeline.predict(X))
+
+
+def test_exported_forest_stays_mapped(pipeline, tmp_path):
+    save_engine(compile_pipeline(pipeline), str(tmp_path), 'v1')
+    engine, _ = load_engine(str(tmp_path))
+    assert engine.trees is None
+    for array in (engine.value_by_class, engine._children, engine._feature,
+                  engine._threshold, engine._missing_left):
+        assert isinstance(array, np.memmap)
+    assert engine.memory_layout()['private_bytes'] == 0
+    assert compile_pipeline(pipeline).memory_layout()['mapped_bytes'] == 0
+
+
+def test_exported_split_thresholds(pipeline, tmp_path):
+    compiled = compile_pipeline(pipeline)
+    save_engine(compiled, str(tmp_path), 'v1')
+    engine, _ = load_engine(str(tmp_path))
+    for position in range(compiled.n_features):
+        expected = np.concatenate([tree.threshold[tree.feature == position]
+                                   for tree in compiled.trees])
+        np.testing.assert_array_equal(engine.split_thresholds(position), expected)
+
+
+def test_older_export_format_ignored(pipeline, tmp_path):
+    save_engine(compile_pipeline(pipeline), str(tmp_path), 'v1')
+    meta = json.loads((tmp_path / 'meta.json').read_text())
+    del meta['format']
+    (tmp_path / 'meta.json').write_text(json.dumps(meta))
+    assert engine_version(str(tmp_path)) is None
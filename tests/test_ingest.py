@@ -0,0 +1,37 @@
+import io
+
+import pandas as pd
+import pytest
+
+import ingest
+from ingest import iter_excel_typed, read_upload
+from schema import REQUIRED
+
+
+@pytest.fixture
+def workbook(campaigns):
+    buffer = io.BytesIO()
+    campaigns.head(250).to_excel(buffer, index=False)
+    buffer.seek(0)
+    return buffer
+
+
+class NoCalamine:
+    @staticmethod
+    def load_workbook(source):
+        raise AssertionError("calamine loads the whole sheet")
+
+
+def test_chunked_xlsx_reads_stream_the_sheet(workbook, campaigns, monkeypatch):
+    monkeypatch.setattr(ingest, '_calamine', lambda: NoCalamine)
+    chunks = list(iter_excel_typed(workbook, chunk_rows=100))
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+    df = pd.concat(chunks, ignore_index=True)
+    assert df['Budget'].tolist() == campaigns['Budget'].head(250).astype(float).tolist()
+
+
+def test_whole_read_matches_chunked(workbook):
+    whole = read_upload(workbook, 'campaigns.xlsx')
+    workbook.seek(0)
+    chunked = pd.concat(iter_excel_typed(workbook, chunk_rows=100), ignore_index=True)
+    pd.testing.assert_frame_equal(whole[REQUIRED], chunked[REQUIRED], check_categorical=False)
@@ -0,0 +1,92 @@
+import io
+import threading
+import time
+
+import pytest
+
+from schema import REQUIRED
+
+
+def submit(client, df, filename='campaigns.csv'):
+    response = client.post('/predict/jobs', data={'file': (io.BytesIO(df.to_csv(index=False).encode()),
+                                                           filename)},
+                           content_type='multipart/form-data')
+    assert response.status_code == 202
+    return response.get_json()
+
+
+def wait(client, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f'/predict/jobs/{job_id}').get_json()
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.02)
+    pytest.fail(f"job {job_id} still {job['status']}")
+
+
+@pytest.fixture
+def small_chunks(app_module, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'STREAM_CHUNK_ROWS', 64)
+
+
+def test_job_lifecycle(client, app_module, campaigns, small_chunks):
+    # Hold the job workers so the job is seen queued
+    gate = threading.Event()
+    holders = app_module.model_server.active.in_flight()
+    blockers = [app_module.job_store._executor.submit(gate.wait) for _ in range(2)]
+    try:
+        created = submit(client, campaigns[REQUIRED].head(300))
+        assert created['status'] == 'queued'
+        assert created['status_url'] == f"/predict/jobs/{created['job_id']}"
+        response = client.get(created['results_url'])
+        assert response.status_code == 409 and response.get_json()['status'] == 'queued'
+        assert app_module.model_server.active.in_flight() == holders + 1
+    finally:
+        gate.set()
+        for blocker in blockers:
+            blocker.result()
+
+    job = wait(client, created['job_id'])
+    assert job['status'] == 'done' and job['rows_scored'] == 300
+    assert job['summary']['total_campaigns'] == 300
+    assert job['model_version'] == app_module.model_server.active.version
+    # The job let go of the model when it finished
+    assert app_module.model_server.active.in_flight() == holders
+
+
+def test_results_paging(client, pipeline, campaigns, small_chunks):
+    df = campaigns[REQUIRED].head(250)
+    job = wait(client, submit(client, df)['job_id'])
+    url = f"/predict/jobs/{job['job_id']}/results"
+
+    rows, offset = [], 0
+    while offset is not None:
+        page = client.get(f'{url}?offset={offset}&limit=100').get_json()
+        assert page['total'] == 250 and page['offset'] == offset
+        assert len(page['campaigns']) == min(100, 250 - offset)
+        rows.extend(page['campaigns'])
+        offset = page['next_offset']
+    assert len(rows) == 250
+    expected = pipeline.predict_proba(df)[:, 1] * 100
+    assert [row['Success_Probability'] for row in rows] == pytest.approx(expected.tolist())
+    assert [row['Budget'] for row in rows] == df['Budget'].tolist()
+
+    past_end = client.get(f'{url}?offset=1000').get_json()
+    assert past_end['campaigns'] == [] and past_end['next_offset'] is None
+
+
+def test_failed_job_reports_the_header(client, campaigns):
+    job = wait(client, submit(client, campaigns[REQUIRED].drop(columns=['Budget']).head(10))['job_id'])
+    assert job['status'] == 'failed'
+    assert 'Budget' in job['error']
+    assert client.get(f"/predict/jobs/{job['job_id']}/results").status_code == 409
+
+
+def test_unknown_job_and_bad_uploads(client):
+    assert client.get('/predict/jobs/nope').status_code == 404
+    assert client.get('/predict/jobs/nope/results').status_code == 404
+    assert client.post('/predict/jobs', data={}).status_code == 400
+    response = client.post('/predict/jobs', data={'file': (io.BytesIO(b'x'), 'campaigns.txt')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
@@ -0,0 +1,60 @@
+import pytest
+
+from schema import REQUIRED
+
+
+@pytest.fixture
+def records(campaigns):
+    return campaigns[REQUIRED].head(20).to_dict(orient='records')
+
+
+def test_predict_one_matches_pipeline(client, pipeline, campaigns, records):
+    response = client.post('/predict/one', json=records[0])
+    assert response.status_code == 200
+    expected = pipeline.predict_proba(campaigns[REQUIRED].head(1))[0, 1]
+    assert response.get_json()['campaign']['Success_Probability'] == expected * 100
+
+
+@pytest.mark.parametrize('wrap', [False, True])
+def test_predict_records_matches_pipeline(client, pipeline, campaigns, records, wrap):
+    response = client.post('/predict/records', json={'campaigns': records} if wrap else records)
+    assert response.status_code == 200
+    body = response.get_json()
+    expected = pipeline.predict_proba(campaigns[REQUIRED].head(20))[:, 1] * 100
+    assert [c['Success_Probability'] for c in body['campaigns']] == expected.tolist()
+    assert body['total_campaigns'] == 20
+    assert body['predicted_successful'] == sum(c['Predicted_Success'] for c in body['campaigns'])
+
+
+def _without(record, field):
+    record = dict(record)
+    del record[field]
+    return record
+
+
+@pytest.mark.parametrize('change', [
+    lambda record: _without(record, 'Budget'),
+    lambda record: _without(record, 'Platform'),
+    lambda record: {**record, 'Budget': None},
+    lambda record: {**record, 'Budget': 'lots'},
+    lambda record: {**record, 'Duration': 'NaN'},
+    lambda record: {**record, 'Platform': None},
+    lambda record: {**record, 'Region': 7},
+], ids=['missing number', 'missing category', 'null number', 'bad number', 'nan number',
+        'null category', 'number as category'])
+def test_bad_fields_are_400(client, records, change):
+    bad = change(records[0])
+    response = client.post('/predict/one', json=bad)
+    assert response.status_code == 400, response.get_json()
+    assert 'error' in response.get_json()
+    response = client.post('/predict/records', json=[records[1], bad])
+    assert response.status_code == 400, response.get_json()
+
+
+@pytest.mark.parametrize('body', [None, [], 'campaign', {'campaigns': 'x'}])
+def test_bad_bodies_are_400(client, body):
+    assert client.post('/predict/records', json=body).status_code == 400
+
+
+def test_predict_one_needs_an_object(client, records):
+    assert client.post('/predict/one', json=records[:1]).status_code == 400
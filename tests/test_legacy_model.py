@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from legacy_model import LegacyModel
+from model_registry import ServedModel
+from training import FEATURE_COLS, TARGET_COL
+
+
+@pytest.fixture(scope='module')
+def old_forest(campaigns):
+    """A forest fitted the way roi_model.pkl was: on pd.get_dummies of the features."""
+    X = pd.get_dummies(campaigns[FEATURE_COLS])
+    return RandomForestClassifier(n_estimators=10, random_state=0).fit(X, campaigns[TARGET_COL])
+
+
+def reference_proba(forest, X):
+    """What the old app did: get_dummies of the file, reindexed to the fitted columns."""
+    dummies = pd.get_dummies(X).reindex(columns=forest.feature_names_in_, fill_value=0)
+    return forest.predict_proba(dummies)
+
+
+def test_matches_get_dummies_on_a_file_missing_categories(old_forest, campaigns):
+    platform, region = campaigns['Platform'].iloc[0], campaigns['Region'].iloc[0]
+    X = campaigns.loc[(campaigns['Platform'] != platform) & (campaigns['Region'] != region),
+                      FEATURE_COLS]
+    assert X['Platform'].nunique() < campaigns['Platform'].nunique()
+
+    model = LegacyModel(old_forest)
+    expected = reference_proba(old_forest, X)
+    np.testing.assert_array_equal(model.predict_proba(X), expected)
+    np.testing.assert_array_equal(model.predict(X), old_forest.classes_[expected.argmax(axis=1)])
+
+
+def test_predict_one_with_the_legacy_model(client, app_module, old_forest, campaigns, monkeypatch):
+    served = ServedModel(LegacyModel(old_forest), False, 'legacy', 'roi_model.pkl')
+    monkeypatch.setattr(app_module.model_server, 'active', served)
+    record = campaigns[FEATURE_COLS].iloc[3].to_dict()
+
+    response = client.post('/predict/one', json=record)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['model_version'] == 'legacy'
+    expected = reference_proba(old_forest, pd.DataFrame([record]))[0, 1]
+    assert body['campaign']['Success_Probability'] == expected * 100
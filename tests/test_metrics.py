@@ -0,0 +1,14 @@
+def test_resident_memory_left_out_when_unknown(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'memory_usage',
+                        lambda pid='self': {"pid": pid, "rss_mb": None, "shared_mb": None})
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert not [line for line in response.get_data(as_text=True).splitlines()
+                if line.startswith('roi_process_resident_memory_bytes ')]
+
+
+def test_resident_memory_reported(client):
+    text = client.get('/metrics').get_data(as_text=True)
+    [sample] = [line for line in text.splitlines()
+                if line.startswith('roi_process_resident_memory_bytes ')]
+    assert float(sample.split()[1]) > 0
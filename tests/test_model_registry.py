@@ -0,0 +1,60 @@
+import copy
+import pickle
+import time
+
+import pytest
+
+from model_registry import ModelRegistry, ModelServer
+
+
+@pytest.fixture
+def registry(pipeline, tmp_path):
+    pipeline_path = tmp_path / 'roi_pipeline.pkl'
+    with open(pipeline_path, 'wb') as f:
+        pickle.dump(pipeline, f)
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    registry.register(str(pipeline_path))
+    return registry
+
+
+@pytest.mark.parametrize('version', ['..', '../models', '', ['x'], None, 'unknown'])
+def test_only_registered_versions_activate(registry, version):
+    server = ModelServer(registry)
+    with pytest.raises(KeyError):
+        server.activate(version)
+    assert server.active is None
+    assert registry.active_version() is None
+
+
+def test_other_processes_follow_the_active_file(registry):
+    version = registry.versions()[0]['version']
+    follower = ModelServer(registry)
+    follower.watch(0.02)
+    ModelServer(registry).activate(version)
+    assert registry.active_version() == version
+    deadline = time.monotonic() + 5
+    while follower.active is None and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert follower.active.version == version
+
+
+@pytest.mark.parametrize('version', ['..', ['x']])
+def test_activate_endpoint_rejects_unknown_versions(client, app_module, version):
+    serving = app_module.model_server.active.version
+    response = client.post('/models/activate', json={'version': version})
+    assert response.status_code == 404
+    assert app_module.model_server.active.version == serving
+
+
+def test_latest_skips_compact_versions(registry, pipeline, tmp_path):
+    full = registry.latest()
+    compact_path = tmp_path / 'roi_compact.pkl'
+    # Another pickle, so another version
+    student = copy.deepcopy(pipeline)
+    student.verbose = True
+    compact_path.write_bytes(pickle.dumps(student))
+    compact = registry.register(str(compact_path), compact=True)
+    assert compact != full
+    assert registry.versions()[-1]['version'] == compact
+    assert registry.latest() == full
+    assert registry.is_registered(compact)
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from forest_engine import compile_pipeline
+from optimizer import OptimizerError, ScoreSurface, query_args
+
+
+@pytest.fixture(scope='module')
+def surface(pipeline):
+    return ScoreSurface(compile_pipeline(pipeline), 'v1', budget_points=8, duration_points=4)
+
+
+def test_optimize_within_budget(surface):
+    result = surface.optimize(50000, max_campaigns=3, constraints={'Platform': 'Instagram'})
+    assert 0 < len(result['campaigns']) <= 3
+    assert result['total_budget'] <= 50000
+    assert all(campaign['Platform'] == 'Instagram' for campaign in result['campaigns'])
+
+
+@pytest.mark.parametrize('constraints', [
+    ['Budget'],
+    'Budget',
+    {'Budget': 5},
+    {'Budget': {'min': 'cheap'}},
+    {'Budget': {'low': 100}},
+    {'Duration': [1, 2]},
+    {'Platform': 5},
+    {'Platform': [{'name': 'Instagram'}]},
+    {'Platform': ['Carrier pigeon']},
+    {'Colour': ['red']},
+])
+def test_bad_constraints_are_optimizer_errors(surface, constraints):
+    with pytest.raises(OptimizerError):
+        surface.optimize(50000, constraints=constraints)
+
+
+def test_bad_constraints_are_400s(client):
+    for constraints in ({'Budget': 5}, ['Budget']):
+        response = client.post('/optimize', json={'total_budget': 50000, 'constraints': constraints})
+        assert response.status_code == 400
+        assert 'dictionary' not in response.get_json()['error']
+
+
+def test_points_skip_missing_value_splits(surface):
+    # The fixture forest was fitted with missing budgets, so some splits sit at inf
+    assert np.isfinite(surface.budgets).all() and np.isfinite(surface.durations).all()
+
+
+@pytest.mark.parametrize('query', [
+    {},
+    {'total_budget': 'abc'},
+    {'total_budget': 'inf'},
+    {'total_budget': float('nan')},
+    {'total_budget': True},
+    {'total_budget': [5]},
+    {'total_budget': 100, 'max_campaigns': None},
+    {'total_budget': 100, 'max_campaigns': 2.5},
+    {'total_budget': 100, 'min_probability': 'nan'},
+])
+def test_bad_numbers_are_optimizer_errors(query):
+    with pytest.raises(OptimizerError):
+        query_args(query)
+
+
+def test_query_numbers_parsed():
+    assert query_args({'total_budget': '5000', 'max_campaigns': 3.0}) == {
+        'total_budget': 5000.0, 'max_campaigns': 3, 'constraints': None, 'min_probability': 0.0}
+
+
+@pytest.mark.parametrize('query', [
+    {'total_budget': 'inf'},
+    {'total_budget': 'abc'},
+    {'total_budget': 100, 'max_campaigns': None},
+    {'total_budget': 100, 'min_probability': 'nan'},
+    {'total_budget': 100, 'min_probability': 2},
+])
+def test_bad_numbers_are_400s(client, query):
+    response = client.post('/optimize', json=query)
+    assert response.status_code == 400
+    error = response.get_json()['error']
+    assert 'argument' not in error and 'could not convert' not in error
+
+
+def test_optimize_endpoint(client):
+    response = client.post('/optimize', json={'total_budget': 50000, 'max_campaigns': 2})
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['budget_allocated'] + result['budget_remaining'] == 50000
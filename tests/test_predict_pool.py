@@ -0,0 +1,32 @@
+import os
+import pickle
+import signal
+
+import numpy as np
+
+from forest_engine import compile_pipeline
+from predict_pool import PredictionPool
+from schema import REQUIRED
+
+
+def test_dead_worker_replaced(pipeline, campaigns, tmp_path):
+    path = tmp_path / 'roi_pipeline.pkl'
+    path.write_bytes(pickle.dumps(pipeline))
+    model = compile_pipeline(pipeline)
+    df = campaigns[REQUIRED]
+    expected = pipeline.predict_proba(df)[:, 1]
+
+    pool = PredictionPool(1, str(path), True, model=model)
+    try:
+        assert pool.warm_up()
+        [pid] = pool.worker_pids()
+        os.kill(pid, signal.SIGKILL)
+
+        # Scored in this process while the pool is replaced
+        _, probabilities = pool.score(df)
+        np.testing.assert_array_equal(probabilities, expected)
+        _, probabilities = pool.score(df)
+        np.testing.assert_array_equal(probabilities, expected)
+        assert pool.worker_pids() and pool.worker_pids() != [pid]
+    finally:
+        pool.shutdown()
@@ -0,0 +1,67 @@
+import io
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from schema import REQUIRED
+
+
+def read_ndjson(data):
+    return pd.read_json(io.BytesIO(data), lines=True)
+
+
+def read_arrow(data):
+    return pa.ipc.open_stream(data).read_all().to_pandas()
+
+
+def read_parquet(data):
+    return pq.read_table(io.BytesIO(data)).to_pandas()
+
+
+READERS = {'ndjson': read_ndjson, 'arrow': read_arrow, 'parquet': read_parquet}
+
+
+def upload(df):
+    return {'file': (io.BytesIO(df.to_csv(index=False).encode()), 'campaigns.csv')}
+
+
+@pytest.fixture
+def small_chunks(app_module, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'STREAM_CHUNK_ROWS', 64)
+
+
+@pytest.mark.parametrize('fmt', sorted(READERS))
+def test_streamed_rows_read_back(client, app_module, pipeline, campaigns, small_chunks, fmt):
+    df = campaigns[REQUIRED].head(300)
+    holders = app_module.model_server.active.in_flight()
+    response = client.post(f'/predict?format={fmt}', data=upload(df),
+                           content_type='multipart/form-data')
+    assert response.status_code == 200 and response.is_streamed
+    assert f'campaigns.scored.{app_module.EXTENSIONS[response.mimetype]}' in \
+        response.headers['Content-Disposition']
+    scored = READERS[fmt](response.get_data())
+    # Reading the body to the end lets go of the model
+    assert app_module.model_server.active.in_flight() == holders
+
+    assert len(scored) == 300
+    assert list(scored.columns[:len(REQUIRED)]) == REQUIRED
+    expected = pipeline.predict_proba(df)[:, 1] * 100
+    assert scored['Success_Probability'].tolist() == pytest.approx(expected.tolist())
+    assert scored['Budget'].tolist() == df['Budget'].tolist()
+    assert set(scored['Recommendation']) <= {'Invest', 'Avoid'}
+
+
+def test_accept_header_picks_the_format(client, campaigns):
+    response = client.post('/predict', data=upload(campaigns[REQUIRED].head(10)),
+                           content_type='multipart/form-data',
+                           headers={'Accept': 'application/vnd.apache.arrow.stream'})
+    assert response.mimetype == 'application/vnd.apache.arrow.stream'
+    assert len(read_arrow(response.get_data())) == 10
+
+
+def test_unknown_format_is_406(client, campaigns):
+    response = client.post('/predict?format=xml', data=upload(campaigns[REQUIRED].head(10)),
+                           content_type='multipart/form-data')
+    assert response.status_code == 406
@@ -0,0 +1,96 @@
+import io
+
+import pandas as pd
+import pytest
+
+from ingest import iter_csv_typed, read_csv_typed
+from schema import (ID_COLUMN, REQUIRED, AmbiguousColumnsError, MissingColumnsError,
+                    resolve_header)
+
+CANONICAL = REQUIRED + [ID_COLUMN]
+
+
+def renamed(header):
+    return resolve_header(header).rename
+
+
+def test_aliases_and_misspellings():
+    rename = renamed(['Spend', 'Duration Days', 'Platfrom', 'creative', 'Gender', 'Country', 'Age',
+                      'Campaign ID'])
+    assert sorted(rename.values()) == sorted(CANONICAL)
+    assert rename['Platfrom'] == 'Platform'
+
+
+def test_own_name_beats_an_alias():
+    header = REQUIRED + ['Spend']
+    assert 'Spend' not in renamed(header)
+    assert resolve_header(header).columns == header
+
+
+@pytest.mark.parametrize('header, column', [
+    (['Spend', 'Total Budget'] + REQUIRED[1:], 'Budget'),
+    (['budget', 'BUDGET '] + REQUIRED[1:], 'Budget'),
+    (REQUIRED[:1] + ['Duratoin', 'Durration'] + REQUIRED[2:], 'Duration'),
+])
+def test_two_headers_for_one_column_are_ambiguous(header, column):
+    with pytest.raises(AmbiguousColumnsError) as excinfo:
+        resolve_header(header)
+    assert column in excinfo.value.candidates
+    assert excinfo.value.found == header
+
+
+@pytest.mark.parametrize('header', [
+    ['Cost', 'Duration', 'Platform', 'Content_Type', 'Target_Gender', 'Region', 'Target_Age'],
+    ['Budget', 'Length', 'Platform', 'Content_Type', 'Target_Gender', 'Region', 'Target_Age'],
+    ['Budget', 'Duration', 'Media', 'Content', 'Target_Gender', 'Region', 'Target_Age'],
+])
+def test_broad_names_are_not_guessed(header):
+    with pytest.raises(MissingColumnsError):
+        resolve_header(header)
+
+
+def test_campaign_name_is_not_the_id():
+    rename = renamed(REQUIRED + ['Campaign_Name', 'id'])
+    assert ID_COLUMN not in rename.values()
+    assert 'Campaign_Name' not in rename
+
+
+def test_unmapped_columns_pass_through():
+    csv = ("campaign_id,Campaign_Name,spend,duration,platform,content_type,gender,region,age,Notes,,Notes\n"
+           "C1,Spring,100,10,Instagram,Video,Female,US,18-24,x,,y\n")
+    df = read_csv_typed(io.BytesIO(csv.encode()))
+    assert list(df.columns) == ['Campaign_ID', 'Campaign_Name', 'Budget', 'Duration', 'Platform',
+                                'Content_Type', 'Target_Gender', 'Region', 'Target_Age']
+    assert df['Campaign_Name'].tolist() == ['Spring']
+    chunks = list(iter_csv_typed(io.BytesIO(csv.encode()), chunk_rows=10))
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), df)
+
+
+def test_ambiguous_upload_is_a_400(client, campaigns):
+    body = campaigns.head(5).assign(Spend=1.0, Total_Budget=2.0).drop(columns='Budget')
+    response = client.post('/predict', data={'file': (io.BytesIO(body.to_csv(index=False).encode()),
+                                                      'ambiguous.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert 'Ambiguous' in response.get_json()['error']
+
+
+def test_scored_rows_keep_extra_columns(client, campaigns):
+    body = campaigns.head(5).to_csv(index=False).encode()
+    response = client.post('/predict', data={'file': (io.BytesIO(body), 'campaigns.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    row = response.get_json()['campaigns'][0]
+    assert row['Clicks'] == str(campaigns['Clicks'][0])
+    assert 'Success_Probability' in row
+
+
+def test_pass_through_types_are_not_guessed_per_block():
+    # Numbers for well past pyarrow's first block, then text on the last row
+    row = "100,10,Instagram,Video,Female,US,18-24,{}\n"
+    csv = "Budget,Duration,Platform,Content_Type,Target_Gender,Region,Target_Age,Notes\n"
+    csv += row.format(7) * 60000 + row.format('see brief')
+    chunks = list(iter_csv_typed(io.BytesIO(csv.encode()), chunk_rows=10000))
+    notes = pd.concat(chunks, ignore_index=True)['Notes']
+    assert len(notes) == 60001
+    assert notes.iloc[0] == '7' and notes.iloc[-1] == 'see brief'
@@ -0,0 +1,26 @@
+import numpy as np
+
+from forest_engine import compile_pipeline
+from schema import REQUIRED
+from score_cache import ScoreCache
+from scoring import score
+
+
+def test_repeated_configurations_hit_the_cache(pipeline, campaigns):
+    model = compile_pipeline(pipeline)
+    df = campaigns[REQUIRED].head(200)
+    cache = ScoreCache(1000)
+    cache.bind('v1')
+
+    predictions, probabilities = score(model, True, df, cache=cache)
+    misses = cache.stats()['misses']
+    cached_predictions, cached_probabilities = score(model, True, df, cache=cache)
+
+    stats = cache.stats()
+    assert stats['misses'] == misses and stats['hits'] == misses
+    np.testing.assert_array_equal(cached_predictions, predictions)
+    np.testing.assert_array_equal(cached_probabilities, probabilities)
+    np.testing.assert_array_equal(probabilities, pipeline.predict_proba(df)[:, 1])
+
+    cache.bind('v2')
+    assert cache.stats()['size'] == 0
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from training import TARGET_COL, StratifiedReservoir, TrainingState
+
+
+def _stream(n_chunks, chunk_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    for n in range(n_chunks):
+        ids = np.arange(n * chunk_rows, (n + 1) * chunk_rows)
+        yield pd.DataFrame({'row_id': ids, TARGET_COL: rng.integers(0, 2, chunk_rows)})
+
+
+def test_reservoir_keeps_each_class_within_capacity():
+    reservoir = StratifiedReservoir(budget_bytes=0, random_state=7)
+    reservoir.capacity = {1: 100, 0: 50}
+    streamed = []
+    for chunk in _stream(6, 400):
+        reservoir.add(chunk)
+        streamed.append(chunk)
+        sample = reservoir.sample()
+        for label, capacity in reservoir.capacity.items():
+            assert (sample[TARGET_COL] == label).sum() == min(capacity, reservoir.seen[label])
+        assert not sample['row_id'].duplicated().any()
+
+    streamed = pd.concat(streamed).set_index('row_id')[TARGET_COL]
+    assert (streamed.loc[sample['row_id']].to_numpy() == sample[TARGET_COL].to_numpy()).all()
+    # 2 successes per failure, as CLASS_SHARES asks
+    assert sample[TARGET_COL].value_counts().to_dict() == {1: 100, 0: 50}
+    # Rows past the first chunk replace earlier ones
+    assert (sample['row_id'] >= 400).any()
+
+
+def test_reservoir_is_uniform_over_the_stream():
+    kept = np.zeros(120)
+    runs = 300
+    for seed in range(runs):
+        reservoir = StratifiedReservoir(budget_bytes=0, random_state=seed)
+        reservoir.capacity = {1: 12, 0: 12}
+        for n in range(3):
+            reservoir.add(pd.DataFrame({'row_id': np.arange(n * 40, (n + 1) * 40), TARGET_COL: 1}))
+        kept[reservoir.sample()['row_id']] += 1
+    # Every row is kept with probability 12/120, first chunk or last
+    for chunk in kept.reshape(3, 40):
+        assert chunk.mean() / runs == pytest.approx(0.1, abs=0.015)
+
+
+def test_reservoir_fixed_seed_is_repeatable():
+    samples = []
+    for _ in range(2):
+        reservoir = StratifiedReservoir(budget_bytes=0, random_state=3)
+        reservoir.capacity = {1: 20, 0: 10}
+        for chunk in _stream(4, 100):
+            reservoir.add(chunk)
+        samples.append(reservoir.sample())
+    pd.testing.assert_frame_equal(*samples)
+
+
+@pytest.fixture
+def source(tmp_path, campaigns):
+    path = tmp_path / 'campaigns.csv'
+    campaigns.head(100).to_csv(path, index=False)
+    return path
+
+
+def test_read_new_returns_appended_records(source, campaigns):
+    df, state = TrainingState.read_source(str(source))
+    assert len(df) == 100
+    new, end = state.read_new()
+    assert new.empty and end == state.offset
+
+    appended = campaigns.iloc[100:130].to_csv(index=False, header=False)
+    with open(source, 'a') as f:
+        # The last record is still being written
+        f.write(appended + '1,2,3')
+    new, end = state.read_new()
+    pd.testing.assert_frame_equal(new, campaigns.iloc[100:130].reset_index(drop=True),
+                                  check_dtype=False)
+    assert end == state.offset + len(appended.encode())
+
+    state.advance(end, len(new))
+    assert state.rows == 130
+    new, _ = state.read_new()
+    assert new.empty
+
+
+def test_read_new_refuses_a_rewritten_source(source, campaigns):
+    _, state = TrainingState.read_source(str(source))
+    # Same rows, one value changed, and more appended: not a pure append
+    rewritten = campaigns.head(130).copy()
+    rewritten.loc[95, 'Budget'] += 1
+    rewritten.to_csv(source, index=False)
+    with pytest.raises(ValueError, match='rewritten'):
+        state.read_new()
+
+    campaigns.head(50).to_csv(source, index=False)
+    with pytest.raises(ValueError, match='rewritten'):
+        state.read_new()
@@ -0,0 +1,71 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from ingest import detect_encoding
+from upload_store import UploadStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path / 'store'), max_bytes=1 << 20)
+
+
+@pytest.mark.parametrize('data', [b'Budget,Duration\n1,2\n', 'Région,Durée\nÎle,2\n'.encode('latin1')])
+def test_hash_shares_the_encoding_read(store, data):
+    stream = io.BytesIO(data)
+    with store.begin(keep=True) as upload:
+        encoding = detect_encoding(stream, on_block=upload.update)
+    assert encoding == ('utf-8' if data.isascii() else 'latin1')
+    # The whole upload is hashed even once the encoding is settled
+    assert upload.digest == hashlib.sha256(data).hexdigest() == store.ingest(stream)
+    assert stream.tell() == 0
+    with open(store.object_path(upload.digest), 'rb') as f:
+        assert f.read() == data
+
+
+def test_same_bytes_stored_once(store):
+    first = store.ingest(io.BytesIO(b'a,b\n1,2\n'), keep=True)
+    size = store.stats()['bytes']
+    assert store.ingest(io.BytesIO(b'a,b\n1,2\n'), keep=True) == first
+    assert store.stats()['bytes'] == size
+
+
+def test_results_per_model_version(store):
+    digest = store.ingest(io.BytesIO(b'a,b\n1,2\n'))
+    assert store.get_result(digest, 'v1') is None
+    store.put_result(digest, 'v1', {"total": 1})
+    assert store.get_result(digest, 'v1') == {"total": 1}
+    assert store.get_result(digest, 'v2') is None
+    assert store.stats()['hits'] == 1 and store.stats()['misses'] == 2
+
+
+def test_least_recently_used_evicted(tmp_path):
+    store = UploadStore(str(tmp_path / 'store'), max_bytes=300)
+    digests = [store.ingest(io.BytesIO(bytes([i]) * 100), keep=True) for i in range(4)]
+    assert store.stats()['bytes'] <= 300
+    assert not os.path.exists(store.object_path(digests[0]))
+    assert os.path.exists(store.object_path(digests[-1]))
+
+
+def test_resubmitted_upload_served_from_store(client, campaigns):
+    body = campaigns.head(50).to_csv(index=False).encode()
+    responses = [client.post('/predict', data={'file': (io.BytesIO(body), 'campaigns.csv')},
+                             content_type='multipart/form-data') for _ in range(2)]
+    assert [response.status_code for response in responses] == [200, 200]
+    assert [response.headers['X-Result-Cache'] for response in responses] == ['miss', 'hit']
+    assert responses[0].get_json() == responses[1].get_json()
+
+
+def test_uploads_kept_without_the_store(client, app_module, campaigns, monkeypatch, tmp_path):
+    monkeypatch.setattr(app_module, 'upload_store', None)
+    monkeypatch.setitem(app_module.app.config, 'PERSIST_UPLOADS', True)
+    monkeypatch.setitem(app_module.app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    body = campaigns.head(10).to_csv(index=False).encode()
+    response = client.post('/predict', data={'file': (io.BytesIO(body), 'kept.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert 'X-Result-Cache' not in response.headers
+    assert (tmp_path / 'kept.csv').read_bytes() == body
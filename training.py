@@ -0,0 +1,314 @@
+import hashlib
+import io
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+from sklearn.utils import resample
+
+# Encoder column order is part of the trained artifact; keep it stable
+CATEGORICAL_COLS = ["Platform", "Content_Type", "Target_Age", "Target_Gender", "Region"]
+NUMERICAL_COLS = ["Budget", "Duration"]
+FEATURE_COLS = NUMERICAL_COLS + CATEGORICAL_COLS
+TARGET_COL = "Success"
+
+# The forest roiPredictor.py trains; tuning.py searches around these
+FOREST_PARAMS = {
+    "n_estimators": 200,
+    "max_depth": 15,
+    "min_samples_split": 10,
+    "min_samples_leaf": 4,
+    "max_features": 'sqrt',
+}
+
+# Rows per chunk when streaming training CSVs
+TRAIN_CHUNK_ROWS = 100000
+# Copies of the sampled rows alive while fitting (reservoir, balanced frame,
+# encoded matrix); the reservoir gets the budget divided by this
+SAMPLE_COPIES = 3
+# Share of the reservoir kept for each class; balance() keeps 2 successes per failure
+CLASS_SHARES = {1: 2 / 3, 0: 1 / 3}
+
+# Bytes just before the resume offset that must be unchanged for an incremental run
+TAIL_CHECK_BYTES = 1 << 16
+
+
+def build_preprocessor():
+    return ColumnTransformer(
+        transformers=[
+            ('num', 'passthrough', NUMERICAL_COLS),
+            ('cat', OneHotEncoder(drop='first', sparse_output=False, handle_unknown='ignore'),
+             CATEGORICAL_COLS)
+        ],
+        remainder='drop'
+    )
+
+
+def build_forest(n_jobs=-1, **params):
+    """FOREST_PARAMS with any overrides in params."""
+    return RandomForestClassifier(
+        random_state=42,
+        class_weight=None,  # Already balanced data
+        n_jobs=n_jobs,  # Fit trees on every core
+        **{**FOREST_PARAMS, **params}
+    )
+
+
+def build_pipeline(n_jobs=-1, **params):
+    """The unfitted preprocessor + random forest that roiPredictor.py trains."""
+    return Pipeline([
+        ('preprocessor', build_preprocessor()),
+        ('classifier', build_forest(n_jobs, **params))
+    ])
+
+
+def balance(df, random_state=42):
+    """Downsample successes to twice the failures and upsample failures to match.
+
+    Returns the shuffled, balanced frame.
+    """
+    df_success = df[df[TARGET_COL] == 1]
+    df_fail = df[df[TARGET_COL] == 0]
+
+    # Downsample majority class to match minority class * 2
+    target_size = min(len(df_fail) * 2, len(df_success))
+
+    df_success_downsampled = resample(df_success,
+                                      replace=False,
+                                      n_samples=target_size,
+                                      random_state=random_state)
+
+    # Upsample minority class
+    df_fail_upsampled = resample(df_fail,
+                                 replace=True,
+                                 n_samples=target_size // 2,
+                                 random_state=random_state)
+
+    df_balanced = pd.concat([df_success_downsampled, df_fail_upsampled])
+    return df_balanced.sample(frac=1, random_state=random_state).reset_index(drop=True)
+
+
+def state_path(pipeline_path):
+    """The training checkpoint kept next to a pipeline pickle."""
+    return os.path.splitext(pipeline_path)[0] + '.state.json'
+
+
+def _tail_hash(f, offset):
+    f.seek(max(offset - TAIL_CHECK_BYTES, 0))
+    return hashlib.sha256(f.read(min(offset, TAIL_CHECK_BYTES))).hexdigest()
+
+
+class TrainingState:
+    """How far into the source CSV the saved pipeline has been trained.
+
+    Records end on a newline boundary; an incremental run reads only the
+    bytes after it. The hash of the bytes just before the offset catches a
+    source file that was rewritten rather than appended to.
+    """
+
+    def __init__(self, source, header, offset, tail_hash, rows, runs=None):
+        self.source = source
+        self.header = header
+        self.offset = offset
+        self.tail_hash = tail_hash
+        self.rows = rows
+        self.runs = runs or []
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(**json.load(f))
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.__dict__, f, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def at_end(cls, source, header):
+        """A checkpoint at the last complete record source has right now (rows=0)."""
+        with open(source, 'rb') as f:
+            end = offset = os.fstat(f.fileno()).st_size
+            while end > 0:
+                start = max(end - TAIL_CHECK_BYTES, 0)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b'\n')
+                if newline >= 0:
+                    offset = start + newline + 1
+                    break
+                end = start
+            else:
+                offset = 0
+            return cls(os.path.abspath(source), list(header), offset, _tail_hash(f, offset), 0)
+
+    @classmethod
+    def read_source(cls, source):
+        """Read every complete record of source. Returns (DataFrame, state)."""
+        with open(source, 'rb') as f:
+            data = f.read()
+            offset = data.rfind(b'\n') + 1
+            df = pd.read_csv(io.BytesIO(data[:offset]))
+            state = cls(os.path.abspath(source), list(df.columns), offset,
+                        _tail_hash(f, offset), len(df))
+        return df, state
+
+    def read_new(self):
+        """Records appended since the checkpoint. Returns (DataFrame, end offset).
+
+        Raises ValueError when the source no longer starts with what was
+        trained on, since the only safe option then is a full retrain.
+        """
+        with open(self.source, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < self.offset or _tail_hash(f, self.offset) != self.tail_hash:
+                raise ValueError(f"{self.source} was rewritten since the last training run; "
+                                 "retrain from scratch")
+            f.seek(self.offset)
+            data = f.read()
+        # A writer may be part way through the last record; leave it for next time
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            return pd.DataFrame(columns=self.header), self.offset
+        df = pd.read_csv(io.BytesIO(data[:end]), header=None, names=self.header)
+        return df, self.offset + end
+
+    def advance(self, end, rows, **run):
+        """Mark the records up to end as trained on."""
+        with open(self.source, 'rb') as f:
+            self.tail_hash = _tail_hash(f, end)
+        self.offset = end
+        self.rows += rows
+        self.log_run(rows=rows, **run)
+
+    def log_run(self, **run):
+        self.runs.append(dict(run, at=time.time()))
+
+
+class StratifiedReservoir:
+    """A uniform random sample of each class from a stream of frames.
+
+    Algorithm R per class, applied a chunk at a time: the i-th row of a
+    class replaces a random slot with probability capacity / i, so every
+    row streamed so far is equally likely to be in the sample. Capacity
+    comes from the memory budget and the first chunk's bytes per row.
+    """
+
+    def __init__(self, budget_bytes, random_state=42):
+        self.budget_bytes = budget_bytes
+        self.capacity = None
+        self.seen = {label: 0 for label in CLASS_SHARES}
+        self._rows = {}
+        self._rng = np.random.default_rng(random_state)
+
+    def add(self, chunk):
+        if self.capacity is None:
+            row_bytes = chunk.memory_usage(deep=True).sum() / max(len(chunk), 1)
+            # The chunk being read is in memory too
+            rows = int((self.budget_bytes / row_bytes - len(chunk)) / SAMPLE_COPIES)
+            if rows < 2:
+                raise ValueError(f"a {self.budget_bytes} byte budget does not fit one "
+                                 f"{len(chunk)} row chunk; lower chunk_rows or raise the budget")
+            self.capacity = {label: max(int(rows * share), 1)
+                             for label, share in CLASS_SHARES.items()}
+        for label in CLASS_SHARES:
+            rows = chunk[chunk[TARGET_COL] == label]
+            if len(rows):
+                self._add(label, rows.reset_index(drop=True))
+
+    def _add(self, label, rows):
+        capacity, seen = self.capacity[label], self.seen[label]
+        reservoir = self._rows.get(label)
+
+        fill = min(max(capacity - seen, 0), len(rows))
+        if fill:
+            head = rows.iloc[:fill]
+            reservoir = head if reservoir is None else pd.concat([reservoir, head], ignore_index=True)
+        rest = rows.iloc[fill:]
+        if len(rest):
+            positions = np.arange(seen + fill + 1, seen + len(rows) + 1)
+            slots = self._rng.integers(0, positions)
+            picked = np.flatnonzero(slots < capacity)
+            slots = slots[picked]
+            # A slot drawn twice keeps the later row, as the one-at-a-time algorithm would
+            _, last = np.unique(slots[::-1], return_index=True)
+            last = len(slots) - 1 - last
+            for j in range(reservoir.shape[1]):
+                reservoir.iloc[slots[last], j] = rest.iloc[picked[last], j].to_numpy()
+
+        self._rows[label] = reservoir
+        self.seen[label] = seen + len(rows)
+
+    def sample(self):
+        return pd.concat([rows for rows in self._rows.values()], ignore_index=True)
+
+
+def stream_sample(paths, budget_bytes, chunk_rows=TRAIN_CHUNK_ROWS, random_state=42):
+    """Stream training CSVs into a class-stratified sample that fits budget_bytes.
+
+    Only the feature and target columns are parsed. Returns (sample,
+    reservoir, state); state is the checkpoint for an incremental run when
+    there is a single source, else None.
+    """
+    reservoir = StratifiedReservoir(budget_bytes, random_state)
+    dtypes = dict.fromkeys(NUMERICAL_COLS, 'float64') | dict.fromkeys(CATEGORICAL_COLS, str)
+    state = None
+    for path in paths:
+        header = pd.read_csv(path, nrows=0).columns
+        with open(path, 'rb') as f:
+            source = f
+            if len(paths) == 1:
+                # Stop at the record the checkpoint will point to, even if path grows meanwhile
+                state = TrainingState.at_end(path, header)
+                source = io.BufferedReader(_BoundedReader(f, state.offset))
+            for chunk in pd.read_csv(source, usecols=FEATURE_COLS + [TARGET_COL], dtype=dtypes,
+                                     chunksize=chunk_rows):
+                reservoir.add(chunk.dropna(subset=[TARGET_COL]).astype({TARGET_COL: 'int64'}))
+    if state is not None:
+        state.rows = sum(reservoir.seen.values())
+    return reservoir.sample(), reservoir, state
+
+
+class _BoundedReader(io.RawIOBase):
+    """The first limit bytes of a binary file."""
+
+    def __init__(self, f, limit):
+        self._f = f
+        self._left = limit
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._f.read(min(len(buffer), self._left))
+        self._left -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def warm_start_update(pipeline, X, y, add_trees, max_trees=None):
+    """Grow the fitted forest by add_trees trees fitted on X, y only.
+
+    The fitted encoder is reused as is, so the feature layout (and the
+    vocabulary: categories it has not seen encode as all zeros) stays the
+    same. With max_trees, the oldest trees are dropped once the forest is
+    larger, so it keeps tracking recent data.
+    """
+    preprocessor = pipeline.named_steps['preprocessor']
+    forest = pipeline.named_steps['classifier']
+
+    encoded = preprocessor.transform(X)
+    forest.set_params(warm_start=True, n_estimators=len(forest.estimators_) + add_trees)
+    forest.fit(encoded, y)
+    forest.set_params(warm_start=False)
+
+    if max_trees is not None and len(forest.estimators_) > max_trees:
+        forest.estimators_ = forest.estimators_[-max_trees:]
+        forest.set_params(n_estimators=max_trees)
+    return pipeline
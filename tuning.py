@@ -0,0 +1,256 @@
+"""Cross-validated hyperparameter search for the training pipeline.
+
+Every configuration in the grid is scored with stratified K-fold
+cross-validation in a process pool. Each fold is balanced (training part
+only; the held-out part keeps the real class mix) and encoded once, with
+the fitted preprocessor and encoded arrays cached on disk for the workers
+to memory-map, so candidates only ever fit forests. With successive
+halving (the default) all candidates start on a small share of each
+fold's training rows and only the best 1/--factor move up to the next,
+larger share, so weak configurations cost little.
+
+The leaderboard ranks configurations by mean balanced accuracy and lists
+fit time and serving-engine latency next to it, for picking a model that is
+both accurate and cheap to serve:
+
+    python tuning.py [--data data.csv] [--folds 5] [--workers 4] [--factor 3]
+                     [--grid '{"max_depth": [10, 15]}'] [--no-halving]
+    python roiPredictor.py --params '{"max_depth": 10, ...}'
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import pickle
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, balanced_accuracy_score, roc_auc_score
+from sklearn.model_selection import StratifiedKFold
+from sklearn.pipeline import Pipeline
+from sklearn.utils import resample
+
+from forest_engine import CompiledPipeline
+from training import (FEATURE_COLS, FOREST_PARAMS, TARGET_COL, balance, build_forest,
+                      build_preprocessor)
+
+PARAM_GRID = {
+    "n_estimators": [100, 200, 400],
+    "max_depth": [10, 15, None],
+    "min_samples_split": [2, 10],
+    "min_samples_leaf": [1, 4],
+    "max_features": ['sqrt', 0.5],
+}
+OUTPUT_PATH = 'benchmarks/tuning.json'
+# Training rows per fold a halving rung may start from
+MIN_HALVING_ROWS = 200
+# Single-row latency is the best of this many calls
+LATENCY_REPEAT = 20
+
+# Fold arrays already mapped by this worker process
+_folds = {}
+
+
+def param_grid(grid):
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+
+def config_key(params):
+    return json.dumps(params, sort_keys=True)
+
+
+def prepare_folds(df, n_folds, cache_dir, random_state=42):
+    """Balance, fit the preprocessor and encode each fold once.
+
+    Writes fold<k>.pkl (the fitted preprocessor) and fold<k>_*.npy (the
+    encoded rows) to cache_dir. Returns the training rows of every fold.
+    """
+    splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=random_state)
+    train_rows = []
+    for fold, (train_index, test_index) in enumerate(splitter.split(df, df[TARGET_COL])):
+        train = balance(df.iloc[train_index], random_state=random_state)
+        test = df.iloc[test_index]
+
+        preprocessor = build_preprocessor().fit(train[FEATURE_COLS])
+        arrays = {
+            "X_train": preprocessor.transform(train[FEATURE_COLS]).astype(np.float32),
+            "y_train": train[TARGET_COL].to_numpy(),
+            "X_test": preprocessor.transform(test[FEATURE_COLS]).astype(np.float32),
+            "y_test": test[TARGET_COL].to_numpy(),
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(cache_dir, f'fold{fold}_{name}.npy'), array)
+        with open(os.path.join(cache_dir, f'fold{fold}.pkl'), 'wb') as f:
+            pickle.dump(preprocessor, f)
+        train_rows.append(len(train))
+    return train_rows
+
+
+def load_fold(cache_dir, fold):
+    key = (cache_dir, fold)
+    if key not in _folds:
+        arrays = {name: np.load(os.path.join(cache_dir, f'fold{fold}_{name}.npy'), mmap_mode='r')
+                  for name in ("X_train", "y_train", "X_test", "y_test")}
+        with open(os.path.join(cache_dir, f'fold{fold}.pkl'), 'rb') as f:
+            arrays["preprocessor"] = pickle.load(f)
+        _folds[key] = arrays
+    return _folds[key]
+
+
+def evaluate(cache_dir, fold, params, n_rows):
+    """Fit one configuration on n_rows of a fold's training rows and score it."""
+    data = load_fold(cache_dir, fold)
+    X_train, y_train = data["X_train"], data["y_train"]
+    if n_rows < len(y_train):
+        index = resample(np.arange(len(y_train)), n_samples=n_rows, replace=False,
+                         stratify=y_train, random_state=fold)
+        X_train, y_train = X_train[index], y_train[index]
+
+    # One core per fit; the pool runs the candidates side by side
+    forest = build_forest(n_jobs=1, **params)
+    started = time.perf_counter()
+    forest.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - started
+
+    # Latency through the engine /predict serves with, not sklearn's predict_proba
+    engine = CompiledPipeline(Pipeline([('preprocessor', data["preprocessor"]),
+                                        ('classifier', forest)]))
+    X_test = np.ascontiguousarray(data["X_test"])
+    started = time.perf_counter()
+    proba = engine._forest_proba(X_test)
+    batch_seconds = time.perf_counter() - started
+    single_seconds = min(_timed(engine._forest_proba, X_test[:1]) for _ in range(LATENCY_REPEAT))
+
+    y_test = data["y_test"]
+    labels = engine.classes_.take(np.argmax(proba, axis=1))
+    return {
+        "balanced_accuracy": balanced_accuracy_score(y_test, labels),
+        "accuracy": accuracy_score(y_test, labels),
+        "roc_auc": roc_auc_score(y_test, proba[:, 1]),
+        "fit_seconds": fit_seconds,
+        "batch_us_per_row": batch_seconds / len(y_test) * 1e6,
+        "single_row_ms": single_seconds * 1000,
+        "nodes": int(sum(estimator.tree_.node_count for estimator in forest.estimators_)),
+    }
+
+
+def _timed(fn, X):
+    started = time.perf_counter()
+    fn(X)
+    return time.perf_counter() - started
+
+
+def halving_schedule(n_candidates, max_rows, factor, min_rows=MIN_HALVING_ROWS):
+    """Training rows per fold for each rung; the last rung uses them all."""
+    rungs = max(math.ceil(math.log(n_candidates, factor)), 1) if n_candidates > 1 else 1
+    if max_rows > min_rows:
+        rungs = min(rungs, int(math.log(max_rows / min_rows, factor)) + 1)
+    else:
+        rungs = 1
+    return [int(max_rows / factor ** (rungs - 1 - rung)) for rung in range(rungs)]
+
+
+def summarize(params, results, rung, n_rows):
+    def mean(name):
+        return statistics.fmean(result[name] for result in results)
+
+    scores = [result["balanced_accuracy"] for result in results]
+    return {
+        "params": params,
+        "rung": rung,
+        "rows_per_fold": n_rows,
+        "balanced_accuracy": mean("balanced_accuracy"),
+        "balanced_accuracy_std": statistics.pstdev(scores),
+        "accuracy": mean("accuracy"),
+        "roc_auc": mean("roc_auc"),
+        "fit_seconds": mean("fit_seconds"),
+        "batch_us_per_row": mean("batch_us_per_row"),
+        "single_row_ms": mean("single_row_ms"),
+        "nodes": round(mean("nodes")),
+    }
+
+
+def search(df, grid, n_folds=5, workers=None, factor=3, halving=True, random_state=42):
+    """Run the search. Returns leaderboard rows, best first."""
+    candidates = param_grid(grid)
+    with tempfile.TemporaryDirectory(prefix='roi-tuning-') as cache_dir:
+        train_rows = prepare_folds(df, n_folds, cache_dir, random_state)
+        max_rows = min(train_rows)
+        schedule = halving_schedule(len(candidates), max_rows, factor) if halving else [max_rows]
+
+        finished = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for rung, n_rows in enumerate(schedule):
+                print(f"Rung {rung}: {len(candidates)} configurations x {n_folds} folds "
+                      f"on {n_rows} rows each")
+                futures = {config_key(params): [pool.submit(evaluate, cache_dir, fold, params, n_rows)
+                                                for fold in range(n_folds)]
+                           for params in candidates}
+                rows = [summarize(params, [future.result() for future in futures[config_key(params)]],
+                                  rung, n_rows)
+                        for params in candidates]
+                rows.sort(key=lambda row: row["balanced_accuracy"], reverse=True)
+
+                if rung == len(schedule) - 1:
+                    finished = rows + finished
+                    break
+                keep = max(math.ceil(len(rows) / factor), 1)
+                finished = rows[keep:] + finished
+                candidates = [row["params"] for row in rows[:keep]]
+    return finished
+
+
+def print_leaderboard(rows, limit):
+    current = config_key(FOREST_PARAMS)
+    print(f"\n{'':2}{'bal.acc':>16} {'auc':>6} {'fit s':>7} {'us/row':>7} {'1 row ms':>8} "
+          f"{'nodes':>8} {'rung':>4}  params")
+    for row in rows[:limit]:
+        marker = '*' if config_key(row["params"]) == current else ' '
+        print(f"{marker:2}{row['balanced_accuracy']:>9.4f} ±{row['balanced_accuracy_std']:.3f} "
+              f"{row['roc_auc']:>6.3f} {row['fit_seconds']:>7.2f} {row['batch_us_per_row']:>7.1f} "
+              f"{row['single_row_ms']:>8.2f} {row['nodes']:>8} {row['rung']:>4}  "
+              f"{config_key(row['params'])}")
+    print("\n* = current training.FOREST_PARAMS")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--data', default='data.csv')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=None,
+                        help="processes fitting candidates (default: one per core)")
+    parser.add_argument('--grid', default=None,
+                        help="JSON object of parameter lists, merged over PARAM_GRID")
+    parser.add_argument('--factor', type=int, default=3,
+                        help="each halving rung keeps the best 1/factor configurations")
+    parser.add_argument('--no-halving', action='store_true',
+                        help="score every configuration on the full folds")
+    parser.add_argument('--top', type=int, default=20, help="leaderboard rows to print")
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    grid = dict(PARAM_GRID)
+    if args.grid:
+        grid.update(json.loads(args.grid))
+
+    df = pd.read_csv(args.data)
+    started = time.perf_counter()
+    rows = search(df, grid, args.folds, args.workers, args.factor, not args.no_halving)
+    print(f"\nSearched {len(rows)} configurations in {time.perf_counter() - started:.1f}s")
+    print_leaderboard(rows, args.top)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({"data": os.path.abspath(args.data), "folds": args.folds, "grid": grid,
+                   "leaderboard": rows}, f, indent=2)
+    print(f"Leaderboard written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
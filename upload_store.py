@@ -0,0 +1,178 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Bytes read per step while hashing an upload
+HASH_BLOCK_BYTES = 1 << 20
+DEFAULT_STORE_BYTES = 512 * 1024 * 1024
+
+
+class UploadStore:
+    """Content-addressed uploads plus scored results keyed by (content, model).
+
+    Uploads are hashed (and, when kept, copied) in the same pass over the
+    stream, so the same bytes sent as 'data.csv' and 'data (3).csv' are
+    stored once under objects/<sha256>. A /predict result is stored under
+    results/<sha256>.<model version>.json and served again for the same
+    bytes and model. Both kinds of entry are evicted least recently used
+    first once the store is over max_bytes; a hit counts as a use.
+    """
+
+    def __init__(self, root, max_bytes=DEFAULT_STORE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._objects = os.path.join(root, 'objects')
+        self._results = os.path.join(root, 'results')
+        os.makedirs(self._objects, exist_ok=True)
+        os.makedirs(self._results, exist_ok=True)
+        self._lock = threading.Lock()
+        self._bytes = self._scan()[1]
+
+    def ingest(self, stream, keep=False):
+        """Hash a seekable upload stream (left where it started). Returns the digest.
+
+        With keep, the bytes are written to the store in the same pass.
+        """
+        start = stream.tell()
+        try:
+            with self.begin(keep) as upload:
+                while True:
+                    block = stream.read(HASH_BLOCK_BYTES)
+                    if not block:
+                        break
+                    upload.update(block)
+        finally:
+            stream.seek(start)
+        return upload.digest
+
+    def begin(self, keep=False):
+        """An Upload to feed blocks to, for callers already reading the bytes for another reason.
+
+        Use it as a context manager; its digest is set once the block exits.
+        """
+        return Upload(self, keep)
+
+    def _stored(self, tmp_path, digest):
+        path = self.object_path(digest)
+        if os.path.exists(path):
+            # Seen before: keep the stored copy, just mark it used
+            os.remove(tmp_path)
+            os.utime(path)
+        else:
+            os.replace(tmp_path, path)
+            self._added(os.path.getsize(path))
+
+    def object_path(self, digest):
+        return os.path.join(self._objects, digest)
+
+    def _result_path(self, digest, model_version):
+        return os.path.join(self._results, f'{digest}.{model_version}.json')
+
+    def get_result(self, digest, model_version):
+        """The stored result for these bytes and this model, or None."""
+        path = self._result_path(digest, model_version)
+        try:
+            with open(path) as f:
+                result = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def put_result(self, digest, model_version, result):
+        path = self._result_path(digest, model_version)
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+        self._added(os.path.getsize(path))
+
+    def stats(self):
+        with self._lock:
+            return {"bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+    def _added(self, size):
+        with self._lock:
+            self._bytes += size
+            over = self._bytes > self.max_bytes
+        if over:
+            self._evict()
+
+    def _scan(self):
+        """([(last used, size, path)], total bytes) from the files on disk."""
+        entries = []
+        for directory in (self._objects, self._results):
+            for name in os.listdir(directory):
+                if name.endswith('.tmp'):
+                    continue
+                try:
+                    info = os.stat(os.path.join(directory, name))
+                except OSError:
+                    continue
+                entries.append((info.st_mtime, info.st_size, os.path.join(directory, name)))
+        return entries, sum(size for _, size, _ in entries)
+
+    def _evict(self):
+        # Disk is the truth; other server processes may share this store
+        with self._lock:
+            entries, total = self._scan()
+            entries.sort()
+            removed = 0
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            self._bytes = total
+        if removed:
+            logger.info("Evicted %d upload store entries, %d bytes left", removed, total)
+
+
+class Upload:
+    """One upload being hashed (and, when kept, copied into the store) block by block."""
+
+    def __init__(self, store, keep):
+        self.digest = None
+        self._store = store
+        self._digest = hashlib.sha256()
+        self._tmp_path = None
+        self._out = None
+        if keep:
+            self._tmp_path = os.path.join(store._objects, f'.{uuid.uuid4().hex}.tmp')
+            self._out = open(self._tmp_path, 'wb')
+
+    def update(self, block):
+        self._digest.update(block)
+        if self._out is not None:
+            self._out.write(block)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._out is not None:
+            self._out.close()
+            if exc_type is not None:
+                # A partial copy is never stored
+                os.remove(self._tmp_path)
+        if exc_type is None:
+            self.digest = self._digest.hexdigest()
+            if self._out is not None:
+                self._store._stored(self._tmp_path, self.digest)
+        self._out = None